@@ -0,0 +1,122 @@
+"""Activity list latency and hot-table size as history accumulates, with and without archival.
+
+For each history length, seeds one owner with `--per-year` activities a year
+(a tenth of them on open leads, which are never archived) on a fresh database,
+times the first page of `GET /activities`, a lead timeline and `GET /search`,
+then runs the archival job and times them again. Each history length runs
+in its own process. Run from the backend directory:
+
+    python -m benchmarks.archive --years 1 3 5 --per-year 100000
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from benchmarks.harness import create_user, format_summary, load_app, summarize, timed_request
+
+LEADS = 2000
+OPEN_SHARE = 0.1
+
+
+def seed(main, owner_id, years, per_year, batch=50000):
+    rng = random.Random(years)
+    now = datetime.utcnow()
+    with main.engine.begin() as conn:
+        conn.execute(main.Lead.__table__.insert(), [
+            {"title": f"Lead {i}", "owner_id": owner_id, "stage": "New" if i < LEADS * OPEN_SHARE else "Closed-Won",
+             "status": "open" if i < LEADS * OPEN_SHARE else "won", "value_cents": 0}
+            for i in range(LEADS)
+        ])
+        lead_ids = conn.scalars(select(main.Lead.id).where(main.Lead.owner_id == owner_id).order_by(main.Lead.id)).all()
+    total = years * per_year
+    for offset in range(0, total, batch):
+        rows = []
+        for i in range(offset, min(offset + batch, total)):
+            occurred = now - timedelta(days=365 * years * rng.random(), seconds=rng.randrange(86400))
+            rows.append({
+                "lead_id": rng.choice(lead_ids), "type": "note", "subject": f"Note {i}",
+                "body": " ".join(rng.choice(("call", "pricing", "renewal", "demo", "contract", "visit")) for _ in range(30)),
+                "occurred_at": occurred, "owner_id": owner_id, "created_at": occurred,
+            })
+        with main.engine.begin() as conn:
+            conn.execute(main.Activity.__table__.insert(), rows)
+    with main.engine.begin() as conn:
+        main.stamp_unsynced(conn)
+    return lead_ids
+
+
+async def measure(app, headers, paths):
+    latencies = []
+    for path in paths:
+        status, elapsed = await timed_request(app, "GET", path, headers)
+        assert status == 200, (path, status)
+        latencies.append(elapsed)
+    return latencies
+
+
+def tier_sizes(main):
+    """(rows, MB) of the hot and archive tiers, counting their indexes and full-text indexes."""
+    with main.engine.connect() as conn:
+        pages = conn.exec_driver_sql("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").all()
+        tiers = []
+        for model, prefixes in ((main.Activity, ("activities", "ix_activities")),
+                                (main.ArchivedActivity, ("activity_archive", "ix_activity_archive"))):
+            rows = conn.scalar(select(func.count()).select_from(model))
+            size = sum(total for name, total in pages if name.startswith(prefixes))
+            tiers.append((rows, size / 2 ** 20))
+        return tiers
+
+
+async def run_one(years, per_year, requests):
+    main = load_app(tempfile.mkdtemp(prefix="trailtrack-archive-"))
+    owner_id, headers = create_user(main)
+    lead_ids = seed(main, owner_id, years, per_year)
+    # A closed lead: its old activities move to the archive, so its timeline falls through
+    paths = {
+        "activities list": "/activities?limit=100",
+        "lead timeline": f"/leads/{lead_ids[-1]}/timeline?limit=100",
+        "search": "/search?q=note%201234",
+    }
+
+    for phase in ("hot only", "archived"):
+        if phase == "archived":
+            started = time.perf_counter()
+            moved = main.archive_old_activities(main.engine, main.archive_cutoff())
+            print(f"  archived {moved} activities in {time.perf_counter() - started:.1f}s")
+        (hot, hot_mb), (archived, archive_mb) = tier_sizes(main)
+        print(f"  {phase}: {hot} hot ({hot_mb:.1f} MB), {archived} archived ({archive_mb:.1f} MB)")
+        for label, path in paths.items():
+            # Distinct query strings so every request misses the response cache
+            latencies = await measure(main.app, headers, [f"{path}&r={n}" for n in range(requests)])
+            print(f"    {format_summary(label, summarize(latencies))}")
+
+
+def run_history(years, per_year, requests):
+    asyncio.run(run_one(years, per_year, requests))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--per-year", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=50, help="requests per path and phase")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    for years in args.years:
+        print(f"{years} year(s) of history, {args.per_year} activities a year", flush=True)
+        process = context.Process(target=run_history, args=(years, args.per_year, args.requests))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            raise SystemExit(f"the {years}-year run failed")
+
+
+if __name__ == "__main__":
+    main()
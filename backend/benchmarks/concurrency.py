@@ -0,0 +1,98 @@
+"""Latency of cheap requests while a slow list query runs in the same worker.
+
+With the async session layer a slow query waits on the database thread instead
+of the event loop, so p99 for cheap requests should stay close to the idle
+baseline. Run from the backend directory:
+
+    python -m benchmarks.concurrency --activities 200000
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+
+from benchmarks.harness import create_user, format_summary, load_app, summarize, timed_request
+
+
+def seed(main, owner_id, activities):
+    start = datetime.utcnow() - timedelta(days=365)
+    rows = [
+        {
+            "type": "note",
+            "subject": f"Activity {i}",
+            "body": f"Benchmark activity body {i} " * 8,
+            "occurred_at": start + timedelta(minutes=i),
+            "owner_id": owner_id,
+            "created_at": start + timedelta(minutes=i),
+        }
+        for i in range(activities)
+    ]
+    with main.engine.begin() as conn:
+        conn.execute(main.Activity.__table__.insert(), rows)
+        conn.execute(main.Task.__table__.insert(), [{
+            "linked_type": "lead", "linked_id": 1, "title": "Bench task", "status": "open",
+            "owner_id": owner_id, "created_at": start, "updated_at": start,
+        }])
+
+
+async def cheap_load(app, headers, requests, concurrency):
+    latencies = []
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            status, elapsed = await timed_request(app, "GET", "/tasks/1", headers)
+            assert status == 200, status
+            latencies.append(elapsed)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+async def slow_load(app, headers, stop, slow_latencies):
+    # Sorting by created_at has no supporting index, so every request sorts all of the
+    # owner's activities; repeat until told to stop
+    while not stop.is_set():
+        status, elapsed = await timed_request(app, "GET", "/activities?sort=-created_at&limit=500", headers)
+        assert status == 200, status
+        slow_latencies.append(elapsed)
+
+
+async def run(args):
+    main = load_app()
+    # Every slow request must reach the database, not the cached response of the first one
+    main.response_cache.max_bytes = 0
+    owner_id, headers = create_user(main)
+    seed(main, owner_id, args.activities)
+
+    await cheap_load(main.app, headers, 50, 5)  # warm up connections and the principal cache
+    baseline = await cheap_load(main.app, headers, args.requests, args.concurrency)
+
+    stop = asyncio.Event()
+    slow_latencies = []
+    slow_task = asyncio.create_task(slow_load(main.app, headers, stop, slow_latencies))
+    await asyncio.sleep(0.05)
+    contended = await cheap_load(main.app, headers, args.requests, args.concurrency)
+    stop.set()
+    await slow_task
+
+    base, busy = summarize(baseline), summarize(contended)
+    print(f"{args.activities} activities, {args.requests} cheap requests at concurrency {args.concurrency}")
+    print(format_summary("cheap (idle)", base))
+    print(format_summary("cheap (during slow query)", busy))
+    print(format_summary("slow list query", summarize(slow_latencies)))
+    print(f"p99 ratio busy/idle: {busy['p99'] / base['p99']:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--activities", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
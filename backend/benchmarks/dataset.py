@@ -0,0 +1,280 @@
+"""Synthetic CRM dataset generator.
+
+Writes users, accounts, contacts, leads, activities and tasks straight into the
+tables of `main`, with the skew a real install has: a few owners hold most of
+the records, a few accounts have most of the contacts and leads, a few hot
+leads collect most of the activity, and recent months are busier than old
+ones. Derived state (dashboard stats, reporting rollups) is rebuilt afterwards;
+the full-text indexes are kept current by their triggers during the load.
+
+Seed a scratch database from the backend directory with:
+
+    python -m benchmarks.dataset --profile large --workdir /tmp/trailtrack-large
+"""
+import argparse
+import math
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from benchmarks.harness import load_app
+
+PROFILES = {
+    "small": {"users": 10, "accounts": 5000, "contacts": 20000, "leads": 10000, "activities": 50000, "tasks": 10000},
+    "medium": {"users": 25, "accounts": 25000, "contacts": 100000, "leads": 50000, "activities": 250000, "tasks": 50000},
+    "large": {"users": 50, "accounts": 100000, "contacts": 500000, "leads": 150000, "activities": 1000000, "tasks": 200000},
+}
+
+SYLLABLES = "ka lo mi ne ru sa ti vo ze pa qu bre dan fel gor hin jut kim".split()
+INDUSTRIES = ["Software", "Manufacturing", "Retail", "Healthcare", "Finance", "Logistics", "Education", "Energy"]
+SIZES = ["1-10", "11-50", "51-200", "201-1000", "1000+"]
+TITLES = ["CEO", "CTO", "Head of Sales", "Operations Manager", "Buyer", "Founder", "VP Marketing", None]
+SOURCES = ["web", "referral", "event", "outbound", "partner", None]
+# (stage, status, weight)
+STAGES = [
+    ("New", "open", 30), ("Qualified", "open", 20), ("Proposal", "open", 15), ("Negotiation", "open", 10),
+    ("Closed-Won", "closed_won", 12), ("Closed-Lost", "closed_lost", 13),
+]
+ACTIVITY_TYPES = [("note", 35), ("email", 30), ("call", 20), ("meeting", 10), ("sms", 5)]
+TASK_LINKS = [("lead", 60), ("account", 25), ("contact", 15)]
+TASK_STATUSES = [("open", 40), ("done", 55), ("canceled", 5)]
+PRIORITIES = [("low", 25), ("medium", 55), ("high", 20)]
+HISTORY_DAYS = 3 * 365
+
+
+def word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def weighted(choices):
+    values = [value for value, *_, weight in choices]
+    return values, [weight for *_, weight in choices]
+
+
+class Skewed:
+    """Picks indexes into a population with Zipf-like weights (index 0 is the heaviest)."""
+
+    def __init__(self, rng, size, exponent=1.1):
+        self.rng = rng
+        self.items = list(range(size))
+        total, self.cum_weights = 0.0, []
+        for rank in range(1, size + 1):
+            total += 1.0 / rank ** exponent
+            self.cum_weights.append(total)
+
+    def pick(self, k):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights, k=k)
+
+
+def recent_time(rng, now):
+    """A timestamp in the last HISTORY_DAYS, denser towards now."""
+    return now - timedelta(days=HISTORY_DAYS * rng.random() ** 2, seconds=rng.randrange(86400))
+
+
+def insert_batches(main, table, rows, batch=20000):
+    for offset in range(0, len(rows), batch):
+        with main.engine.begin() as conn:
+            conn.execute(table.insert(), rows[offset:offset + batch])
+
+
+def next_id(main, model):
+    with main.engine.connect() as conn:
+        return (conn.scalar(select(func.max(model.id))) or 0) + 1
+
+
+def create_users(main, count, prefix="user"):
+    """Insert `count` users sharing one password hash; returns their ids."""
+    password_hash = main.hash_password("bench")
+    now = datetime.utcnow()
+    first = next_id(main, main.User)
+    rows = [
+        {
+            "id": first + i, "email": f"{prefix}{first + i}@trailtrack.test", "name": f"{prefix.title()} {first + i}",
+            "role": "user", "password_hash": password_hash, "created_at": now, "updated_at": now,
+        }
+        for i in range(count)
+    ]
+    insert_batches(main, main.User.__table__, rows)
+    return [row["id"] for row in rows]
+
+
+def auth_headers(main, user_id):
+    with main.engine.connect() as conn:
+        email = conn.scalar(select(main.User.email).where(main.User.id == user_id))
+    return {"Authorization": f"Bearer {main.create_access_token(data={'sub': email})}"}
+
+
+def generate(main, owner_ids, accounts, contacts, leads, activities, tasks, seed=1):
+    """Insert records for `owner_ids` (the first owner is the busiest) and return their ids by table."""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    owners = Skewed(rng, len(owner_ids))
+
+    # Accounts, spread over owners by weight
+    first = next_id(main, main.Account)
+    account_owner = [owner_ids[i] for i in owners.pick(accounts)]
+    rows = []
+    for i, owner_id in enumerate(account_owner):
+        name = f"{word(rng).title()} {rng.choice(['Labs', 'Group', 'Systems', 'Works', 'Partners', 'Co'])}"
+        created = recent_time(rng, now)
+        rows.append({
+            "id": first + i, "name": name, "website": f"{name.split()[0].lower()}{first + i}.example",
+            "industry": rng.choice(INDUSTRIES), "size": rng.choice(SIZES), "phone": f"+1555{rng.randrange(10 ** 7):07d}",
+            "email": f"info@{name.split()[0].lower()}{first + i}.example", "city": word(rng).title(),
+            "country": rng.choice(["US", "US", "US", "GB", "DE", "CA"]), "notes": None,
+            "owner_id": owner_id, "created_at": created, "updated_at": created,
+        })
+    insert_batches(main, main.Account.__table__, rows)
+    account_ids = list(range(first, first + accounts))
+    account_picker = Skewed(rng, accounts, exponent=0.8)
+
+    # Contacts, clustered on the popular accounts
+    first = next_id(main, main.Contact)
+    rows = []
+    contact_account = account_picker.pick(contacts)
+    for i, a in enumerate(contact_account):
+        first_name, last_name = word(rng).title(), word(rng).title()
+        created = recent_time(rng, now)
+        rows.append({
+            "id": first + i, "account_id": account_ids[a], "first_name": first_name, "last_name": last_name,
+            "title": rng.choice(TITLES), "email": f"{first_name.lower()}.{last_name.lower()}{first + i}@example.com",
+            "phone": f"+1555{rng.randrange(10 ** 7):07d}" if rng.random() < 0.6 else None, "notes": None,
+            "owner_id": account_owner[a], "created_at": created, "updated_at": created,
+        })
+    insert_batches(main, main.Contact.__table__, rows)
+    contact_ids = list(range(first, first + contacts))
+    contact_owner = [account_owner[a] for a in contact_account]
+
+    # Leads, on the same popular accounts; stage mix and log-normal deal sizes
+    first = next_id(main, main.Lead)
+    stage_values, stage_weights = weighted(STAGES)
+    stage_status = {stage: status for stage, status, _ in STAGES}
+    rows = []
+    lead_account = account_picker.pick(leads)
+    for i, a in enumerate(lead_account):
+        stage = rng.choices(stage_values, stage_weights)[0]
+        created = recent_time(rng, now)
+        close = created + timedelta(days=rng.randrange(7, 180)) if rng.random() < 0.8 else None
+        rows.append({
+            "id": first + i, "title": f"{word(rng).title()} {rng.choice(['renewal', 'expansion', 'pilot', 'rollout'])}",
+            "account_id": account_ids[a], "primary_contact_id": contact_ids[rng.randrange(contacts)] if contacts and rng.random() < 0.5 else None,
+            "stage": stage, "value_cents": int(math.exp(rng.gauss(13, 1.2))), "probability": rng.randrange(0, 101, 10),
+            "expected_close_date": close, "source": rng.choice(SOURCES), "owner_id": account_owner[a],
+            "status": stage_status[stage], "created_at": created, "updated_at": created + timedelta(days=rng.randrange(30)),
+        })
+    insert_batches(main, main.Lead.__table__, rows)
+    lead_ids = list(range(first, first + leads))
+    lead_owner = [account_owner[a] for a in lead_account]
+    lead_picker = Skewed(rng, leads, exponent=0.9)
+
+    # Activities; most belong to a (hot) lead, the rest to an account
+    first = next_id(main, main.Activity)
+    type_values, type_weights = weighted(ACTIVITY_TYPES)
+    rows = []
+    for i in range(activities):
+        if leads and rng.random() < 0.7:
+            n = lead_picker.pick(1)[0]
+            lead_id, account_id, owner_id = lead_ids[n], account_ids[lead_account[n]], lead_owner[n]
+        else:
+            a = account_picker.pick(1)[0]
+            lead_id, account_id, owner_id = None, account_ids[a], account_owner[a]
+        occurred = recent_time(rng, now)
+        kind = rng.choices(type_values, type_weights)[0]
+        rows.append({
+            "id": first + i, "lead_id": lead_id, "account_id": account_id, "contact_id": None, "type": kind,
+            "subject": f"{kind.title()} about {word(rng)}", "body": " ".join(word(rng) for _ in range(rng.randint(5, 20))),
+            "occurred_at": occurred, "duration_minutes": rng.choice([None, 15, 30, 45, 60]) if kind in ("call", "meeting") else None,
+            "owner_id": owner_id, "created_at": occurred,
+        })
+        if len(rows) == 50000:
+            insert_batches(main, main.Activity.__table__, rows)
+            rows = []
+    insert_batches(main, main.Activity.__table__, rows)
+
+    # Tasks; open ones are due around now, finished ones in the past
+    first = next_id(main, main.Task)
+    link_values, link_weights = weighted(TASK_LINKS)
+    status_values, status_weights = weighted(TASK_STATUSES)
+    priority_values, priority_weights = weighted(PRIORITIES)
+    rows = []
+    for i in range(tasks):
+        linked_type = rng.choices(link_values, link_weights)[0]
+        if linked_type == "lead" and leads:
+            n = lead_picker.pick(1)[0]
+            linked_id, owner_id = lead_ids[n], lead_owner[n]
+        elif linked_type == "contact" and contacts:
+            n = rng.randrange(contacts)
+            linked_id, owner_id = contact_ids[n], contact_owner[n]
+        else:
+            linked_type, a = "account", account_picker.pick(1)[0]
+            linked_id, owner_id = account_ids[a], account_owner[a]
+        status = rng.choices(status_values, status_weights)[0]
+        created = recent_time(rng, now)
+        if status == "open":
+            due = now + timedelta(days=rng.randrange(-14, 45), hours=rng.randrange(24)) if rng.random() < 0.9 else None
+        else:
+            due = created + timedelta(days=rng.randrange(1, 30))
+        rows.append({
+            "id": first + i, "linked_type": linked_type, "linked_id": linked_id, "title": f"Follow up {word(rng)}",
+            "due_at": due, "priority": rng.choices(priority_values, priority_weights)[0], "status": status,
+            "owner_id": owner_id, "created_at": created, "updated_at": created,
+        })
+    insert_batches(main, main.Task.__table__, rows)
+
+    return {"accounts": account_ids, "contacts": contact_ids, "leads": lead_ids}
+
+
+def rebuild_derived(main):
+    """Recompute what the write layer normally maintains for rows inserted behind its back."""
+    db = main.SessionLocal()
+    try:
+        expected = main.compute_owner_stats(db)
+        db.query(main.OwnerStats).delete(synchronize_session=False)
+        db.add_all(main.OwnerStats(owner_id=owner_id, **values) for owner_id, values in expected.items())
+        db.commit()
+    finally:
+        db.close()
+    with main.engine.begin() as conn:
+        main.rebuild_report_rollups(conn)
+        main.rebuild_duplicate_keys(conn)
+        main.stamp_unsynced(conn)
+
+
+def seed(main, profile, seed=1, **overrides):
+    """Create a profile's users and records; returns the user ids, busiest first."""
+    counts = {**PROFILES[profile], **{k: v for k, v in overrides.items() if v is not None}}
+    user_ids = create_users(main, counts.pop("users"))
+    generate(main, user_ids, seed=seed, **counts)
+    rebuild_derived(main)
+    return user_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--workdir", help="directory for trailtrack_crm.db (default: a new temporary directory)")
+    parser.add_argument("--seed", type=int, default=1)
+    for name in PROFILES["small"]:
+        parser.add_argument(f"--{name}", type=int, help=f"override the profile's {name} count")
+    args = parser.parse_args()
+
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+    app = load_app(args.workdir)
+    started = time.perf_counter()
+    overrides = {name: getattr(args, name) for name in PROFILES["small"]}
+    user_ids = seed(app, args.profile, args.seed, **overrides)
+    with app.engine.connect() as conn:
+        counts = {
+            model.__tablename__: conn.scalar(select(func.count()).select_from(model))
+            for model in (app.User, app.Account, app.Contact, app.Lead, app.Activity, app.Task)
+        }
+    print(f"Seeded {os.path.abspath('trailtrack_crm.db')} in {time.perf_counter() - started:.1f}s")
+    print(", ".join(f"{count} {table}" for table, count in counts.items()) + f"; busiest owner is user {user_ids[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Shared helpers for the backend benchmarks.
+
+Benchmarks drive the FastAPI app in-process through its ASGI interface, so
+requests share one event loop exactly like they do inside a uvicorn worker.
+Each run works on a throwaway database in a temporary directory.
+"""
+import asyncio
+import math
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app(workdir=None):
+    """Import `main` with the working directory pointed at a scratch database."""
+    workdir = workdir or tempfile.mkdtemp(prefix="trailtrack-bench-")
+    os.chdir(workdir)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import main
+
+    main.run_migrations(main.engine)
+    return main
+
+
+def create_user(main, email="bench@trailtrack.test", name="Bench User"):
+    """Insert a user directly and return (user id, auth headers)."""
+    db = main.SessionLocal()
+    try:
+        user = main.User(email=email, name=name, role="user", password_hash=main.hash_password("bench"))
+        db.add(user)
+        db.commit()
+        token = main.create_access_token(data={"sub": email})
+        return user.id, {"Authorization": f"Bearer {token}"}
+    finally:
+        db.close()
+
+
+async def asgi_request(app, method, path, headers=None, body=b""):
+    """Send one HTTP request straight to an ASGI app and return (status, headers, body)."""
+    url = urlsplit(path)
+    raw_headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in (headers or {}).items()]
+    if body:
+        raw_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": url.path,
+        "raw_path": url.path.encode("latin-1"),
+        "query_string": url.query.encode("latin-1"),
+        "root_path": "",
+        "headers": raw_headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+    pending = [{"type": "http.request", "body": body, "more_body": False}]
+    response = {"status": None, "headers": [], "body": []}
+
+    async def receive():
+        if pending:
+            return pending.pop(0)
+        # The client never disconnects; block until the app stops listening.
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    headers_out = {k.decode("latin-1"): v.decode("latin-1") for k, v in response["headers"]}
+    return response["status"], headers_out, b"".join(response["body"])
+
+
+async def timed_request(app, method, path, headers=None, body=b""):
+    started = time.perf_counter()
+    status, _, _ = await asgi_request(app, method, path, headers, body)
+    return status, (time.perf_counter() - started) * 1000
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    # Nearest rank: the smallest sample with at least pct% of the samples at or below it
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "max": max(samples) if samples else 0.0,
+    }
+
+
+def format_summary(label, summary):
+    return (
+        f"{label:<28} n={summary['count']:<6} p50={summary['p50']:7.2f}ms "
+        f"p95={summary['p95']:7.2f}ms p99={summary['p99']:7.2f}ms max={summary['max']:7.2f}ms"
+    )
@@ -0,0 +1,208 @@
+"""Per-route latency and throughput against a seeded dataset, checked against the PRD budgets.
+
+Seeds a dataset profile (see benchmarks.dataset) plus one owner with exactly
+500 leads, then drives each route through the app's ASGI interface with a
+fixed number of concurrent clients. Requests are spread over the owners by
+the same skew as the data. The response cache is off unless `--cache` is
+given, so reads measure the query path. Prints p50/p95/p99 and requests per
+second per route and exits 1 if a budget is exceeded. Run from the backend
+directory:
+
+    python -m benchmarks.load --profile medium
+    python -m benchmarks.load --workdir /tmp/trailtrack-large --reuse   # a database seeded by benchmarks.dataset
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from benchmarks import dataset
+from benchmarks.harness import asgi_request, format_summary, load_app, summarize
+
+BUDGET_OWNER_EMAIL = "budget@trailtrack.test"
+BUDGET_OWNER_LEADS = 500
+
+# Route label -> (percentile, milliseconds). From the PRD success metrics.
+BUDGETS = {
+    "pipeline (500 leads)": ("p95", 1500.0),
+}
+
+
+def budget_owner(main):
+    """The owner the PRD budgets are measured for: 500 leads with their accounts, contacts and tasks.
+
+    Created on first use; the dashboard stats row is backfilled by the app itself.
+    """
+    with main.engine.connect() as conn:
+        user_id = conn.scalar(select(main.User.id).where(main.User.email == BUDGET_OWNER_EMAIL))
+    if user_id is None:
+        now = datetime.utcnow()
+        with main.engine.begin() as conn:
+            conn.execute(main.User.__table__.insert(), [{
+                "email": BUDGET_OWNER_EMAIL, "name": "Budget Owner", "role": "user",
+                "password_hash": main.hash_password("bench"), "created_at": now, "updated_at": now,
+            }])
+            user_id = conn.scalar(select(main.User.id).where(main.User.email == BUDGET_OWNER_EMAIL))
+        dataset.generate(
+            main, [user_id], accounts=150, contacts=400, leads=BUDGET_OWNER_LEADS, activities=3000, tasks=800, seed=500,
+        )
+        with main.engine.begin() as conn:
+            main.rebuild_report_rollups(conn, user_id)
+            main.stamp_unsynced(conn)
+    return user_id
+
+
+def sample_ids(main, model, owner_id, k=50):
+    with main.engine.connect() as conn:
+        ids = conn.scalars(select(model.id).where(model.owner_id == owner_id).limit(k)).all()
+    return ids or [0]
+
+
+def search_term(main, owner_id):
+    with main.engine.connect() as conn:
+        subject = conn.scalar(select(main.Activity.subject).where(main.Activity.owner_id == owner_id).limit(1))
+    return subject.split()[-1] if subject else "renewal"
+
+
+class Owner:
+    """Auth headers and sample record ids for one owner."""
+
+    def __init__(self, main, user_id):
+        self.id = user_id
+        self.headers = dataset.auth_headers(main, user_id)
+        self.lead_ids = sample_ids(main, main.Lead, user_id)
+        self.term = search_term(main, user_id)
+
+
+def routes():
+    """(label, pick owner, build request) for every measured route; request is (method, path, json body)."""
+    today = datetime.utcnow().date()
+    start, end = (today - timedelta(days=365)).isoformat(), today.isoformat()
+    return [
+        ("pipeline (500 leads)", "budget", lambda o, r: ("GET", "/pipeline", None)),
+        ("pipeline (busiest owner)", "busiest", lambda o, r: ("GET", "/pipeline", None)),
+        ("dashboard stats", "any", lambda o, r: ("GET", "/dashboard/stats", None)),
+        ("leads list", "any", lambda o, r: ("GET", "/leads?limit=100", None)),
+        ("leads by stage", "any", lambda o, r: ("GET", "/leads?stage=Proposal&sort=-value_cents&limit=100", None)),
+        ("accounts list", "any", lambda o, r: ("GET", "/accounts?limit=100", None)),
+        ("contacts list", "any", lambda o, r: ("GET", "/contacts?limit=100", None)),
+        ("activities list", "any", lambda o, r: ("GET", "/activities?limit=100", None)),
+        ("open tasks", "any", lambda o, r: ("GET", "/tasks?status=open&limit=100", None)),
+        ("lead detail", "any", lambda o, r: ("GET", f"/leads/{r.choice(o.lead_ids)}", None)),
+        ("lead timeline", "any", lambda o, r: ("GET", f"/leads/{r.choice(o.lead_ids)}/timeline?limit=50", None)),
+        ("search", "any", lambda o, r: ("GET", f"/search?q={o.term}", None)),
+        ("report pipeline", "any", lambda o, r: ("GET", "/reports/pipeline", None)),
+        ("report won-lost", "any", lambda o, r: ("GET", f"/reports/won-lost?period=month&start={start}&end={end}", None)),
+        ("report forecast", "any", lambda o, r: ("GET", f"/reports/forecast?period=month&start={end}", None)),
+        ("create lead", "any", lambda o, r: ("POST", "/leads", {"title": f"Load test {r.random():.6f}", "value_cents": 50000})),
+        ("move lead stage", "any", lambda o, r: (
+            "PATCH", f"/leads/{r.choice(o.lead_ids)}", {"stage": r.choice(["Qualified", "Proposal", "Negotiation"])},
+        )),
+    ]
+
+
+async def drive(main, owners, picker, build, requests, concurrency, seed):
+    rng = random.Random(seed)
+    plan = []
+    for _ in range(requests):
+        owner = owners[picker(rng)]
+        method, path, payload = build(owner, rng)
+        headers = dict(owner.headers)
+        body = b""
+        if payload is not None:
+            headers["Content-Type"] = "application/json"
+            body = json.dumps(payload).encode("utf-8")
+        plan.append((method, path, headers, body))
+
+    latencies, failures = [], []
+    queue = iter(plan)
+
+    async def client():
+        for method, path, headers, body in queue:
+            started = time.perf_counter()
+            status, _, content = await asgi_request(main.app, method, path, headers, body)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                failures.append(f"{method} {path} -> {status} {content[:200]!r}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, failures, requests / (time.perf_counter() - started)
+
+
+async def run(args):
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+    main = load_app(args.workdir)
+    if not args.cache:
+        main.response_cache.max_bytes = 0
+
+    seeded = time.perf_counter()
+    if args.reuse:
+        with main.engine.connect() as conn:
+            user_ids = conn.scalars(
+                select(main.Lead.owner_id).where(main.Lead.owner_id.is_not(None))
+                .group_by(main.Lead.owner_id).order_by(func.count().desc())
+            ).all()
+    else:
+        user_ids = dataset.seed(main, args.profile)
+    budget_id = budget_owner(main)
+    if not args.reuse:
+        print(f"Seeded profile {args.profile!r} in {time.perf_counter() - seeded:.1f}s")
+
+    owners = [Owner(main, user_id) for user_id in user_ids if user_id != budget_id] + [Owner(main, budget_id)]
+    spread = range(len(owners) - 1)
+    weights = dataset.Skewed(random.Random(0), len(spread)).cum_weights
+    pickers = {
+        "budget": lambda rng: -1,
+        "busiest": lambda rng: 0,
+        "any": lambda rng: rng.choices(spread, cum_weights=weights)[0],
+    }
+
+    print(f"{len(owners)} owners, {args.requests} requests per route at concurrency {args.concurrency}"
+          f"{'' if args.cache else ', response cache off'}")
+    failed = []
+    for label, who, build in routes():
+        if args.only and not any(name in label for name in args.only):
+            continue
+        await drive(main, owners, pickers[who], build, min(args.requests, 5), 1, seed=1)  # warm up
+        latencies, errors, throughput = await drive(
+            main, owners, pickers[who], build, args.requests, args.concurrency, seed=2,
+        )
+        summary = summarize(latencies)
+        line = format_summary(label, summary) + f" {throughput:7.1f} req/s"
+        if label in BUDGETS:
+            pct, limit = BUDGETS[label]
+            ok = summary[pct] <= limit
+            line += f"  budget {pct}<={limit:.0f}ms {'ok' if ok else 'FAIL'}"
+            if not ok:
+                failed.append(f"{label}: {pct} {summary[pct]:.1f}ms exceeds {limit:.0f}ms")
+        print(line)
+        if errors:
+            failed.append(f"{label}: {len(errors)} failed request(s), first: {errors[0]}")
+
+    for message in failed:
+        print(f"FAIL {message}")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", choices=sorted(dataset.PROFILES), default="small")
+    parser.add_argument("--workdir", help="directory for trailtrack_crm.db (default: a new temporary directory)")
+    parser.add_argument("--reuse", action="store_true", help="measure the already seeded --workdir database")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--cache", action="store_true", help="leave the response cache on")
+    parser.add_argument("--only", nargs="*", help="only routes whose label contains one of these words")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
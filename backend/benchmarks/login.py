@@ -0,0 +1,89 @@
+"""Login throughput and its effect on concurrent CRUD latency.
+
+Fires a burst of concurrent logins (bcrypt verification on the hashing pool)
+while a steady stream of cheap authenticated reads runs alongside, and reports
+login throughput, 503 rejections and read latency. Run from the backend directory:
+
+    BCRYPT_ROUNDS=12 python -m benchmarks.login --users 20 --logins 200
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.harness import create_user, format_summary, load_app, summarize, timed_request
+
+
+def seed(main, users):
+    # Hash once and reuse: every account shares the same password for the burst
+    password_hash = main.hash_password("bench-password")
+    with main.engine.begin() as conn:
+        conn.execute(main.User.__table__.insert(), [
+            {"email": f"login{i}@trailtrack.test", "name": f"Login {i}", "role": "user", "password_hash": password_hash}
+            for i in range(users)
+        ])
+
+
+async def read_load(app, headers, stop):
+    latencies = []
+    while not stop.is_set():
+        status, elapsed = await timed_request(app, "GET", "/dashboard/stats", headers)
+        assert status == 200, status
+        latencies.append(elapsed)
+    return latencies
+
+
+async def login_burst(app, users, logins, concurrency):
+    latencies, statuses = [], {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login(i):
+        body = json.dumps({"email": f"login{i % users}@trailtrack.test", "password": "bench-password"}).encode()
+        async with semaphore:
+            status, elapsed = await timed_request(app, "POST", "/auth/login", {"content-type": "application/json"}, body)
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == 200:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login(i) for i in range(logins)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+async def run(args):
+    main = load_app()
+    _, headers = create_user(main)
+    seed(main, args.users)
+
+    stop = asyncio.Event()
+    idle_reads = asyncio.create_task(read_load(main.app, headers, stop))
+    await asyncio.sleep(args.idle_seconds)
+    stop.set()
+    idle = await idle_reads
+
+    stop = asyncio.Event()
+    busy_reads = asyncio.create_task(read_load(main.app, headers, stop))
+    login_latencies, statuses, elapsed = await login_burst(main.app, args.users, args.logins, args.concurrency)
+    stop.set()
+    busy = await busy_reads
+
+    print(f"bcrypt rounds={main.BCRYPT_ROUNDS} workers={main.PASSWORD_HASH_WORKERS} "
+          f"max pending={main.PASSWORD_HASH_MAX_PENDING}")
+    print(f"{args.logins} logins in {elapsed:.2f}s = {len(login_latencies) / elapsed:.1f} successful logins/s, "
+          f"status counts {dict(sorted(statuses.items()))}")
+    print(format_summary("login", summarize(login_latencies)))
+    print(format_summary("reads (no logins)", summarize(idle)))
+    print(format_summary("reads (during logins)", summarize(busy)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--idle-seconds", type=float, default=2.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Full-text search latency over a large activity table.
+
+Seeds activities spread across several owners with a skewed vocabulary, then
+times `GET /search` and `GET /activities?q=` for common, rare and prefix terms.
+Run from the backend directory:
+
+    python -m benchmarks.search --activities 1000000
+"""
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from benchmarks.harness import create_user, format_summary, load_app, summarize, timed_request
+
+SYLLABLES = "ka lo mi ne ru sa ti vo ze pa qu bre dan fel gor hin jut kim".split()
+
+
+def vocabulary(size):
+    """Deterministic pseudo-words, most frequent first."""
+    words = []
+    for i in range(size):
+        word, n = "", i + len(SYLLABLES)
+        while n:
+            n, r = divmod(n, len(SYLLABLES))
+            word += SYLLABLES[r]
+        words.append(word)
+    return words
+
+
+WORDS = vocabulary(20000)
+
+
+def seed(main, owner_ids, activities, batch=50000):
+    rng = random.Random(7)
+    # Zipf-distributed word frequencies, like natural-language notes
+    cum_weights, total = [], 0.0
+    for rank in range(1, len(WORDS) + 1):
+        total += 1.0 / rank
+        cum_weights.append(total)
+    start = datetime.utcnow() - timedelta(days=3 * 365)
+    with main.engine.begin() as conn:
+        for offset in range(0, activities, batch):
+            rows = []
+            for i in range(offset, min(offset + batch, activities)):
+                body = " ".join(rng.choices(WORDS, cum_weights=cum_weights, k=30))
+                rows.append({
+                    "type": "note",
+                    "subject": f"{WORDS[i % len(WORDS)]} notes {i}",
+                    "body": body,
+                    "occurred_at": start + timedelta(minutes=i),
+                    "owner_id": owner_ids[i % len(owner_ids)],
+                    "created_at": start + timedelta(minutes=i),
+                })
+            conn.execute(main.Activity.__table__.insert(), rows)
+
+
+async def measure(app, headers, path, repeats):
+    latencies = []
+    for _ in range(repeats):
+        status, elapsed = await timed_request(app, "GET", path, headers)
+        assert status == 200, (path, status)
+        latencies.append(elapsed)
+    return latencies
+
+
+async def run(args):
+    main = load_app()
+    users = [create_user(main, email=f"search{i}@trailtrack.test") for i in range(args.owners)]
+    seed(main, [owner_id for owner_id, _ in users], args.activities)
+    _, headers = users[0]
+
+    print(f"{args.activities} activities across {args.owners} owners")
+    for label, path in [
+        ("search frequent term", f"/search?q={WORDS[20]}"),
+        ("search mid-frequency term", f"/search?q={WORDS[500]}"),
+        ("search rare term", f"/search?q={WORDS[10000]}"),
+        ("search prefix", f"/search?q={WORDS[500][:4]}"),
+        ("search two terms", f"/search?q={WORDS[50]}%20{WORDS[300]}"),
+        ("activities?q= frequent", f"/activities?q={WORDS[20]}&limit=50"),
+        ("activities?q= rare", f"/activities?q={WORDS[10000]}&limit=50"),
+    ]:
+        await measure(main.app, headers, path, 3)
+        print(format_summary(label, summarize(await measure(main.app, headers, path, args.repeats))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--activities", type=int, default=1000000)
+    parser.add_argument("--owners", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=50)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Serialization cost of large list payloads.
+
+Seeds leads and times turning a page of rows into a JSON body three ways:
+the old path (ORM instances walked by jsonable_encoder), the read-model
+column tuples rendered like FastAPI's JSONResponse, and the same tuples
+rendered with orjson (FAST_JSON=true). Run from the backend directory:
+
+    python -m benchmarks.serialization --rows 10000
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+
+from benchmarks.harness import create_user, format_summary, load_app, summarize
+
+STAGES = ["New", "Qualified", "Proposal", "Negotiation", "Closed-Won", "Closed-Lost"]
+
+
+def seed(main, owner_id, rows):
+    rng = random.Random(11)
+    start = datetime.utcnow() - timedelta(days=365)
+    leads = []
+    for i in range(rows):
+        created = start + timedelta(minutes=i * 30)
+        leads.append({
+            "title": f"Opportunity {i}",
+            "stage": rng.choice(STAGES),
+            "value_cents": rng.randrange(1000, 10000000),
+            "probability": rng.randrange(0, 101, 10),
+            "expected_close_date": created + timedelta(days=rng.randrange(10, 120)) if rng.random() < 0.7 else None,
+            "source": rng.choice(["web", "referral", "event", None]),
+            "owner_id": owner_id,
+            "status": "open",
+            "created_at": created,
+            "updated_at": created,
+        })
+    with main.engine.begin() as conn:
+        conn.execute(main.Lead.__table__.insert(), leads)
+
+
+def orm_before(main, db, owner_id):
+    """What list endpoints did before read models: ORM rows through jsonable_encoder."""
+    rows = db.scalars(select(main.Lead).where(main.Lead.owner_id == owner_id)).all()
+    body = json.dumps(
+        jsonable_encoder(rows), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+    db.expunge_all()
+    return body
+
+
+def row_tuples(main, db, owner_id):
+    """What paginate() does now: read-model columns as tuples, rendered by render_json."""
+    names = list(main.LeadRead.model_fields)
+    query = select(*[getattr(main.Lead, name) for name in names]).where(main.Lead.owner_id == owner_id)
+    return main.render_json([dict(zip(names, row)) for row in db.execute(query)])
+
+
+def measure(fn, repeats):
+    fn()
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def run(args):
+    main = load_app()
+    owner_id, _ = create_user(main)
+    seed(main, owner_id, args.rows)
+    db = main.SessionLocal()
+    try:
+        bodies = {}
+        cases = [
+            ("ORM + jsonable_encoder", False, orm_before),
+            ("row tuples + json", False, row_tuples),
+        ]
+        if main.orjson is not None:
+            cases.append(("row tuples + orjson", True, row_tuples))
+        else:
+            print("orjson is not installed; skipping the FAST_JSON case")
+
+        print(f"{args.rows} leads, full fetch and render per sample")
+        for label, fast, fn in cases:
+            main.FAST_JSON = fast
+            bodies[label] = fn(main, db, owner_id)
+            samples = measure(lambda: fn(main, db, owner_id), args.repeats)
+            print(format_summary(label, summarize(samples)) + f" body={len(bodies[label]) / 1024:.0f}KiB")
+
+        baseline = json.loads(bodies["ORM + jsonable_encoder"])
+        for label, body in bodies.items():
+            assert json.loads(body) == baseline, f"{label} renders a different payload"
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=20)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
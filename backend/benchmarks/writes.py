@@ -0,0 +1,176 @@
+"""Write throughput with several worker processes sharing one database.
+
+Starts `--workers` processes, each importing the app the way a uvicorn worker
+would, and has every worker create and patch leads through the ASGI interface
+from `--concurrency` concurrent clients. This runs once per storage
+configuration, each on a fresh database: the old rollback journal with full
+fsyncs, WAL with synchronous=NORMAL, and WAL with the group-commit writer.
+Reports requests per second across all workers, latency percentiles and the
+number of failed requests (e.g. "database is locked"). Run from the backend
+directory:
+
+    python -m benchmarks.writes --workers 4 --requests 500
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+
+from sqlalchemy import select
+
+from benchmarks.harness import asgi_request, format_summary, load_app, summarize
+
+CONFIGS = {
+    "rollback journal": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "GROUP_COMMIT": "false"},
+    "wal": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL", "GROUP_COMMIT": "false"},
+    "wal + group commit": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL", "GROUP_COMMIT": "true"},
+}
+LEADS_PER_WORKER = 20  # seeded per worker as targets for the patches
+
+
+def worker_email(index):
+    return f"writer{index}@trailtrack.test"
+
+
+def prepare(workdir, env, workers):
+    """Create the schema, one user per worker and their leads (in its own process, so the journal mode sticks)."""
+    os.environ.update(env)
+    main = load_app(workdir)
+    with main.engine.begin() as conn:
+        conn.execute(main.User.__table__.insert(), [
+            {"email": worker_email(i), "name": f"Writer {i}", "role": "user", "password_hash": "-"}
+            for i in range(workers)
+        ])
+        user_ids = conn.scalars(select(main.User.id).where(main.User.email.like("writer%"))).all()
+        conn.execute(main.Lead.__table__.insert(), [
+            {"title": f"Seed {i}", "owner_id": user_id, "stage": "New", "status": "open", "value_cents": 0}
+            for user_id in user_ids for i in range(LEADS_PER_WORKER)
+        ])
+        main.stamp_unsynced(conn)
+
+
+async def drive(main, index, requests, concurrency, start):
+    headers = {
+        "Authorization": f"Bearer {main.create_access_token(data={'sub': worker_email(index)})}",
+        "Content-Type": "application/json",
+    }
+    with main.engine.connect() as conn:
+        lead_ids = conn.scalars(
+            select(main.Lead.id).join(main.User, main.User.id == main.Lead.owner_id)
+            .where(main.User.email == worker_email(index))
+        ).all()
+    await main.start_background_jobs()
+
+    plan = []
+    for i in range(requests):
+        if i % 2:
+            body = {"stage": ("Qualified", "Proposal", "Negotiation")[i % 3], "value_cents": i * 100}
+            plan.append(("PATCH", f"/leads/{lead_ids[i % len(lead_ids)]}", json.dumps(body).encode()))
+        else:
+            plan.append(("POST", "/leads", json.dumps({"title": f"Lead {index}-{i}", "value_cents": 5000}).encode()))
+    pending = iter(plan)
+    latencies, failures = [], []
+
+    async def client():
+        for method, path, body in pending:
+            started = time.perf_counter()
+            try:
+                status, _, content = await asgi_request(main.app, method, path, headers, body)
+            except Exception as exc:  # unhandled errors (e.g. database is locked) surface as a 500
+                status, content = 500, repr(exc).encode()
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                failures.append(f"{method} {path} -> {status} {content[:120]!r}")
+
+    start.wait()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    await main.stop_background_jobs()
+    return latencies, failures
+
+
+def worker(workdir, env, index, requests, concurrency, start, results):
+    os.environ.update(env)
+    main = load_app(workdir)
+    try:
+        latencies, failures = asyncio.run(drive(main, index, requests, concurrency, start))
+    except Exception as exc:
+        # Report instead of leaving the parent waiting for this worker's results
+        start.abort()
+        latencies, failures = [], [f"worker {index} failed: {exc!r}"]
+    results.put((latencies, failures, time.perf_counter()))
+
+
+def measure(label, env, args):
+    workdir = tempfile.mkdtemp(prefix="trailtrack-writes-")
+    env = {**env, "SCHEDULER_ENABLED": "false"}
+    context = multiprocessing.get_context("spawn")
+    try:
+        setup = context.Process(target=prepare, args=(workdir, env, args.workers))
+        setup.start()
+        setup.join()
+        if setup.exitcode != 0:
+            raise RuntimeError(f"preparing the {label!r} database failed")
+
+        start = context.Barrier(args.workers + 1)
+        results = context.Queue()
+        processes = [
+            context.Process(target=worker, args=(workdir, env, i, args.requests, args.concurrency, start, results))
+            for i in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            start.wait(timeout=120)
+        except threading.BrokenBarrierError:
+            pass
+        started = time.perf_counter()
+        outcomes = []
+        while len(outcomes) < len(processes):
+            try:
+                outcomes.append(results.get(timeout=5))
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    raise RuntimeError(f"a {label!r} worker exited without reporting")
+        for process in processes:
+            process.join()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies = [value for outcome in outcomes for value in outcome[0]]
+    failures = [failure for outcome in outcomes for failure in outcome[1]]
+    elapsed = max(outcome[2] for outcome in outcomes) - started
+    throughput = len(latencies) / elapsed
+    print(format_summary(label, summarize(latencies)) + f" {throughput:7.1f} req/s  {len(failures)} failed")
+    if failures:
+        print(f"  first failure: {failures[0]}")
+    return throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=500, help="requests per worker (half creates, half patches)")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients per worker")
+    parser.add_argument("--only", nargs="*", choices=sorted(CONFIGS))
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers x {args.requests} writes at concurrency {args.concurrency}")
+    throughput = {}
+    for label, env in CONFIGS.items():
+        if not args.only or label in args.only:
+            throughput[label] = measure(label, env, args)
+    baseline = throughput.get("rollback journal")
+    if baseline:
+        for label, value in throughput.items():
+            if label != "rollback journal":
+                print(f"{label}: {value / baseline:.2f}x the rollback journal's throughput")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,123 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, Query, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, Float, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Date, DateTime, Boolean, Text, Float, ForeignKey, or_, and_, case, func, literal, select, union_all, update, insert, event, inspect, Index, text, literal_column
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
-from pydantic import BaseModel
-from typing import List, Optional
+from sqlalchemy.orm import sessionmaker, Session, relationship, object_session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.types import LargeBinary, TypeDecorator
+from multipart.multipart import MultipartParser, parse_options_header
+from pydantic import BaseModel, ConfigDict, ValidationError
+from typing import Any, List, NamedTuple, Optional, Union
+from collections import OrderedDict, deque
+from difflib import SequenceMatcher
+from contextvars import ContextVar
+from itertools import islice
+import heapq
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+import anyio
+import asyncio
 import jwt
 import bcrypt
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
+import base64
+import bisect
+import copy
+import csv
+from email.message import EmailMessage
+import hashlib
+import io
+import json
+import logging
 import os
+import re
+import smtplib
+import tempfile
+import threading
+import time
+import unicodedata
+import zlib
+
+try:
+    import orjson
+except ImportError:  # optional; only needed for FAST_JSON
+    orjson = None
 
 # Database setup
-SQLALCHEMY_DATABASE_URL = "sqlite:///./trailtrack_crm.db"
+DATABASE_URL = make_url(os.getenv("DATABASE_URL", "sqlite:///./trailtrack_crm.db"))
+SQLALCHEMY_DATABASE_URL = DATABASE_URL.set(drivername="sqlite")
+ASYNC_SQLALCHEMY_DATABASE_URL = DATABASE_URL.set(drivername="sqlite+aiosqlite")
+# WAL lets readers run alongside the single writer, and with synchronous=NORMAL a
+# commit only appends to the WAL (fsyncs happen at checkpoints). busy_timeout makes
+# a writer from another worker wait for the lock instead of failing with
+# "database is locked"; the driver only opens a transaction at the first write
+# statement, so a waiting writer never holds a stale read snapshot.
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))  # page cache per connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# GET requests use the read pool, everything else the write pool, so a burst of
+# writes waiting on the lock can't take the connections reads need
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+DB_WRITE_POOL_SIZE = int(os.getenv("DB_WRITE_POOL_SIZE", "4"))
+
+# The sync engine is kept for schema creation and maintenance commands (manage.py);
+# request handlers use the async engines so queries never block the event loop.
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=AsyncAdaptedQueuePool, pool_size=DB_WRITE_POOL_SIZE, max_overflow=0,
+)
+async_read_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=AsyncAdaptedQueuePool, pool_size=DB_READ_POOL_SIZE, max_overflow=0,
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
-app = FastAPI(title="TrailTrack CRM API")
+def configure_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+for _engine in (engine, async_engine.sync_engine, async_read_engine.sync_engine):
+    event.listen(_engine, "connect", configure_sqlite)
+
+# JSON rendering
+# FAST_JSON=true opts in to orjson (when installed) for every JSON response
+FAST_JSON = os.getenv("FAST_JSON", "false").lower() == "true" and orjson is not None
+
+def render_json(content) -> bytes:
+    """Render content exactly as FastAPI's default JSONResponse would.
+
+    Only values the encoder can't write natively (datetimes, read models, ...)
+    go through jsonable_encoder, rather than walking the whole payload first.
+    """
+    if FAST_JSON:
+        return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, default=jsonable_encoder, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """The app's default response class: FastAPI's JSONResponse, or orjson when FAST_JSON is on."""
+    
+    def render(self, content) -> bytes:
+        if FAST_JSON:
+            return render_json(content)
+        return super().render(content)
+
+app = FastAPI(title="TrailTrack CRM API", default_response_class=FastJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -30,6 +130,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Server-Timing", "X-Possible-Duplicates"],
 )
 
 security = HTTPBearer()
@@ -39,13 +140,73 @@ SECRET_KEY = os.getenv("SECRET_KEY", "trailtrack-secret-change-this")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Password hashing
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+# Authenticated principal cache
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+# Read response cache
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Instrumentation
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"  # /metrics is 404 unless enabled
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # when set, /metrics requires it as a bearer token
+
+# Reminders and daily digest
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"  # enable in one worker only
+DIGEST_HOUR_UTC = int(os.getenv("DIGEST_HOUR_UTC", "7"))
+SMTP_SERVER = os.getenv("SMTP_SERVER")  # digests are only logged when unset
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_FROM = os.getenv("SMTP_FROM") or SMTP_USERNAME or "trailtrack@localhost"
+
+# List pagination
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Delta sync
+SYNC_PAGE_SIZE = 500
+MAX_SYNC_PAGE_SIZE = 2000
+SYNC_TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", "90"))  # deletions kept for clients to pick up
+
+# Activity archive (see archive_activities)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))  # 0 disables archiving
+ARCHIVE_HOUR_UTC = int(os.getenv("ARCHIVE_HOUR_UTC", "3"))
+ARCHIVE_BATCH_SIZE = 1000
+
+# Duplicate detection (see find_duplicates)
+DUPLICATE_MIN_SCORE = 0.5  # candidates scoring lower aren't reported
+DUPLICATE_MAX_BLOCK = 100  # keys shared by more records than this are too common to compare on
+MAX_MERGE_DUPLICATES = 100
+
+# Batch writes
+MAX_BATCH_OPERATIONS = 100
+
+# Group commit (see GroupCommitWriter)
+GROUP_COMMIT = os.getenv("GROUP_COMMIT", "false").lower() == "true"
+GROUP_COMMIT_MAX_WRITES = int(os.getenv("GROUP_COMMIT_MAX_WRITES", "64"))
+GROUP_COMMIT_WAIT_MS = float(os.getenv("GROUP_COMMIT_WAIT_MS", "2"))
+
+# CSV import/export
+IMPORT_BATCH_SIZE = 1000
+MAX_IMPORT_ERRORS = 1000
+EXPORT_BATCH_SIZE = 1000
+
+# Attachments
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_FILE_SIZE_MB", "10")) * 1024 * 1024
+
 # Database dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db(request: Request):
+    sessions = AsyncReadSessionLocal if request.method in ("GET", "HEAD") else AsyncSessionLocal
+    async with sessions() as db:
         yield db
-    finally:
-        db.close()
 
 # Database Models
 class User(Base):
@@ -78,6 +239,7 @@ class Account(Base):
     owner_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = Column(Integer)  # position in the sync change feed, stamped on every write
     
     contacts = relationship("Contact", back_populates="account")
     leads = relationship("Lead", back_populates="account")
@@ -96,6 +258,7 @@ class Contact(Base):
     owner_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = Column(Integer)
     
     account = relationship("Account", back_populates="contacts")
 
@@ -115,12 +278,15 @@ class Lead(Base):
     status = Column(String, default="open")  # open, closed_won, closed_lost
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = Column(Integer)
     
     account = relationship("Account", back_populates="leads")
     activities = relationship("Activity", back_populates="lead")
 
 class Activity(Base):
     __tablename__ = "activities"
+    # Ids are never reused, so an archived (or deleted) activity's id can't name a new one
+    __table_args__ = {"sqlite_autoincrement": True}
     
     id = Column(Integer, primary_key=True, index=True)
     lead_id = Column(Integer, ForeignKey("leads.id"))
@@ -133,9 +299,39 @@ class Activity(Base):
     duration_minutes = Column(Integer)
     owner_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
+    change_seq = Column(Integer)
     
     lead = relationship("Lead", back_populates="activities")
 
+class CompressedText(TypeDecorator):
+    """Text stored as a zlib-compressed BLOB."""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else zlib.compress(value.encode("utf-8"))
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else zlib.decompress(value).decode("utf-8")
+
+class ArchivedActivity(Base):
+    """An activity moved out of `activities` by the archival job, keeping its id."""
+    __tablename__ = "activity_archive"
+    
+    id = Column(Integer, primary_key=True)
+    lead_id = Column(Integer)
+    account_id = Column(Integer)
+    contact_id = Column(Integer)
+    type = Column(String)
+    subject = Column(String)
+    body = Column(CompressedText)
+    occurred_at = Column(DateTime)
+    duration_minutes = Column(Integer)
+    owner_id = Column(Integer)
+    created_at = Column(DateTime)
+    change_seq = Column(Integer)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
 class Task(Base):
     __tablename__ = "tasks"
     
@@ -149,6 +345,746 @@ class Task(Base):
     owner_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = Column(Integer)
+
+class OwnerVersion(Base):
+    """Per-owner, per-table change counter, bumped in the transaction of every write."""
+    __tablename__ = "owner_versions"
+    
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class ChangeSequence(Base):
+    """The last change sequence number handed out (a single row).
+
+    Writers take it inside their transaction, so SQLite's single writer makes
+    sequence numbers commit in order. `pruned_through` is the newest sequence
+    whose tombstones have been pruned; cursors older than it can't be served.
+    """
+    __tablename__ = "change_sequence"
+    
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+    pruned_through = Column(Integer, nullable=False, default=0)
+
+class Tombstone(Base):
+    """A record deleted from (or reassigned away from) an owner, for the sync feed."""
+    __tablename__ = "tombstones"
+    
+    change_seq = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    entity = Column(String, nullable=False)  # accounts, contacts, leads, activities, tasks
+    record_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class OwnerStats(Base):
+    __tablename__ = "owner_stats"
+    
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_leads = Column(Integer, default=0)
+    open_leads = Column(Integer, default=0)
+    won_leads = Column(Integer, default=0)
+    lost_leads = Column(Integer, default=0)
+    pipeline_value_cents = Column(Integer, default=0)
+    total_accounts = Column(Integer, default=0)
+    open_tasks = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ReportRollup(Base):
+    __tablename__ = "report_rollups"
+    
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    kind = Column(String, primary_key=True)  # leads (bucketed by created_at), forecast (open leads by expected_close_date)
+    period = Column(String, primary_key=True)  # day, week, month
+    bucket = Column(Date, primary_key=True)  # first day of the period; weeks start on Monday
+    stage = Column(String, primary_key=True)
+    status = Column(String, primary_key=True)
+    source = Column(String, primary_key=True)  # "" when the lead has no source
+    lead_count = Column(Integer, default=0, nullable=False)
+    value_cents = Column(Integer, default=0, nullable=False)
+    weighted_value_cents = Column(Integer, default=0, nullable=False)  # sum of value_cents * probability / 100
+
+class LeadEvent(Base):
+    """Append-only change log for leads, written in the same transaction as the change."""
+    __tablename__ = "lead_events"
+    
+    id = Column(Integer, primary_key=True)
+    lead_id = Column(Integer, ForeignKey("leads.id"), nullable=False)
+    field = Column(String, nullable=False)  # stage, status, value_cents, owner_id, ...
+    old_value = Column(Text)  # JSON-encoded
+    new_value = Column(Text)  # JSON-encoded
+    occurred_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class AttachmentBlob(Base):
+    """One stored file per distinct content, shared by every attachment with that checksum."""
+    __tablename__ = "attachment_blobs"
+    
+    sha256 = Column(String, primary_key=True)
+    size_bytes = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Attachment(Base):
+    __tablename__ = "attachments"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    linked_type = Column(String, nullable=False)  # lead, account, contact, activity
+    linked_id = Column(Integer, nullable=False)
+    filename = Column(String, nullable=False)
+    mime_type = Column(String)
+    size_bytes = Column(Integer)
+    path = Column(String, nullable=False)  # blob path relative to UPLOAD_DIR
+    checksum = Column(String, ForeignKey("attachment_blobs.sha256"), nullable=False)  # SHA-256, hex
+    uploaded_at = Column(DateTime, default=datetime.utcnow)
+    owner_id = Column(Integer, ForeignKey("users.id"))
+
+class DuplicateKey(Base):
+    """A blocking key of an account or contact; records sharing one are duplicate candidates."""
+    __tablename__ = "duplicate_keys"
+    
+    entity = Column(String, primary_key=True)  # accounts, contacts
+    key = Column(String, primary_key=True)  # kind:value, e.g. email:ann@acme.com, phone:5550102030
+    record_id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id"))
+
+# Indexes for the owner-scoped list, filter and lookup queries (created by migration 3)
+Index("ix_accounts_owner_name", Account.owner_id, Account.name)
+Index("ix_contacts_owner_last_name", Contact.owner_id, Contact.last_name)
+Index("ix_contacts_account", Contact.account_id)
+Index("ix_leads_owner_status", Lead.owner_id, Lead.status)
+Index("ix_leads_owner_stage", Lead.owner_id, Lead.stage)
+Index("ix_leads_owner_created", Lead.owner_id, Lead.created_at)
+Index("ix_leads_account", Lead.account_id)
+# Ascending so a reverse scan yields (occurred_at DESC, id DESC), the activity keyset order
+Index("ix_activities_owner_occurred", Activity.owner_id, Activity.occurred_at)
+Index("ix_tasks_owner_status_due", Task.owner_id, Task.status, Task.due_at)
+Index("ix_tasks_owner_due", Task.owner_id, Task.due_at)
+Index("ix_tasks_linked", Task.linked_type, Task.linked_id)
+# Next open task per record for the pipeline board (created by migration 5)
+Index("ix_tasks_linked_status_due", Task.linked_type, Task.linked_id, Task.status, Task.due_at)
+# Per-lead timeline sources, newest first via reverse scans (created by migration 7,
+# which replaces migration 3's ix_activities_lead_occurred with the owner-scoped form)
+Index("ix_activities_lead_owner_occurred", Activity.lead_id, Activity.owner_id, Activity.occurred_at)
+Index("ix_tasks_linked_created", Task.linked_type, Task.linked_id, Task.created_at)
+Index("ix_lead_events_lead_occurred", LeadEvent.lead_id, LeadEvent.occurred_at)
+# Attachment listing per linked record (created by migration 8)
+Index("ix_attachments_owner_linked", Attachment.owner_id, Attachment.linked_type, Attachment.linked_id)
+# Open tasks by due time across owners, for the reminder scheduler and daily digest (created by migration 10)
+Index("ix_tasks_status_due", Task.status, Task.due_at)
+# Owner-scoped change feed scans (created by migration 11)
+Index("ix_accounts_owner_change_seq", Account.owner_id, Account.change_seq)
+Index("ix_contacts_owner_change_seq", Contact.owner_id, Contact.change_seq)
+Index("ix_leads_owner_change_seq", Lead.owner_id, Lead.change_seq)
+Index("ix_activities_owner_change_seq", Activity.owner_id, Activity.change_seq)
+Index("ix_tasks_owner_change_seq", Task.owner_id, Task.change_seq)
+Index("ix_tombstones_owner_change_seq", Tombstone.owner_id, Tombstone.change_seq)
+# Archived activities, in the same orders as their hot counterparts (created by migration 12)
+Index("ix_activity_archive_owner_occurred", ArchivedActivity.owner_id, ArchivedActivity.occurred_at)
+Index("ix_activity_archive_owner_created", ArchivedActivity.owner_id, ArchivedActivity.created_at)
+Index("ix_activity_archive_lead_owner_occurred", ArchivedActivity.lead_id, ArchivedActivity.owner_id, ArchivedActivity.occurred_at)
+# Blocking keys per record and per owner, and the merge's re-pointing lookups (created by migration 13)
+Index("ix_duplicate_keys_record", DuplicateKey.entity, DuplicateKey.record_id)
+Index("ix_duplicate_keys_owner", DuplicateKey.owner_id, DuplicateKey.entity, DuplicateKey.key)
+Index("ix_leads_primary_contact", Lead.primary_contact_id)
+Index("ix_activities_account", Activity.account_id)
+Index("ix_activities_contact", Activity.contact_id)
+Index("ix_activity_archive_account", ArchivedActivity.account_id)
+Index("ix_activity_archive_contact", ArchivedActivity.contact_id)
+Index("ix_attachments_linked", Attachment.linked_type, Attachment.linked_id)
+
+# Full-text search
+# Each searchable table has an external-content FTS5 index whose rowid is the row id,
+# kept in sync by triggers. owner_id is indexed too so owner scoping happens inside
+# the MATCH instead of filtering every hit afterwards.
+class SearchIndex(NamedTuple):
+    table: str
+    fts: str
+    columns: List[str]  # searchable text columns; the first is the record's title
+    snippet_column: Optional[str]
+
+SEARCH_INDEXES = {
+    "account": SearchIndex("accounts", "accounts_fts", ["name", "website", "industry", "city", "email", "notes"], "notes"),
+    "contact": SearchIndex("contacts", "contacts_fts", ["first_name", "last_name", "title", "email", "phone", "notes"], "notes"),
+    "lead": SearchIndex("leads", "leads_fts", ["title", "source", "stage"], None),
+    "activity": SearchIndex("activities", "activities_fts", ["subject", "body"], "body"),
+}
+
+def search_index_ddl(index: SearchIndex) -> List[str]:
+    columns = index.columns + ["owner_id"]
+    names = ", ".join(columns)
+    new_values = ", ".join(f"new.{c}" for c in columns)
+    old_values = ", ".join(f"old.{c}" for c in columns)
+    delete_old = f"INSERT INTO {index.fts}({index.fts}, rowid, {names}) VALUES ('delete', old.id, {old_values});"
+    insert_new = f"INSERT INTO {index.fts}(rowid, {names}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index.fts} USING fts5({names}, content='{index.table}', "
+        f"content_rowid='id', prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {index.fts}_ai AFTER INSERT ON {index.table} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {index.fts}_ad AFTER DELETE ON {index.table} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {index.fts}_au AFTER UPDATE OF {names} ON {index.table} "
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+def rebuild_search_indexes(conn):
+    for index in SEARCH_INDEXES.values():
+        conn.exec_driver_sql(f"INSERT INTO {index.fts}({index.fts}) VALUES ('rebuild')")
+
+# Archived activity bodies are compressed, so their index is contentless: it is
+# written with the plain text by the archive and restore paths, can't produce
+# highlights or snippets, and is rebuilt by decompressing the archive.
+ARCHIVE_SEARCH_INDEXES = {
+    "activity": SearchIndex("activity_archive", "activity_archive_fts", ["subject", "body"], None),
+}
+ARCHIVE_INDEX_INSERT = text(
+    "INSERT INTO activity_archive_fts(rowid, subject, body, owner_id) VALUES (:id, :subject, :body, :owner_id)"
+)
+ARCHIVE_INDEX_DELETE = text(
+    "INSERT INTO activity_archive_fts(activity_archive_fts, rowid, subject, body, owner_id) "
+    "VALUES ('delete', :id, :subject, :body, :owner_id)"
+)
+
+def create_archive_search_index(conn):
+    conn.exec_driver_sql(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS activity_archive_fts USING fts5(subject, body, owner_id, content='', "
+        "prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+    )
+
+def rebuild_archive_search_index(conn, batch: int = 1000):
+    conn.exec_driver_sql("INSERT INTO activity_archive_fts(activity_archive_fts) VALUES ('delete-all')")
+    columns = (ArchivedActivity.id, ArchivedActivity.subject, ArchivedActivity.body, ArchivedActivity.owner_id)
+    after = 0
+    while True:
+        rows = conn.execute(
+            select(*columns).where(ArchivedActivity.id > after).order_by(ArchivedActivity.id).limit(batch)
+        ).all()
+        if not rows:
+            return
+        conn.execute(ARCHIVE_INDEX_INSERT, [row._asdict() for row in rows])
+        after = rows[-1].id
+
+def merge_search_index(bind, fts: str, pages: int = 500):
+    """Merge an index's segments into one, `pages` at a time in short transactions.
+
+    Bulk deletes and batched inserts leave many small segments (and delete
+    markers) that every MATCH has to consult; FTS5's negative 'merge' works
+    towards a single segment without holding the write lock like 'optimize'.
+    """
+    while True:
+        with bind.begin() as conn:
+            before = conn.exec_driver_sql("SELECT total_changes()").scalar()
+            conn.exec_driver_sql(f"INSERT INTO {fts}({fts}, rank) VALUES ('merge', {-pages})")
+            if conn.exec_driver_sql("SELECT total_changes()").scalar() - before < 2:
+                return
+
+def create_search_indexes(conn):
+    for index in SEARCH_INDEXES.values():
+        for statement in search_index_ddl(index):
+            conn.exec_driver_sql(statement)
+    rebuild_search_indexes(conn)
+
+def fts_match(q: str, index: SearchIndex, owner_id: int) -> Optional[str]:
+    """Build an FTS5 query for the words of `q`, scoped to one owner's rows.
+
+    Only the last word is matched as a prefix (search-as-you-type); expanding every
+    word would merge the posting lists of all their completions.
+    """
+    terms = [f'"{term}"' for term in re.findall(r"\w+", q)]
+    if not terms:
+        return None
+    terms[-1] += "*"
+    phrase = " AND ".join(terms)
+    return f'owner_id : "{owner_id}" AND {{{" ".join(index.columns)}}} : ({phrase})'
+
+def fts_filter(model, kind: str, q: str, owner_id: int, indexes=SEARCH_INDEXES):
+    """Restrict a list query to rows whose search index matches `q`."""
+    index = indexes[kind]
+    match = fts_match(q, index, owner_id)
+    if match is None:
+        return literal(True)
+    matching_ids = (
+        select(literal_column("rowid"))
+        .select_from(text(index.fts))
+        .where(text(f"{index.fts} MATCH :fts_match").bindparams(fts_match=match))
+    )
+    return model.id.in_(matching_ids)
+
+# Reporting rollups
+# Lead counts and values per owner, period bucket, stage, status and source, kept
+# current by the lead write paths so reports never aggregate the leads table.
+REPORT_KINDS = ("leads", "forecast")
+REPORT_PERIODS = ("day", "week", "month")
+ROLLUP_MEASURES = ("lead_count", "value_cents", "weighted_value_cents")
+
+def period_start(value, period: str) -> date:
+    day = value.date() if isinstance(value, datetime) else value
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+def lead_report_rows(lead) -> dict:
+    """The rollup rows a lead counts towards, as {key: (lead_count, value, weighted value)}."""
+    rows = {}
+    if lead.owner_id is None:
+        return rows
+    dimensions = (lead.stage or "", lead.status or "", lead.source or "")
+    value = int(lead.value_cents or 0)
+    measures = (1, value, value * int(lead.probability or 0) // 100)
+    dates = {"leads": lead.created_at}
+    if lead.status == "open":
+        dates["forecast"] = lead.expected_close_date
+    for kind, when in dates.items():
+        if when:
+            for period in REPORT_PERIODS:
+                rows[(lead.owner_id, kind, period, period_start(when, period), *dimensions)] = measures
+    return rows
+
+def add_report_rows(deltas: dict, rows: dict, sign: int = 1):
+    for key, measures in rows.items():
+        current = deltas.get(key, (0, 0, 0))
+        deltas[key] = tuple(c + sign * m for c, m in zip(current, measures))
+
+async def apply_report_deltas(db: AsyncSession, deltas: dict):
+    params = [
+        dict(zip(ReportRollup.__table__.primary_key.columns.keys(), key), **dict(zip(ROLLUP_MEASURES, measures)))
+        for key, measures in deltas.items() if any(measures)
+    ]
+    if not params:
+        return
+    statement = sqlite_insert(ReportRollup)
+    await db.execute(
+        statement.on_conflict_do_update(
+            index_elements=list(ReportRollup.__table__.primary_key.columns),
+            set_={name: getattr(ReportRollup, name) + statement.excluded[name] for name in ROLLUP_MEASURES},
+        ),
+        params,
+    )
+
+async def record_report_change(db: AsyncSession, before: Optional[dict] = None, after: Optional[dict] = None):
+    """Move a lead's rollup contribution from its `before` rows to its `after` rows.
+
+    Like record_stats_change, call it before the commit; unchanged rows cancel out,
+    so an edit that touches no reported field writes nothing.
+    """
+    deltas = {}
+    add_report_rows(deltas, before or {}, -1)
+    add_report_rows(deltas, after or {})
+    await apply_report_deltas(db, deltas)
+
+def report_bucket(column, period: str):
+    if period == "week":
+        # Forward to Sunday (or stay on it), then back to that week's Monday
+        return func.date(column, "weekday 0", "-6 days")
+    if period == "month":
+        return func.date(column, "start of month")
+    return func.date(column)
+
+def report_rollup_aggregate(kind: str, period: str, owner_id: Optional[int] = None):
+    when = Lead.created_at if kind == "leads" else Lead.expected_close_date
+    value = func.coalesce(Lead.value_cents, 0)
+    bucket = report_bucket(when, period)
+    dimensions = [func.coalesce(Lead.stage, ""), func.coalesce(Lead.status, ""), func.coalesce(Lead.source, "")]
+    query = (
+        select(
+            Lead.owner_id, literal(kind), literal(period), bucket, *dimensions,
+            func.count(), func.sum(value), func.sum(value * func.coalesce(Lead.probability, 0) // 100),
+        )
+        .where(Lead.owner_id.is_not(None), when.is_not(None))
+        .group_by(Lead.owner_id, bucket, *dimensions)
+    )
+    if kind == "forecast":
+        query = query.where(Lead.status == "open")
+    if owner_id is not None:
+        query = query.where(Lead.owner_id == owner_id)
+    return query
+
+def rebuild_report_rollups(conn, owner_id: Optional[int] = None):
+    """Recompute the rollups from the leads table (all owners unless one is given)."""
+    delete_rows = ReportRollup.__table__.delete()
+    if owner_id is not None:
+        delete_rows = delete_rows.where(ReportRollup.owner_id == owner_id)
+    conn.execute(delete_rows)
+    columns = [*ReportRollup.__table__.primary_key.columns.keys(), *ROLLUP_MEASURES]
+    for kind in REPORT_KINDS:
+        for period in REPORT_PERIODS:
+            conn.execute(insert(ReportRollup).from_select(columns, report_rollup_aggregate(kind, period, owner_id)))
+
+def create_report_rollups(conn):
+    create_tables(ReportRollup)(conn)
+    rebuild_report_rollups(conn)
+
+# Duplicate detection
+# Accounts and contacts get blocking keys (normalized email, phone digits, a
+# phonetic name key and, for accounts, the company's email or website domain),
+# kept in duplicate_keys by the write paths. Only records sharing a key are
+# compared, so the create check, the import report and GET /duplicates score a
+# few candidates per record instead of every pair.
+FREE_MAIL_DOMAINS = frozenset({
+    "gmail.com", "googlemail.com", "yahoo.com", "hotmail.com", "outlook.com", "live.com", "msn.com",
+    "aol.com", "icloud.com", "me.com", "mail.com", "gmx.com", "gmx.de", "web.de", "proton.me", "protonmail.com",
+})
+COMPANY_SUFFIXES = frozenset({
+    "the", "inc", "incorporated", "llc", "ltd", "limited", "corp", "corporation", "co", "company",
+    "gmbh", "ag", "sa", "plc", "bv", "srl", "pty", "group",
+})
+SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"), **dict.fromkeys("dt", "3"),
+    "l": "4", **dict.fromkeys("mn", "5"), "r": "6",
+}
+
+def name_words(value: Optional[str]) -> List[str]:
+    ascii_value = unicodedata.normalize("NFKD", value or "").encode("ascii", "ignore").decode("ascii")
+    return re.findall(r"[a-z0-9]+", ascii_value.lower())
+
+def soundex(word: str) -> str:
+    codes = [SOUNDEX_CODES.get(char, "") for char in word]
+    key, last = word[0].upper(), codes[0]
+    for char, code in zip(word[1:], codes[1:]):
+        if code and code != last:
+            key += code
+        if char not in "hw":
+            last = code
+    return (key + "000")[:4]
+
+def normalize_email(value: Optional[str]) -> Optional[str]:
+    email = (value or "").strip().lower()
+    return email if re.fullmatch(r"[^@\s]+@[^@\s]+\.[^@\s]+", email) else None
+
+def normalize_phone(value: Optional[str]) -> Optional[str]:
+    # The last ten digits, so "+1 (555) 010-2030" and "555.010.2030" agree
+    digits = re.sub(r"\D", "", value or "")
+    return digits[-10:] if len(digits) >= 7 else None
+
+def company_domains(email: Optional[str], website: Optional[str] = None) -> set:
+    domains = set()
+    if email and email.split("@")[1] not in FREE_MAIL_DOMAINS:
+        domains.add(email.split("@")[1])
+    host = re.sub(r"^[a-z][a-z0-9+.-]*://", "", (website or "").strip().lower()).split("/")[0].split(":")[0]
+    host = host[4:] if host.startswith("www.") else host
+    if "." in host:
+        domains.add(host)
+    return domains
+
+def account_name(record) -> str:
+    return " ".join(word for word in name_words(record.name) if word not in COMPANY_SUFFIXES)
+
+def contact_name(record) -> str:
+    return " ".join(name_words(record.first_name) + name_words(record.last_name))
+
+def contact_keys(record) -> frozenset:
+    # No domain key: everyone at a company shares it, so the block would only be skipped
+    email = normalize_email(record.email)
+    phone = normalize_phone(record.phone)
+    keys = set()
+    if email:
+        keys.add(f"email:{email}")
+    if phone:
+        keys.add(f"phone:{phone}")
+    last, first = name_words(record.last_name), name_words(record.first_name)
+    if last and last[-1][0].isalpha():
+        keys.add(f"name:{soundex(last[-1])}:{first[0][0] if first else ''}")
+    return frozenset(keys)
+
+def account_keys(record) -> frozenset:
+    email = normalize_email(record.email)
+    phone = normalize_phone(record.phone)
+    keys = {f"domain:{domain}" for domain in company_domains(email, record.website)}
+    if email:
+        keys.add(f"email:{email}")
+    if phone:
+        keys.add(f"phone:{phone}")
+    words = [word for word in account_name(record).split() if word[0].isalpha()]
+    if words:
+        keys.add("name:" + " ".join(soundex(word) for word in words[:2]))
+    return frozenset(keys)
+
+class DuplicateSpec(NamedTuple):
+    model: type
+    keys: Any  # record -> frozenset of blocking keys
+    name: Any  # record -> normalized name compared for similarity
+    summary_fields: tuple  # columns shown for each side of a candidate pair
+
+DUPLICATE_ENTITIES = {
+    "accounts": DuplicateSpec(Account, account_keys, account_name, ("id", "name", "website", "email", "phone", "owner_id")),
+    "contacts": DuplicateSpec(
+        Contact, contact_keys, contact_name,
+        ("id", "first_name", "last_name", "email", "phone", "account_id", "owner_id"),
+    ),
+}
+
+def duplicate_score(spec: DuplicateSpec, a, b):
+    """Score how likely two records are the same (0-1), with the evidence that counted."""
+    score, reasons = 0.0, []
+    email = normalize_email(a.email)
+    if email and email == normalize_email(b.email):
+        score, reasons = score + 0.6, reasons + ["email"]
+    phone = normalize_phone(a.phone)
+    if phone and phone == normalize_phone(b.phone):
+        score, reasons = score + 0.4, reasons + ["phone"]
+    domains = company_domains(email, getattr(a, "website", None))
+    if domains & company_domains(normalize_email(b.email), getattr(b, "website", None)):
+        score, reasons = score + 0.3, reasons + ["domain"]
+    name_a, name_b = spec.name(a), spec.name(b)
+    if name_a and name_b:
+        similarity = SequenceMatcher(None, name_a, name_b).ratio()
+        if similarity >= 0.85:
+            score, reasons = score + 0.5 * similarity, reasons + ["name"]
+    return round(min(score, 1.0), 3), reasons
+
+async def write_blocking_keys(db: AsyncSession, entity: str, record_id: int, owner_id: Optional[int],
+                              before: frozenset, after: frozenset, owner_changed: bool = False):
+    stale = before - after
+    if stale:
+        await db.execute(DuplicateKey.__table__.delete().where(
+            DuplicateKey.entity == entity, DuplicateKey.record_id == record_id, DuplicateKey.key.in_(stale),
+        ))
+    fresh = after if owner_changed else after - before
+    if fresh:
+        await db.execute(
+            sqlite_insert(DuplicateKey).on_conflict_do_update(
+                index_elements=[DuplicateKey.entity, DuplicateKey.key, DuplicateKey.record_id],
+                set_={"owner_id": owner_id},
+            ),
+            [{"entity": entity, "key": key, "record_id": record_id, "owner_id": owner_id} for key in fresh],
+        )
+
+def blocking_key_rows(entity: str, records) -> List[dict]:
+    keys = DUPLICATE_ENTITIES[entity].keys
+    return [
+        {"entity": entity, "key": key, "record_id": record.id, "owner_id": record.owner_id}
+        for record in records for key in keys(record)
+    ]
+
+def rebuild_duplicate_keys(conn, batch: int = 1000):
+    """Recompute every blocking key, e.g. after changing the normalization rules."""
+    conn.execute(DuplicateKey.__table__.delete())
+    for entity, spec in DUPLICATE_ENTITIES.items():
+        after = 0
+        while True:
+            rows = conn.execute(
+                select(*spec.model.__table__.columns).where(spec.model.id > after).order_by(spec.model.id).limit(batch)
+            ).all()
+            if not rows:
+                break
+            keys = blocking_key_rows(entity, rows)
+            if keys:
+                conn.execute(DuplicateKey.__table__.insert(), keys)
+            after = rows[-1].id
+
+def chunked(values: list, size: int):
+    for offset in range(0, len(values), size):
+        yield values[offset:offset + size]
+
+async def find_duplicates(db: AsyncSession, entity: str, records: list) -> dict:
+    """Candidates scoring at least DUPLICATE_MIN_SCORE for each of `records`, keyed by position.
+
+    `records` need not be stored yet; those with an `id` are not matched with themselves.
+    """
+    spec = DUPLICATE_ENTITIES[entity]
+    keys = {n: spec.keys(record) for n, record in enumerate(records)}
+    wanted = set().union(*keys.values())
+    if not wanted:
+        return {}
+    blocks = {}
+    for chunk in chunked(sorted(wanted), 500):
+        rows = await db.execute(
+            select(DuplicateKey.key, DuplicateKey.record_id).where(DuplicateKey.entity == entity, DuplicateKey.key.in_(chunk))
+        )
+        for key, record_id in rows:
+            blocks.setdefault(key, []).append(record_id)
+    candidate_ids = {
+        n: {record_id for key in record_keys if len(blocks.get(key, ())) <= DUPLICATE_MAX_BLOCK
+            for record_id in blocks.get(key, ()) if record_id != getattr(records[n], "id", None)}
+        for n, record_keys in keys.items()
+    }
+    stored = {}
+    for chunk in chunked(sorted(set().union(*candidate_ids.values())), 500):
+        for row in await db.execute(select(*spec.model.__table__.columns).where(spec.model.id.in_(chunk))):
+            stored[row.id] = row
+    found = {}
+    for n, ids in candidate_ids.items():
+        matches = []
+        for record_id in ids:
+            score, reasons = duplicate_score(spec, records[n], stored[record_id])
+            if score >= DUPLICATE_MIN_SCORE:
+                summary = {field: getattr(stored[record_id], field) for field in spec.summary_fields}
+                matches.append({**summary, "score": score, "reasons": reasons})
+        if matches:
+            found[n] = sorted(matches, key=lambda match: (-match["score"], match["id"]))
+    return found
+
+def duplicate_blocks(entity: str, owner_id: Optional[int] = None):
+    """(key, size) of every key shared by two or more records, or only of keys `owner_id`'s records have."""
+    query = select(DuplicateKey.key, func.count().label("size")).where(DuplicateKey.entity == entity)
+    if owner_id is not None:
+        query = query.where(DuplicateKey.key.in_(
+            select(DuplicateKey.key).where(DuplicateKey.owner_id == owner_id, DuplicateKey.entity == entity)
+        ))
+    return query.group_by(DuplicateKey.key).having(func.count() > 1)
+
+async def flag_duplicates(db: AsyncSession, response: Response, entity: str, values: dict, reject: bool):
+    """Before a create: name likely duplicates in X-Possible-Duplicates, or refuse with 409 when `reject`."""
+    matches = (await find_duplicates(db, entity, [SimpleNamespace(**values)])).get(0)
+    if not matches:
+        return
+    if reject:
+        raise HTTPException(status_code=409, detail={"message": "Possible duplicates found", "candidates": matches})
+    response.headers["X-Possible-Duplicates"] = ",".join(str(match["id"]) for match in matches)
+
+# Schema migrations
+# Each step runs once, in order, tracked by SQLite's `PRAGMA user_version`. Steps
+# are idempotent so databases created by the old create_all() start-up adopt cleanly.
+def create_tables(*models):
+    def migrate(conn):
+        for model in models:
+            model.__table__.create(conn, checkfirst=True)
+    return migrate
+
+def create_indexes(*names):
+    def migrate(conn):
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name in names:
+                    index.create(conn, checkfirst=True)
+    return migrate
+
+def drop_indexes(*names):
+    def migrate(conn):
+        for name in names:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+    return migrate
+
+def add_columns(model, *names):
+    def migrate(conn):
+        table = model.__table__
+        existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+        for name in names:
+            if name not in existing:
+                column_type = table.columns[name].type.compile(conn.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}")
+    return migrate
+
+def stamp_unsynced(conn):
+    """Give rows written behind the write layer's back (bulk loads, old rows) a change sequence."""
+    conn.execute(sqlite_insert(ChangeSequence).values(id=1, value=0, pruned_through=0).on_conflict_do_nothing())
+    for model in (Account, Contact, Lead, Activity, Task):
+        low, high = conn.execute(select(func.min(model.id), func.max(model.id)).where(model.change_seq.is_(None))).one()
+        if low is None:
+            continue
+        base = conn.scalar(change_seq_reservation(high - low + 1)) - (high - low + 1)
+        conn.execute(
+            update(model).where(model.change_seq.is_(None))
+            .values(change_seq=model.id - low + base + 1)
+        )
+
+def autoincrement_activity_ids(conn):
+    """Rebuild `activities` with AUTOINCREMENT and start its sequence past every id it ever used.
+
+    Without it SQLite hands out max(id) + 1, which reuses the ids of archived
+    activities once the newest hot rows are deleted.
+    """
+    table = Activity.__table__
+    ddl = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'activities'").scalar()
+    if "AUTOINCREMENT" not in ddl.upper():
+        # Triggers and indexes go with the old table; the triggers are recreated verbatim
+        triggers = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'activities'"
+        ).scalars().all()
+        dependents = conn.exec_driver_sql(
+            "SELECT type, name FROM sqlite_master WHERE type IN ('trigger', 'index') AND tbl_name = 'activities' "
+            "AND sql IS NOT NULL"
+        ).all()
+        for kind, name in dependents:
+            conn.exec_driver_sql(f"DROP {kind.upper()} {name}")
+        conn.exec_driver_sql("ALTER TABLE activities RENAME TO activities_old")
+        table.create(conn)
+        names = ", ".join(column.name for column in table.columns)
+        conn.exec_driver_sql(f"INSERT INTO activities ({names}) SELECT {names} FROM activities_old")
+        conn.exec_driver_sql("DROP TABLE activities_old")
+        for statement in triggers:
+            conn.exec_driver_sql(statement)
+    used = max(conn.scalar(query) or 0 for query in (
+        select(func.max(Activity.id)),
+        select(func.max(ArchivedActivity.id)),
+        select(func.max(Tombstone.record_id)).where(Tombstone.entity == "activities"),
+    ))
+    conn.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'activities'")
+    conn.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES ('activities', ?)", (used,))
+
+def migration_steps(*steps):
+    def migrate(conn):
+        for step in steps:
+            step(conn)
+    return migrate
+
+MIGRATIONS = [
+    (1, "Core CRM tables", create_tables(User, Account, Contact, Lead, Activity, Task)),
+    (2, "Per-owner dashboard rollup", create_tables(OwnerStats)),
+    (3, "Owner-scoped composite indexes", create_indexes(
+        "ix_accounts_owner_name", "ix_contacts_owner_last_name", "ix_contacts_account",
+        "ix_leads_owner_status", "ix_leads_owner_stage", "ix_leads_owner_created", "ix_leads_account",
+        "ix_activities_owner_occurred", "ix_activities_lead_occurred",
+        "ix_tasks_owner_status_due", "ix_tasks_owner_due", "ix_tasks_linked",
+    )),
+    (4, "Full-text search indexes", create_search_indexes),
+    (5, "Open-task lookup per linked record", create_indexes("ix_tasks_linked_status_due")),
+    (6, "Reporting rollups", create_report_rollups),
+    (7, "Lead change log and timeline indexes", migration_steps(
+        create_tables(LeadEvent),
+        create_indexes("ix_activities_lead_owner_occurred", "ix_tasks_linked_created", "ix_lead_events_lead_occurred"),
+        drop_indexes("ix_activities_lead_occurred"),
+    )),
+    (8, "Attachments", migration_steps(
+        create_tables(AttachmentBlob, Attachment),
+        create_indexes("ix_attachments_owner_linked"),
+    )),
+    (9, "Per-owner table versions", create_tables(OwnerVersion)),
+    (10, "Open tasks by due time", create_indexes("ix_tasks_status_due")),
+    (11, "Change sequences and tombstones for delta sync", migration_steps(
+        *[add_columns(model, "change_seq") for model in (Account, Contact, Lead, Activity, Task)],
+        create_tables(ChangeSequence, Tombstone),
+        stamp_unsynced,
+        create_indexes(
+            "ix_accounts_owner_change_seq", "ix_contacts_owner_change_seq", "ix_leads_owner_change_seq",
+            "ix_activities_owner_change_seq", "ix_tasks_owner_change_seq", "ix_tombstones_owner_change_seq",
+        ),
+    )),
+    (12, "Activity archive", migration_steps(
+        create_tables(ArchivedActivity),
+        create_archive_search_index,
+        create_indexes(
+            "ix_activity_archive_owner_occurred", "ix_activity_archive_owner_created",
+            "ix_activity_archive_lead_owner_occurred",
+        ),
+    )),
+    (13, "Duplicate blocking keys", migration_steps(
+        create_tables(DuplicateKey),
+        rebuild_duplicate_keys,
+        create_indexes(
+            "ix_duplicate_keys_record", "ix_duplicate_keys_owner",
+            "ix_leads_primary_contact", "ix_activities_account", "ix_activities_contact",
+            "ix_activity_archive_account", "ix_activity_archive_contact", "ix_attachments_linked",
+        ),
+    )),
+    (14, "Never reuse activity ids", autoincrement_activity_ids),
+]
+
+def run_migrations(bind) -> List[str]:
+    """Apply pending migrations and return the descriptions of those that ran."""
+    applied = []
+    with bind.connect() as conn:
+        current = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        conn.commit()
+        for version, description, migrate in MIGRATIONS:
+            if version <= current:
+                continue
+            with conn.begin():
+                migrate(conn)
+                conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+            applied.append(f"{version}: {description}")
+    return applied
 
 # Pydantic Models
 class UserCreate(BaseModel):
@@ -211,365 +1147,3283 @@ class TaskCreate(BaseModel):
     due_at: Optional[datetime] = None
     priority: str = "medium"
 
+# Read models. List endpoints select exactly these columns and serialize the
+# row tuples directly; single-record endpoints validate from the ORM instance.
+class AccountRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    name: Optional[str] = None
+    website: Optional[str] = None
+    industry: Optional[str] = None
+    size: Optional[str] = None
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    street: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    postal_code: Optional[str] = None
+    country: Optional[str] = None
+    notes: Optional[str] = None
+    owner_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class ContactRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    account_id: Optional[int] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    title: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    notes: Optional[str] = None
+    owner_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class LeadRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    title: Optional[str] = None
+    account_id: Optional[int] = None
+    primary_contact_id: Optional[int] = None
+    stage: Optional[str] = None
+    value_cents: Optional[int] = None
+    probability: Optional[int] = None
+    expected_close_date: Optional[datetime] = None
+    source: Optional[str] = None
+    owner_id: Optional[int] = None
+    status: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class ActivityRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    lead_id: Optional[int] = None
+    account_id: Optional[int] = None
+    contact_id: Optional[int] = None
+    type: Optional[str] = None
+    subject: Optional[str] = None
+    body: Optional[str] = None
+    occurred_at: Optional[datetime] = None
+    duration_minutes: Optional[int] = None
+    owner_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+class TaskRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    linked_type: Optional[str] = None
+    linked_id: Optional[int] = None
+    title: Optional[str] = None
+    due_at: Optional[datetime] = None
+    priority: Optional[str] = None
+    status: Optional[str] = None
+    owner_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class AttachmentRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    linked_type: str
+    linked_id: int
+    filename: str
+    mime_type: Optional[str] = None
+    size_bytes: Optional[int] = None
+    path: str
+    checksum: str
+    uploaded_at: Optional[datetime] = None
+    owner_id: Optional[int] = None
+
+READ_SCHEMAS = {
+    Account: AccountRead,
+    Contact: ContactRead,
+    Lead: LeadRead,
+    Activity: ActivityRead,
+    ArchivedActivity: ActivityRead,
+    Task: TaskRead,
+    Attachment: AttachmentRead,
+}
+
+def read_record(record):
+    """The read model of an ORM record, for responses that embed records."""
+    return READ_SCHEMAS[type(record)].model_validate(record)
+
+class BatchOperation(BaseModel):
+    op: str  # create, patch, delete
+    entity: str  # accounts, contacts, leads, activities, tasks
+    id: Optional[Union[int, str]] = None  # record id, or "$ref" to a record created earlier in the batch
+    data: dict = {}
+    ref: Optional[str] = None  # name later operations can use as "$name"
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+class DuplicateMerge(BaseModel):
+    entity: str  # accounts, contacts
+    keep_id: int
+    duplicate_ids: List[int]
+
+# Authenticated principals
+class Principal(NamedTuple):
+    """Immutable snapshot of the authenticated user, safe to share across requests."""
+    id: int
+    email: str
+    name: str
+    role: str
+
+class PrincipalCache:
+    """Bounded LRU of resolved principals keyed by bearer token.
+
+    Entries expire after `ttl` seconds or when the token itself expires, whichever
+    comes first, and are dropped as soon as the underlying user row changes.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # token -> (principal, expires_at)
+        self._tokens_by_user = {}  # user id -> set of cached tokens
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            principal, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return principal
+
+    def put(self, token: str, principal: Principal, token_exp: Optional[float] = None):
+        expires_at = time.monotonic() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, time.monotonic() + (token_exp - time.time()))
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (principal, expires_at)
+            self._tokens_by_user.setdefault(principal.id, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def _remove(self, token: str):
+        principal, _ = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(principal.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[principal.id]
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _queue_principal_invalidation(mapper, connection, target):
+    # Role, password or account changes must not be served from the cache once committed
+    principal_cache.invalidate_user(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_user_ids", set()).add(target.id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_principals(session):
+    # Evict again after commit in case a concurrent request re-cached the old row meanwhile
+    for user_id in session.info.pop("changed_user_ids", ()):
+        principal_cache.invalidate_user(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_principal_invalidations(session):
+    session.info.pop("changed_user_ids", None)
+
 # Helper functions
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+def password_needs_rehash(hashed: str) -> bool:
+    # bcrypt hashes look like $2b$<cost>$<salt+digest>
+    try:
+        return int(hashed.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated thread pool so it never occupies the event loop.
+
+    At most `workers` hashes run at once and `max_pending` more may wait; beyond
+    that callers get a 503 instead of piling up behind a login burst.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.capacity = workers + max_pending
+        self.in_flight = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    async def _run(self, fn, *args):
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Authentication service busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(verify_password, password, hashed)
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight, "capacity": self.capacity, "rejected": self.rejected}
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    now = datetime.utcnow()
+    expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire, "iat": now})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def decode_token(token: str) -> dict:
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return email
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("sub") is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return payload
 
-def get_current_user(email: str = Depends(verify_token), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == email).first()
+def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return decode_token(credentials.credentials)["sub"]
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_db)) -> Principal:
+    return await resolve_principal(credentials.credentials, db)
+
+async def resolve_principal(token: str, db: AsyncSession) -> Principal:
+    # A cached entry means this exact token was already verified and has not expired
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+    
+    payload = decode_token(token)
+    user = await db.scalar(select(User).where(User.email == payload["sub"]))
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
-    return user
+    principal = Principal(id=user.id, email=user.email, name=user.name, role=user.role)
+    principal_cache.put(token, principal, payload.get("exp"))
+    return principal
 
-# API Routes
-@app.post("/auth/register")
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
-    # Check if user exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    # Create user
-    hashed_password = hash_password(user_data.password)
-    user = User(
-        email=user_data.email,
-        name=user_data.name,
-        role=user_data.role,
-        password_hash=hashed_password
-    )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    
-    return {"message": "User created successfully"}
+# Conditional reads
+# Read endpoints are keyed by the owner's versions of the tables they read. The
+# versions live in the database, so ETags stay valid across restarts and workers,
+# and a matching If-None-Match is answered before the endpoint's own query runs.
+class ResponseCache:
+    """LRU of rendered JSON bodies, bounded by their total size in bytes."""
 
-@app.post("/auth/login")
-async def login(login_data: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == login_data.email).first()
-    if not user or not verify_password(login_data.password, user.password_hash):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-    
-    access_token = create_access_token(data={"sub": user.email})
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": {
-            "id": user.id,
-            "email": user.email,
-            "name": user.name,
-            "role": user.role
-        }
-    }
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (body, headers)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
-@app.get("/me")
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
-    return {
-        "id": current_user.id,
-        "email": current_user.email,
-        "name": current_user.name,
-        "role": current_user.role
-    }
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
 
-# Dashboard stats
-@app.get("/dashboard/stats")
-async def get_dashboard_stats(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    # Get counts for dashboard
-    total_leads = db.query(Lead).filter(Lead.owner_id == current_user.id).count()
-    open_leads = db.query(Lead).filter(Lead.owner_id == current_user.id, Lead.status == "open").count()
-    total_accounts = db.query(Account).filter(Account.owner_id == current_user.id).count()
-    open_tasks = db.query(Task).filter(Task.owner_id == current_user.id, Task.status == "open").count()
-    
-    # Calculate pipeline value
-    pipeline_value = db.query(Lead).filter(
-        Lead.owner_id == current_user.id,
-        Lead.status == "open"
-    ).with_entities(Lead.value_cents).all()
-    total_pipeline = sum([lead.value_cents for lead in pipeline_value]) / 100  # Convert cents to dollars
-    
-    return {
-        "total_leads": total_leads,
-        "open_leads": open_leads,
-        "total_accounts": total_accounts,
-        "open_tasks": open_tasks,
-        "pipeline_value": total_pipeline
-    }
+    def put(self, key, body: bytes, headers: dict):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key)[0])
+            self._entries[key] = (body, headers)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
 
-# Accounts endpoints
-@app.get("/accounts")
-async def get_accounts(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    accounts = db.query(Account).filter(Account.owner_id == current_user.id).all()
-    return accounts
-
-@app.post("/accounts")
-async def create_account(account_data: AccountCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    account = Account(**account_data.model_dump(), owner_id=current_user.id)
-    db.add(account)
-    db.commit()
-    db.refresh(account)
-    return account
-
-@app.patch("/accounts/{account_id}")
-async def update_account(account_id: int, account_data: dict, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    account = db.query(Account).filter(Account.id == account_id, Account.owner_id == current_user.id).first()
-    if not account:
-        raise HTTPException(status_code=404, detail="Account not found")
-    
-    for key, value in account_data.items():
-        if hasattr(account, key):
-            setattr(account, key, value)
-    
-    db.commit()
-    db.refresh(account)
-    return account
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
 
-@app.delete("/accounts/{account_id}")
-async def delete_account(account_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    account = db.query(Account).filter(Account.id == account_id, Account.owner_id == current_user.id).first()
-    if not account:
-        raise HTTPException(status_code=404, detail="Account not found")
-    
-    db.delete(account)
-    db.commit()
-    return {"message": "Account deleted successfully"}
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries), "bytes": self._bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            }
 
-# Contacts endpoints
-@app.get("/contacts")
-async def get_contacts(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    contacts = db.query(Contact).filter(Contact.owner_id == current_user.id).all()
-    return contacts
-
-@app.post("/contacts")
-async def create_contact(contact_data: ContactCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    contact = Contact(**contact_data.dict(), owner_id=current_user.id)
-    db.add(contact)
-    db.commit()
-    db.refresh(contact)
-    return contact
-
-@app.get("/contacts/{contact_id}")
-async def get_contact(contact_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    contact = db.query(Contact).filter(Contact.id == contact_id, Contact.owner_id == current_user.id).first()
-    if not contact:
-        raise HTTPException(status_code=404, detail="Contact not found")
-    return contact
-
-@app.patch("/contacts/{contact_id}")
-async def update_contact(contact_id: int, contact_data: ContactCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    contact = db.query(Contact).filter(Contact.id == contact_id, Contact.owner_id == current_user.id).first()
-    if not contact:
-        raise HTTPException(status_code=404, detail="Contact not found")
-    
-    for field, value in contact_data.dict(exclude_unset=True).items():
-        setattr(contact, field, value)
-    
-    contact.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(contact)
-    return contact
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES)
 
-@app.delete("/contacts/{contact_id}")
-async def delete_contact(contact_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    contact = db.query(Contact).filter(Contact.id == contact_id, Contact.owner_id == current_user.id).first()
-    if not contact:
-        raise HTTPException(status_code=404, detail="Contact not found")
+def version_bump(owner_id: int, tables):
+    """The upsert bumping an owner's table versions, with its parameter rows."""
+    statement = sqlite_insert(OwnerVersion).on_conflict_do_update(
+        index_elements=[OwnerVersion.owner_id, OwnerVersion.table_name],
+        set_={"version": OwnerVersion.version + 1},
+    )
+    return statement, [{"owner_id": owner_id, "table_name": table, "version": 1} for table in tables]
+
+async def bump_versions(db: AsyncSession, owner_id: Optional[int], *tables: str):
+    if owner_id is None or not tables:
+        return
+    await db.execute(*version_bump(owner_id, tables))
+
+def change_seq_reservation(count: int):
+    """Advance the change sequence by `count`, returning the new (last reserved) value."""
+    return (
+        update(ChangeSequence).where(ChangeSequence.id == 1)
+        .values(value=ChangeSequence.value + count).returning(ChangeSequence.value)
+    )
+
+async def next_change_seq(db: AsyncSession, count: int = 1) -> int:
+    """Reserve `count` consecutive change sequence numbers and return the first."""
+    return await db.scalar(change_seq_reservation(count)) - count + 1
+
+async def record_tombstone(db: AsyncSession, owner_id: Optional[int], entity: str, record_id: int):
+    if owner_id is not None:
+        db.add(Tombstone(change_seq=await next_change_seq(db), owner_id=owner_id, entity=entity, record_id=record_id))
+
+async def table_versions(db: AsyncSession, owner_id: int, tables) -> tuple:
+    rows = await db.execute(
+        select(OwnerVersion.table_name, OwnerVersion.version)
+        .where(OwnerVersion.owner_id == owner_id, OwnerVersion.table_name.in_(tables))
+    )
+    versions = dict(rows.all())
+    return tuple(versions.get(table, 0) for table in tables)
+
+async def cached_read(request: Request, response: Response, db: AsyncSession, owner_id: int, tables, compute):
+    """Serve a read endpoint through its ETag and the response cache.
+
+    `tables` are every table the response depends on; `compute` is an async
+    callable producing the response content, only awaited on a cache miss.
+    """
+    versions = await table_versions(db, owner_id, tables)
+    key = (owner_id, request.url.path, request.url.query, versions)
+    etag = '"' + hashlib.blake2b(repr(key).encode("utf-8"), digest_size=16).hexdigest() + '"'
+    headers = {"etag": etag, "cache-control": "private, no-cache"}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
     
-    db.delete(contact)
-    db.commit()
-    return {"message": "Contact deleted successfully"}
+    entry = response_cache.get(key)
+    if entry is None:
+        body = render_json(await compute())
+        extra = {name: value for name, value in response.headers.items() if name == "x-next-cursor"}
+        response_cache.put(key, body, extra)
+    else:
+        body, extra = entry
+    return Response(content=body, media_type="application/json", headers={**extra, **headers})
 
-# Leads endpoints
-@app.get("/leads")
-async def get_leads(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    leads = db.query(Lead).filter(Lead.owner_id == current_user.id).all()
-    return leads
-
-@app.post("/leads")
-async def create_lead(lead_data: LeadCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    lead = Lead(**lead_data.dict(), owner_id=current_user.id)
-    db.add(lead)
-    db.commit()
-    db.refresh(lead)
-    return lead
-
-@app.get("/leads/{lead_id}")
-async def get_lead(lead_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    lead = db.query(Lead).filter(Lead.id == lead_id, Lead.owner_id == current_user.id).first()
-    if not lead:
-        raise HTTPException(status_code=404, detail="Lead not found")
-    return lead
-
-@app.patch("/leads/{lead_id}")
-async def update_lead(lead_id: int, lead_data: dict, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    lead = db.query(Lead).filter(Lead.id == lead_id, Lead.owner_id == current_user.id).first()
-    if not lead:
-        raise HTTPException(status_code=404, detail="Lead not found")
+# List helpers
+def parse_sort(sort: Optional[str], allowed: List[str], default: str):
+    """Parse a `sort` query value such as `-occurred_at` into (column name, descending)."""
+    sort = sort or default
+    descending = sort.startswith("-")
+    name = sort.lstrip("-")
+    if name not in allowed:
+        raise HTTPException(status_code=400, detail=f"Invalid sort field: {name}. Allowed: {', '.join(allowed)}")
+    return name, descending
+
+def parse_fields(model, fields: Optional[str]):
+    """Resolve a comma-separated `fields` projection into column names (id is always included).
+
+    Only fields of the model's read schema can be selected, so internal columns stay private.
+    """
+    if not fields:
+        return None
+    columns = READ_SCHEMAS[model].model_fields
+    names = ["id"]
+    for name in (f.strip() for f in fields.split(",")):
+        if not name or name in names:
+            continue
+        if name not in columns:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {name}")
+        names.append(name)
+    return names
+
+def encode_cursor(value, row_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, column):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, row_id = json.loads(raw)
+        if value is not None and column is not None and isinstance(column.type, DateTime):
+            value = datetime.fromisoformat(value)
+        return value, int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_filter(column, id_column, descending: bool, value, row_id: int):
+    """Rows strictly after (value, row_id) in `ORDER BY column, id` order.
+
+    SQLite sorts NULLs first ascending and last descending, so a NULL sort value
+    either precedes or follows every non-NULL one depending on the direction.
+    """
+    if descending:
+        if value is None:
+            return and_(column.is_(None), id_column < row_id)
+        return or_(column < value, and_(column == value, id_column < row_id), column.is_(None))
+    if value is None:
+        return or_(and_(column.is_(None), id_column > row_id), column.isnot(None))
+    return or_(column > value, and_(column == value, id_column > row_id))
+
+def search_filter(q: Optional[str], *columns):
+    pattern = f"%{q}%"
+    return or_(*[column.ilike(pattern) for column in columns])
+
+async def paginate(db: AsyncSession, query, model, response: Response, sort: str, descending: bool,
+                   cursor: Optional[str], limit: int, fields: Optional[List[str]], archive=None):
+    """Apply keyset pagination on (sort column, id) and an optional column projection.
+
+    Only the read model's columns (or the requested `fields`) are selected and
+    each row tuple becomes a plain dict, so no ORM instances are built. The next
+    page's cursor is returned in the `X-Next-Cursor` response header so that
+    list bodies stay plain JSON arrays. `archive` is an optional (archive model,
+    query) pair whose rows are merged into the page (see with_archived_rows).
+    """
+    column = getattr(model, sort)
+    after = decode_cursor(cursor, column) if cursor else None
+    if after:
+        query = query.where(keyset_filter(column, model.id, descending, *after))
+    if descending:
+        query = query.order_by(column.desc(), model.id.desc())
+    else:
+        query = query.order_by(column.asc(), model.id.asc())
     
+    names = list(fields or READ_SCHEMAS[model].model_fields)
+    selected = names if sort in names else names + [sort]
+    query = query.with_only_columns(*[getattr(model, name) for name in selected])
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    if archive is not None:
+        rows = await with_archived_rows(db, *archive, rows, sort, descending, after, limit + 1, selected)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(getattr(last, sort), last.id)
+    return [dict(zip(names, row)) for row in rows]
+
+# Dashboard rollup
+STATS_FIELDS = [
+    "total_leads", "open_leads", "won_leads", "lost_leads",
+    "pipeline_value_cents", "total_accounts", "open_tasks",
+]
+
+def lead_contribution(lead: Lead):
+    return lead.owner_id, {
+        "total_leads": 1,
+        "open_leads": int(lead.status == "open"),
+        "won_leads": int(lead.status == "closed_won"),
+        "lost_leads": int(lead.status == "closed_lost"),
+        "pipeline_value_cents": int(lead.value_cents or 0) if lead.status == "open" else 0,
+    }
+
+def account_contribution(account: Account):
+    return account.owner_id, {"total_accounts": 1}
+
+def task_contribution(task: Task):
+    return task.owner_id, {"open_tasks": int(task.status == "open")}
+
+def stats_aggregate(owner_id: Optional[int] = None):
+    """One grouped aggregate over leads, accounts and tasks producing a row per owner."""
+    zero = literal(0)
+    lead_rows = select(
+        Lead.owner_id.label("owner_id"),
+        literal(1).label("total_leads"),
+        case((Lead.status == "open", 1), else_=0).label("open_leads"),
+        case((Lead.status == "closed_won", 1), else_=0).label("won_leads"),
+        case((Lead.status == "closed_lost", 1), else_=0).label("lost_leads"),
+        case((Lead.status == "open", func.coalesce(Lead.value_cents, 0)), else_=0).label("pipeline_value_cents"),
+        zero.label("total_accounts"),
+        zero.label("open_tasks"),
+    )
+    account_rows = select(Account.owner_id, zero, zero, zero, zero, zero, literal(1), zero)
+    task_rows = select(Task.owner_id, zero, zero, zero, zero, zero, zero, case((Task.status == "open", 1), else_=0))
+    if owner_id is not None:
+        lead_rows = lead_rows.where(Lead.owner_id == owner_id)
+        account_rows = account_rows.where(Account.owner_id == owner_id)
+        task_rows = task_rows.where(Task.owner_id == owner_id)
+    rows = union_all(lead_rows, account_rows, task_rows).subquery()
+    return select(rows.c.owner_id, *[func.sum(rows.c[name]).label(name) for name in STATS_FIELDS]).group_by(rows.c.owner_id)
+
+def stats_by_owner(rows):
+    return {row.owner_id: {name: int(getattr(row, name) or 0) for name in STATS_FIELDS} for row in rows}
+
+def compute_owner_stats(db: Session, owner_id: Optional[int] = None):
+    """Synchronous variant used by the maintenance commands in manage.py."""
+    return stats_by_owner(db.execute(stats_aggregate(owner_id)))
+
+async def backfill_owner_stats(db: AsyncSession, owner_id: int) -> OwnerStats:
+    """Create an owner's rollup row from the current table contents (including pending writes)."""
+    await db.flush()
+    rows = await db.execute(stats_aggregate(owner_id))
+    values = stats_by_owner(rows).get(owner_id, {name: 0 for name in STATS_FIELDS})
+    # Concurrent first dashboard loads both get here; whoever inserts second keeps the existing row
+    await db.execute(
+        sqlite_insert(OwnerStats).values(owner_id=owner_id, **values)
+        .on_conflict_do_nothing(index_elements=[OwnerStats.owner_id])
+    )
+    return await db.get(OwnerStats, owner_id, populate_existing=True)
+
+async def adjust_owner_stats(db: AsyncSession, owner_id: Optional[int], deltas: dict):
+    deltas = {name: value for name, value in deltas.items() if value}
+    if owner_id is None or not deltas:
+        return
+    result = await db.execute(
+        update(OwnerStats)
+        .where(OwnerStats.owner_id == owner_id)
+        .values({name: getattr(OwnerStats, name) + value for name, value in deltas.items()})
+    )
+    if not result.rowcount:
+        # No rollup yet for this owner: seed it from the tables, which already hold this write.
+        await backfill_owner_stats(db, owner_id)
+
+async def record_stats_change(db: AsyncSession, before=None, after=None):
+    """Apply the difference between two (owner_id, contribution) snapshots to the rollup.
+
+    Must be called before the handler's commit so the rollup moves in the same
+    transaction as the row it describes.
+    """
+    if before and after and before[0] == after[0]:
+        owner_id = after[0]
+        names = set(before[1]) | set(after[1])
+        await adjust_owner_stats(db, owner_id, {n: after[1].get(n, 0) - before[1].get(n, 0) for n in names})
+        return
+    if before:
+        await adjust_owner_stats(db, before[0], {n: -v for n, v in before[1].items()})
+    if after:
+        await adjust_owner_stats(db, after[0], after[1])
+
+# Pipeline board
+LEAD_STAGES = ["New", "Qualified", "Proposal", "Negotiation", "Closed-Won", "Closed-Lost"]
+
+def pipeline_query(owner_id: int, status: Optional[str] = None):
+    """One statement for the whole board: every lead with its account name and
+    earliest open task, however many leads there are."""
+    # Join each lead to all of its open tasks through ix_tasks_linked, rank them by
+    # due date (undated last) per lead and keep the first; leads without open tasks
+    # come through the outer join as a single rank-1 row with NULL task columns
+    ranked = (
+        select(
+            Lead.id, Lead.title, Lead.stage, Lead.status, Lead.value_cents, Lead.probability,
+            Lead.expected_close_date, Lead.account_id, Lead.primary_contact_id, Lead.created_at,
+            Account.name.label("account_name"),
+            Task.id.label("task_id"),
+            Task.title.label("task_title"),
+            Task.due_at.label("task_due_at"),
+            Task.priority.label("task_priority"),
+            func.row_number().over(
+                partition_by=Lead.id, order_by=(Task.due_at.asc().nulls_last(), Task.id)
+            ).label("task_rank"),
+        )
+        .outerjoin(Account, Account.id == Lead.account_id)
+        .outerjoin(Task, and_(
+            Task.linked_type == "lead",
+            Task.linked_id == Lead.id,
+            Task.status == "open",
+            Task.owner_id == owner_id,
+        ))
+        .where(Lead.owner_id == owner_id)
+    )
+    if status:
+        ranked = ranked.where(Lead.status == status)
+    ranked = ranked.subquery()
+    return (
+        select(ranked)
+        .where(ranked.c.task_rank == 1)
+        .order_by(ranked.c.created_at.desc(), ranked.c.id.desc())
+    )
+
+# Record writes
+# Shared by the single-record endpoints, CSV import and POST /batch. None of these
+# commit, so callers decide the transaction boundary.
+def validation_messages(exc: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in exc.errors()]
+
+def naive_utc(value):
+    """Timestamps are stored and compared as naive UTC; convert aware ones (e.g. ISO 8601 with "Z")."""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def naive_utc_values(data: dict) -> dict:
+    return {key: naive_utc(value) for key, value in data.items()}
+
+def parse_datetime_field(field: str, value):
+    # Handle the datetime formats the frontend sends: date only, datetime-local and ISO 8601
+    if not isinstance(value, str) or not value:
+        return naive_utc(value)
+    try:
+        if len(value) == 16 and 'T' in value:
+            return datetime.strptime(value, '%Y-%m-%dT%H:%M')
+        if 'T' in value:
+            return naive_utc(datetime.fromisoformat(value.replace('Z', '+00:00')))
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid datetime format for {field}: {value}")
+
+def apply_account_update(account: Account, data: dict):
+    for key, value in data.items():
+        if hasattr(account, key):
+            setattr(account, key, value)
+
+def apply_contact_update(contact: Contact, data: dict):
+    for field, value in data.items():
+        setattr(contact, field, value)
+    contact.updated_at = datetime.utcnow()
+
+def apply_lead_update(lead: Lead, data: dict):
     # Handle stage parameter for backward compatibility
-    if 'stage' in lead_data:
-        lead.stage = lead_data['stage']
+    if 'stage' in data:
+        lead.stage = data['stage']
         # Update status based on stage
-        if lead_data['stage'] in ["Closed-Won", "Closed-Lost"]:
-            lead.status = "closed_won" if lead_data['stage'] == "Closed-Won" else "closed_lost"
+        if data['stage'] in ["Closed-Won", "Closed-Lost"]:
+            lead.status = "closed_won" if data['stage'] == "Closed-Won" else "closed_lost"
     
     # Handle other fields
-    for field, value in lead_data.items():
+    for field, value in data.items():
         if hasattr(lead, field) and field != 'stage':  # stage handled above
-            # Convert datetime strings to Python datetime objects
-            if field == 'expected_close_date' and isinstance(value, str) and value:
-                try:
-                    # Handle different datetime formats from frontend
-                    if 'T' in value:
-                        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
-                    else:
-                        value = datetime.strptime(value, '%Y-%m-%d')
-                except ValueError:
-                    raise HTTPException(status_code=400, detail=f"Invalid datetime format for {field}: {value}")
+            if field == 'expected_close_date':
+                value = parse_datetime_field(field, value)
             setattr(lead, field, value)
     
     lead.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(lead)
-    return lead
 
-@app.delete("/leads/{lead_id}")
-async def delete_lead(lead_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    lead = db.query(Lead).filter(Lead.id == lead_id, Lead.owner_id == current_user.id).first()
-    if not lead:
-        raise HTTPException(status_code=404, detail="Lead not found")
+def apply_activity_update(activity: Activity, data: dict):
+    for field, value in data.items():
+        setattr(activity, field, value)
+
+def apply_task_update(task: Task, data: dict):
+    for field, value in data.items():
+        if hasattr(task, field):
+            if field == 'due_at':
+                value = parse_datetime_field(field, value)
+            setattr(task, field, value)
     
-    db.delete(lead)
-    db.commit()
+    task.updated_at = datetime.utcnow()
+
+# Lead fields whose changes are kept in lead_events
+LEAD_HISTORY_FIELDS = (
+    "title", "stage", "status", "value_cents", "probability", "expected_close_date",
+    "source", "account_id", "primary_contact_id", "owner_id",
+)
+
+def lead_history(lead: Lead) -> dict:
+    return {name: getattr(lead, name) for name in LEAD_HISTORY_FIELDS}
+
+def history_value(value) -> str:
+    return json.dumps(value.isoformat() if isinstance(value, datetime) else value)
+
+def record_lead_events(db: AsyncSession, lead: Lead, before: dict, after: dict):
+    now = datetime.utcnow()
+    for name in LEAD_HISTORY_FIELDS:
+        if before[name] != after[name]:
+            db.add(LeadEvent(
+                lead_id=lead.id, field=name, occurred_at=now,
+                old_value=history_value(before[name]), new_value=history_value(after[name]),
+            ))
+
+class EntitySpec(NamedTuple):
+    model: type
+    create_schema: type
+    patch_schema: Optional[type]  # contacts and activities validate patches against their create model
+    apply_update: Any
+    contribution: Optional[Any]  # dashboard rollup contribution, for entities that feed owner_stats
+    report_rows: Optional[Any] = None  # reporting rollup rows, for entities that feed report_rollups
+    history: Optional[Any] = None  # snapshot of the fields whose changes are logged
+    blocking_keys: Optional[Any] = None  # duplicate detection keys, for accounts and contacts
+
+ENTITIES = {
+    "accounts": EntitySpec(Account, AccountCreate, None, apply_account_update, account_contribution, blocking_keys=account_keys),
+    "contacts": EntitySpec(Contact, ContactCreate, ContactCreate, apply_contact_update, None, blocking_keys=contact_keys),
+    "leads": EntitySpec(Lead, LeadCreate, None, apply_lead_update, lead_contribution, lead_report_rows, lead_history),
+    "activities": EntitySpec(Activity, ActivityCreate, ActivityCreate, apply_activity_update, None),
+    "tasks": EntitySpec(Task, TaskCreate, None, apply_task_update, task_contribution),
+}
+ENTITY_BY_MODEL = {spec.model: spec for spec in ENTITIES.values()}
+
+async def get_owned(db: AsyncSession, model, record_id: int, owner_id: int):
+    record = await db.scalar(select(model).where(model.id == record_id, model.owner_id == owner_id))
+    if not record:
+        raise HTTPException(status_code=404, detail=f"{model.__name__} not found")
+    return record
+
+async def create_record(db: AsyncSession, model, values: dict, owner_id: int):
+    spec = ENTITY_BY_MODEL[model]
+    record = model(**naive_utc_values(values), owner_id=owner_id, change_seq=await next_change_seq(db))
+    if model is Activity and not record.occurred_at:
+        record.occurred_at = datetime.utcnow()
+    db.add(record)
+    # Flush so column defaults (e.g. status) and the new id are available
+    await db.flush()
+    if spec.contribution:
+        await record_stats_change(db, after=spec.contribution(record))
+    if spec.report_rows:
+        await record_report_change(db, after=spec.report_rows(record))
+    if spec.blocking_keys:
+        await write_blocking_keys(db, model.__tablename__, record.id, owner_id, frozenset(), spec.blocking_keys(record))
+    await bump_versions(db, owner_id, model.__tablename__)
+    return record
+
+async def update_record(db: AsyncSession, record, data: dict):
+    spec = ENTITY_BY_MODEL[type(record)]
+    data = naive_utc_values(data)
+    before = spec.contribution(record) if spec.contribution else None
+    report_before = spec.report_rows(record) if spec.report_rows else None
+    history_before = spec.history(record) if spec.history else None
+    keys_before = spec.blocking_keys(record) if spec.blocking_keys else None
+    owner_before = record.owner_id
+    spec.apply_update(record, data)
+    if spec.history:
+        record_lead_events(db, record, history_before, spec.history(record))
+    if spec.contribution:
+        await record_stats_change(db, before, spec.contribution(record))
+    if spec.report_rows:
+        await record_report_change(db, report_before, spec.report_rows(record))
+    if spec.blocking_keys:
+        await write_blocking_keys(
+            db, record.__tablename__, record.id, record.owner_id,
+            keys_before, spec.blocking_keys(record), record.owner_id != owner_before,
+        )
+    record.change_seq = await next_change_seq(db)
+    if record.owner_id != owner_before:
+        await record_tombstone(db, owner_before, record.__tablename__, record.id)
+    for owner_id in {owner_before, record.owner_id}:
+        await bump_versions(db, owner_id, record.__tablename__)
+    return record
+
+# Children whose foreign key the ORM sets to NULL when their parent is deleted
+DETACHED_ON_DELETE = {
+    Account: ((Contact, "account_id"), (Lead, "account_id")),
+    Lead: ((Activity, "lead_id"),),
+}
+
+async def detach_children(db: AsyncSession, record):
+    """Null the children's reference to `record` here, so their owners' cached reads are invalidated
+    and each changed row gets its own change_seq for sync clients."""
+    for model, column in DETACHED_ON_DELETE.get(type(record), ()):
+        rows = (await db.execute(
+            select(model.id, model.owner_id).where(getattr(model, column) == record.id).order_by(model.id)
+        )).all()
+        if not rows:
+            continue
+        first_seq = await next_change_seq(db, len(rows))
+        seqs = {row_id: first_seq + offset for offset, (row_id, _) in enumerate(rows)}
+        await db.execute(
+            update(model).where(model.id.in_(seqs))
+            .values({column: None, "change_seq": case(seqs, value=model.id)})
+        )
+        for owner_id in {owner_id for _, owner_id in rows}:
+            await bump_versions(db, owner_id, model.__tablename__)
+
+async def delete_record(db: AsyncSession, record):
+    spec = ENTITY_BY_MODEL[type(record)]
+    await detach_children(db, record)
+    await db.delete(record)
+    await record_tombstone(db, record.owner_id, record.__tablename__, record.id)
+    if spec.contribution:
+        await record_stats_change(db, before=spec.contribution(record))
+    if spec.report_rows:
+        await record_report_change(db, before=spec.report_rows(record))
+    if spec.blocking_keys:
+        await db.execute(DuplicateKey.__table__.delete().where(
+            DuplicateKey.entity == record.__tablename__, DuplicateKey.record_id == record.id,
+        ))
+    await bump_versions(db, record.owner_id, record.__tablename__)
+
+# Group commit
+# With GROUP_COMMIT=true the create and patch endpoints hand their write to one
+# writer task per worker. It takes every write queued within GROUP_COMMIT_WAIT_MS
+# of the first (up to GROUP_COMMIT_MAX_WRITES) and runs them in one transaction,
+# each in its own SAVEPOINT so a write that fails (404, constraint) is rolled back
+# alone and its error returned to its own request. The lock is taken and the
+# commit paid once per group instead of once per request.
+class GroupCommitWriter:
+    def __init__(self, max_writes: int, wait_seconds: float):
+        self.max_writes = max_writes
+        self.wait_seconds = wait_seconds
+        self.groups = 0
+        self.writes = 0
+        self._queue = None
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(HTTPException(status_code=503, detail="Server is shutting down"))
+
+    async def submit(self, work):
+        """Run `work(session)` in the next group and return its result once committed."""
+        future = asyncio.get_running_loop().create_future()
+        # The writer task runs outside the request's context, so it takes the request's
+        # SQL stats along to count the statements it runs on the request's behalf
+        self._queue.put_nowait((work, future, request_query_stats.get()))
+        return await future
+
+    async def _next_group(self) -> list:
+        group = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.wait_seconds
+        while len(group) < self.max_writes:
+            remaining = deadline - asyncio.get_running_loop().time()
+            try:
+                group.append(self._queue.get_nowait() if remaining <= 0 else await asyncio.wait_for(self._queue.get(), remaining))
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+        return group
+
+    async def _commit(self, group: list):
+        outcomes = []
+        # Statements every write in the group waits on (BEGIN, COMMIT) are counted for each of them
+        shared = QueryStats()
+        shared_token = request_query_stats.set(shared)
+        try:
+            async with AsyncSessionLocal() as db:
+                try:
+                    # Explicitly, since the driver wouldn't begin before the first SAVEPOINT
+                    await db.execute(text("BEGIN IMMEDIATE"))
+                    for work, future, stats in group:
+                        if future.done():  # the request was cancelled
+                            continue
+                        # after_flush listeners stash pending side effects in session.info
+                        info = {key: copy.copy(value) for key, value in db.info.items()}
+                        token = request_query_stats.set(stats)
+                        try:
+                            async with db.begin_nested():
+                                result = await work(db)
+                        except Exception as exc:
+                            db.info.clear()
+                            db.info.update(info)
+                            outcomes.append((future, exc, None))
+                        else:
+                            outcomes.append((future, None, result))
+                        finally:
+                            request_query_stats.reset(token)
+                    # The driver commits without a cursor, so the statement hooks don't see it
+                    started = time.perf_counter()
+                    await db.commit()
+                    shared.count += 1
+                    shared.seconds += time.perf_counter() - started
+                except Exception as exc:
+                    await db.rollback()
+                    outcomes = [(future, exc, None) for future, _, _ in outcomes]
+        finally:
+            request_query_stats.reset(shared_token)
+        for _, _, stats in group:
+            if stats is not None:
+                stats.count += shared.count
+                stats.seconds += shared.seconds
+        self.groups += 1
+        for future, error, result in outcomes:
+            if future.done():
+                continue
+            if error is None:
+                self.writes += 1
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    async def _run(self):
+        while True:
+            group = await self._next_group()
+            try:
+                await self._commit(group)
+            except Exception as exc:
+                for _, future, _ in group:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    def stats(self) -> dict:
+        return {"groups": self.groups, "writes": self.writes}
+
+group_writer = GroupCommitWriter(GROUP_COMMIT_MAX_WRITES, GROUP_COMMIT_WAIT_MS / 1000)
+
+async def commit_write(db: AsyncSession, work):
+    """Run `work(session)` and commit it, through the group-commit writer when it's running."""
+    if group_writer.running:
+        # Return the request's connection to the pool while it waits for the writer
+        await db.close()
+        return await group_writer.submit(work)
+    record = await work(db)
+    await db.commit()
+    await db.refresh(record)
+    return record
+
+# API Routes
+@app.post("/auth/register")
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
+    # Check if user exists
+    existing_user = await db.scalar(select(User).where(User.email == user_data.email))
+    if existing_user:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    
+    # Create user
+    hashed_password = await password_hasher.hash(user_data.password)
+    user = User(
+        email=user_data.email,
+        name=user_data.name,
+        role=user_data.role,
+        password_hash=hashed_password
+    )
+    db.add(user)
+    await db.commit()
+    await db.refresh(user)
+    
+    return {"message": "User created successfully"}
+
+@app.post("/auth/login")
+async def login(login_data: UserLogin, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.email == login_data.email))
+    if not user or not await password_hasher.verify(login_data.password, user.password_hash):
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    
+    # Upgrade hashes made with a different work factor while we have the plaintext
+    if password_needs_rehash(user.password_hash):
+        user.password_hash = await password_hasher.hash(login_data.password)
+        await db.commit()
+    
+    access_token = create_access_token(data={"sub": user.email})
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "user": {
+            "id": user.id,
+            "email": user.email,
+            "name": user.name,
+            "role": user.role
+        }
+    }
+
+@app.get("/me")
+async def get_current_user_info(current_user: Principal = Depends(get_current_user)):
+    return {
+        "id": current_user.id,
+        "email": current_user.email,
+        "name": current_user.name,
+        "role": current_user.role
+    }
+
+# Dashboard stats
+@app.get("/dashboard/stats")
+async def get_dashboard_stats(request: Request, response: Response, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    async def build():
+        # Read the per-owner rollup maintained by the lead, account and task write handlers
+        stats = await db.get(OwnerStats, current_user.id)
+        if stats is None:
+            stats = await backfill_owner_stats(db, current_user.id)
+            await db.commit()
+    
+        return {
+            "total_leads": stats.total_leads,
+            "open_leads": stats.open_leads,
+            "won_leads": stats.won_leads,
+            "lost_leads": stats.lost_leads,
+            "total_accounts": stats.total_accounts,
+            "open_tasks": stats.open_tasks,
+            "pipeline_value": stats.pipeline_value_cents / 100  # Convert cents to dollars
+        }
+    
+    return await cached_read(request, response, db, current_user.id, ("leads", "accounts", "tasks"), build)
+
+# Pipeline board
+@app.get("/pipeline")
+async def get_pipeline(
+    request: Request,
+    response: Response,
+    status: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Leads grouped by stage for the Kanban board, with per-stage counts and value
+    totals, each card's account name and its next open task."""
+    async def build():
+        stages = {stage: {"stage": stage, "count": 0, "value_cents": 0, "leads": []} for stage in LEAD_STAGES}
+        result = await db.execute(pipeline_query(current_user.id, status))
+        for row in result:
+            column = stages.get(row.stage)
+            if column is None:
+                column = stages[row.stage] = {"stage": row.stage, "count": 0, "value_cents": 0, "leads": []}
+            column["count"] += 1
+            column["value_cents"] += row.value_cents or 0
+            column["leads"].append({
+                "id": row.id,
+                "title": row.title,
+                "stage": row.stage,
+                "status": row.status,
+                "value_cents": row.value_cents,
+                "probability": row.probability,
+                "expected_close_date": row.expected_close_date,
+                "account_id": row.account_id,
+                "account_name": row.account_name,
+                "primary_contact_id": row.primary_contact_id,
+                "next_task": {
+                    "id": row.task_id,
+                    "title": row.task_title,
+                    "due_at": row.task_due_at,
+                    "priority": row.task_priority,
+                } if row.task_id else None,
+            })
+    
+        columns = list(stages.values())
+        return {
+            "stages": columns,
+            "total_count": sum(column["count"] for column in columns),
+            "total_value_cents": sum(column["value_cents"] for column in columns),
+        }
+    
+    return await cached_read(request, response, db, current_user.id, ("leads", "accounts", "tasks"), build)
+
+# Reports
+# Served from report_rollups; `start` and `end` select the buckets containing those dates.
+def rollup_query(owner_id: int, kind: str, period: str, start: Optional[date], end: Optional[date], *columns):
+    if period not in REPORT_PERIODS:
+        raise HTTPException(status_code=400, detail=f"period must be one of: {', '.join(REPORT_PERIODS)}")
+    query = select(*columns).where(
+        ReportRollup.owner_id == owner_id, ReportRollup.kind == kind, ReportRollup.period == period
+    )
+    if start:
+        query = query.where(ReportRollup.bucket >= period_start(start, period))
+    if end:
+        query = query.where(ReportRollup.bucket <= end)
+    return query
+
+def status_total(status: str, measure):
+    return func.sum(case((ReportRollup.status == status, measure), else_=0))
+
+@app.get("/reports/pipeline")
+async def get_pipeline_report(request: Request, response: Response, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Open leads per stage with their total and probability-weighted value."""
+    async def build():
+        query = rollup_query(
+            current_user.id, "leads", "month", None, None,
+            ReportRollup.stage,
+            func.sum(ReportRollup.lead_count).label("lead_count"),
+            func.sum(ReportRollup.value_cents).label("value_cents"),
+            func.sum(ReportRollup.weighted_value_cents).label("weighted_value_cents"),
+        ).where(ReportRollup.status == "open").group_by(ReportRollup.stage)
+        rows = {row.stage: row for row in await db.execute(query) if row.lead_count}
+        stages = LEAD_STAGES + sorted(stage for stage in rows if stage not in LEAD_STAGES)
+        return [
+            {
+                "stage": stage,
+                "lead_count": rows[stage].lead_count,
+                "value_cents": rows[stage].value_cents,
+                "weighted_value_cents": rows[stage].weighted_value_cents,
+            } if stage in rows else {"stage": stage, "lead_count": 0, "value_cents": 0, "weighted_value_cents": 0}
+            for stage in stages
+        ]
+    
+    return await cached_read(request, response, db, current_user.id, ("leads",), build)
+
+@app.get("/reports/won-lost")
+async def get_won_lost_report(
+    request: Request,
+    response: Response,
+    period: str = "month",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Leads created in each period, split by their current outcome."""
+    async def build():
+        query = rollup_query(
+            current_user.id, "leads", period, start, end,
+            ReportRollup.bucket,
+            func.sum(ReportRollup.lead_count).label("lead_count"),
+            status_total("closed_won", ReportRollup.lead_count).label("won_count"),
+            status_total("closed_won", ReportRollup.value_cents).label("won_value_cents"),
+            status_total("closed_lost", ReportRollup.lead_count).label("lost_count"),
+            status_total("closed_lost", ReportRollup.value_cents).label("lost_value_cents"),
+            status_total("open", ReportRollup.lead_count).label("open_count"),
+        ).group_by(ReportRollup.bucket).order_by(ReportRollup.bucket)
+        return [dict(row._mapping) for row in await db.execute(query) if row.lead_count]
+    
+    return await cached_read(request, response, db, current_user.id, ("leads",), build)
+
+@app.get("/reports/sources")
+async def get_sources_report(
+    request: Request,
+    response: Response,
+    period: str = "month",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = Query(10, ge=1, le=100),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Lead sources ranked by the number of leads they produced, with win rates."""
+    async def build():
+        lead_count = func.sum(ReportRollup.lead_count).label("lead_count")
+        query = rollup_query(
+            current_user.id, "leads", period, start, end,
+            ReportRollup.source,
+            lead_count,
+            status_total("closed_won", ReportRollup.lead_count).label("won_count"),
+            status_total("closed_won", ReportRollup.value_cents).label("won_value_cents"),
+            status_total("closed_lost", ReportRollup.lead_count).label("lost_count"),
+        ).group_by(ReportRollup.source).having(lead_count > 0).order_by(lead_count.desc(), ReportRollup.source).limit(limit)
+        return [
+            {
+                "source": row.source or None,
+                "lead_count": row.lead_count,
+                "won_count": row.won_count,
+                "won_value_cents": row.won_value_cents,
+                "win_rate": row.won_count / (row.won_count + row.lost_count) if row.won_count + row.lost_count else None,
+            }
+            for row in await db.execute(query)
+        ]
+    
+    return await cached_read(request, response, db, current_user.id, ("leads",), build)
+
+@app.get("/reports/forecast")
+async def get_forecast_report(
+    request: Request,
+    response: Response,
+    period: str = "month",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Open leads bucketed by expected close date, weighted by their probability."""
+    async def build():
+        query = rollup_query(
+            current_user.id, "forecast", period, start, end,
+            ReportRollup.bucket,
+            func.sum(ReportRollup.lead_count).label("lead_count"),
+            func.sum(ReportRollup.value_cents).label("value_cents"),
+            func.sum(ReportRollup.weighted_value_cents).label("weighted_value_cents"),
+        ).group_by(ReportRollup.bucket).order_by(ReportRollup.bucket)
+        return [dict(row._mapping) for row in await db.execute(query) if row.lead_count]
+    
+    return await cached_read(request, response, db, current_user.id, ("leads",), build)
+
+# Batch endpoint
+def resolve_batch_ref(value, refs: dict):
+    if isinstance(value, str) and value.startswith("$"):
+        if value[1:] not in refs:
+            raise HTTPException(status_code=400, detail=f"Unknown reference {value}")
+        return refs[value[1:]]
+    return value
+
+def validate_payload(schema, data: dict, exclude_unset: bool = False) -> dict:
+    try:
+        return schema.model_validate(data).model_dump(exclude_unset=exclude_unset)
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=validation_messages(exc))
+
+@app.post("/batch")
+async def run_batch(batch: BatchRequest, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Apply an ordered list of create/patch/delete operations in a single transaction.
+
+    Operations can refer to records created earlier in the batch with "$<ref>" (or
+    "$<index>") in `id` or a top-level `data` id field (`account_id`, `linked_id`, ...);
+    other values are taken literally, so free text may start with "$". If any operation fails the
+    whole batch is rolled back and the error names the failing operation. Each
+    result carries the record's state at commit, so a record touched twice is
+    reported with its final values both times.
+    """
+    if len(batch.operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {MAX_BATCH_OPERATIONS} operations")
+    
+    refs = {}
+    results = []
+    index = 0
+    try:
+        for index, operation in enumerate(batch.operations):
+            spec = ENTITIES.get(operation.entity)
+            if spec is None:
+                raise HTTPException(status_code=400, detail=f"Unknown entity: {operation.entity}")
+            data = {
+                key: resolve_batch_ref(value, refs) if key.endswith("_id") else value
+                for key, value in operation.data.items()
+            }
+            
+            if operation.op == "create":
+                record = await create_record(db, spec.model, validate_payload(spec.create_schema, data), current_user.id)
+            elif operation.op in ("patch", "delete"):
+                record_id = resolve_batch_ref(operation.id, refs)
+                if not isinstance(record_id, int):
+                    raise HTTPException(status_code=400, detail=f"{operation.op} requires a record id")
+                record = await get_owned(db, spec.model, record_id, current_user.id)
+                if operation.op == "patch":
+                    if spec.patch_schema:
+                        data = validate_payload(spec.patch_schema, data, exclude_unset=True)
+                    await update_record(db, record, data)
+                else:
+                    await delete_record(db, record)
+            else:
+                raise HTTPException(status_code=400, detail=f"Unknown op: {operation.op}")
+            
+            refs[str(index)] = record.id
+            if operation.ref:
+                refs[operation.ref] = record.id
+            results.append({
+                "op": operation.op,
+                "entity": operation.entity,
+                "id": record.id,
+                "record": None if operation.op == "delete" else record,
+            })
+        await db.commit()
+    except HTTPException as exc:
+        await db.rollback()
+        raise HTTPException(status_code=exc.status_code, detail={"operation": index, "detail": exc.detail})
+    
+    for result in results:
+        if result["record"] is not None:
+            result["record"] = read_record(result["record"])
+    return {"results": results}
+
+# CSV import/export
+class ImportSpec(NamedTuple):
+    model: type
+    schema: type
+    contribution: Optional[object]  # rollup contribution function, if the entity feeds owner_stats
+    links_account: bool
+
+IMPORT_ENTITIES = {
+    "accounts": ImportSpec(Account, AccountCreate, account_contribution, False),
+    "contacts": ImportSpec(Contact, ContactCreate, None, True),
+    "leads": ImportSpec(Lead, LeadCreate, lead_contribution, True),
+}
+
+EXPORT_ENTITIES = {
+    "accounts": Account,
+    "contacts": Contact,
+    "leads": Lead,
+    "activities": Activity,
+    "tasks": Task,
+}
+
+def clean_csv_row(row: dict) -> dict:
+    # Blank cells mean "not provided" so optional fields fall back to their defaults
+    return {
+        key.strip(): value.strip()
+        for key, value in row.items()
+        if key and isinstance(value, str) and value.strip()
+    }
+
+def lead_status_for_stage(stage: str) -> str:
+    return {"Closed-Won": "closed_won", "Closed-Lost": "closed_lost"}.get(stage, "open")
+
+async def resolve_account_names(db: AsyncSession, owner_id: int, names: set, cache: dict):
+    """Fill `cache` with name -> id for any of `names` not looked up yet (lowest id wins on duplicates)."""
+    missing = [name for name in names if name not in cache]
+    if not missing:
+        return
+    for name in missing:
+        cache[name] = None
+    rows = await db.execute(
+        select(Account.name, Account.id)
+        .where(Account.owner_id == owner_id, Account.name.in_(missing))
+        .order_by(Account.id.desc())
+    )
+    for name, account_id in rows:
+        cache[name] = account_id
+
+@app.post("/import/{entity}")
+async def import_csv(entity: str, file: UploadFile = File(...), current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Bulk-create accounts, contacts or leads from a CSV upload.
+
+    Rows are validated against the regular create models and inserted in batches of
+    IMPORT_BATCH_SIZE, one transaction per batch. Contacts and leads may give an
+    `account_name` column instead of `account_id`. Imported accounts and contacts
+    that look like existing records (or each other) are listed in `possible_duplicates`.
+    """
+    spec = IMPORT_ENTITIES.get(entity)
+    if spec is None:
+        raise HTTPException(status_code=404, detail=f"Cannot import {entity}")
+    
+    reader = csv.DictReader(io.TextIOWrapper(file.file, encoding="utf-8-sig", newline=""))
+    account_ids = {}
+    imported, failed, row_number = 0, 0, 0
+    errors, possible_duplicates = [], []
+    
+    def record_error(number, messages):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_IMPORT_ERRORS:
+            errors.append({"row": number, "errors": messages})
+    
+    while True:
+        try:
+            # Parse off the event loop; only one batch of rows is held in memory at a time
+            batch = await run_in_threadpool(lambda: list(islice(reader, IMPORT_BATCH_SIZE)))
+        except (csv.Error, UnicodeDecodeError) as exc:
+            raise HTTPException(status_code=400, detail=f"Invalid CSV after row {row_number}: {exc}")
+        if not batch:
+            break
+        
+        pending = []
+        for raw in batch:
+            row_number += 1
+            values = clean_csv_row(raw)
+            account_name = values.pop("account_name", None) if spec.links_account else None
+            try:
+                data = spec.schema.model_validate(values).model_dump()
+            except ValidationError as exc:
+                record_error(row_number, validation_messages(exc))
+                continue
+            pending.append((row_number, data, account_name))
+        
+        if spec.links_account:
+            await resolve_account_names(db, current_user.id, {name for _, _, name in pending if name}, account_ids)
+        
+        rows, numbers = [], []
+        for number, data, account_name in pending:
+            if account_name and data.get("account_id") is None:
+                if account_ids.get(account_name) is None:
+                    record_error(number, [f"account_name: unknown account '{account_name}'"])
+                    continue
+                data["account_id"] = account_ids[account_name]
+            data = naive_utc_values(data)
+            data["owner_id"] = current_user.id
+            if spec.model is Lead:
+                data["status"] = lead_status_for_stage(data["stage"])
+                data["created_at"] = datetime.utcnow()
+            rows.append(data)
+            numbers.append(number)
+        
+        if rows:
+            first_seq = await next_change_seq(db, len(rows))
+            for offset, data in enumerate(rows):
+                data["change_seq"] = first_seq + offset
+            if entity in DUPLICATE_ENTITIES:
+                ids = (await db.execute(insert(spec.model).returning(spec.model.id, sort_by_parameter_order=True), rows)).scalars().all()
+                records = [SimpleNamespace(**data, id=record_id) for data, record_id in zip(rows, ids)]
+                keys = blocking_key_rows(entity, records)
+                if keys:
+                    await db.execute(insert(DuplicateKey), keys)
+                # After the keys are in, so rows duplicating each other are found too
+                for n, matches in (await find_duplicates(db, entity, records)).items():
+                    if len(possible_duplicates) < MAX_IMPORT_ERRORS:
+                        possible_duplicates.append({"row": numbers[n], "id": ids[n], "candidates": [match["id"] for match in matches]})
+            else:
+                await db.execute(insert(spec.model), rows)
+            if spec.contribution is not None:
+                deltas = {}
+                for data in rows:
+                    _, contribution = spec.contribution(SimpleNamespace(**data))
+                    for name, value in contribution.items():
+                        deltas[name] = deltas.get(name, 0) + value
+                await adjust_owner_stats(db, current_user.id, deltas)
+            if spec.model is Lead:
+                report_deltas = {}
+                for data in rows:
+                    add_report_rows(report_deltas, lead_report_rows(SimpleNamespace(**data)))
+                await apply_report_deltas(db, report_deltas)
+            await bump_versions(db, current_user.id, spec.model.__tablename__)
+            # Core inserts don't go through the flush, so the batch is announced as one notice
+            queue_change_notice(db.sync_session, current_user.id, {"entity": entity, "op": "imported", "count": len(rows)})
+            await db.commit()
+            imported += len(rows)
+    
+    return {
+        "entity": entity, "imported": imported, "failed": failed, "errors": errors,
+        "possible_duplicates": possible_duplicates,
+    }
+
+def csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+@app.get("/export/{entity}")
+async def export_csv(entity: str, current_user: Principal = Depends(get_current_user)):
+    """Stream every row the user owns as CSV, fetching EXPORT_BATCH_SIZE rows at a time."""
+    model = EXPORT_ENTITIES.get(entity)
+    if model is None:
+        raise HTTPException(status_code=404, detail=f"Cannot export {entity}")
+    
+    # change_seq is sync bookkeeping, not record data
+    columns = [column for column in model.__table__.columns if column.name != "change_seq"]
+    statement = (
+        select(*columns)
+        .where(model.owner_id == current_user.id)
+        .order_by(model.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    
+    async def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([column.name for column in columns])
+        yield buffer.getvalue()
+        # The response outlives the request's dependencies, so the stream owns its session,
+        # from the read pool: a slow download must not hold one of the writers' connections
+        async with AsyncReadSessionLocal() as db:
+            result = await db.stream(statement)
+            async for partition in result.partitions():
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows([csv_value(value) for value in row] for row in partition)
+                yield buffer.getvalue()
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{entity}.csv"'},
+    )
+
+# Search
+@app.get("/search")
+async def search(
+    request: Request,
+    response: Response,
+    q: str,
+    types: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """BM25-ranked prefix search across accounts, contacts, leads and activities."""
+    async def build():
+        kinds = [k.strip() for k in types.split(",")] if types else list(SEARCH_INDEXES)
+        unknown = [k for k in kinds if k not in SEARCH_INDEXES]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown search type: {', '.join(unknown)}")
+    
+        params = {"limit": limit + 1}
+        selects = []
+        for n, kind in enumerate(kinds):
+            index = SEARCH_INDEXES[kind]
+            match = fts_match(q, index, current_user.id)
+            if match is None:
+                return []
+            params[f"match_{n}"] = match
+            # Title column weighs 10x, other text 1x, the owner_id scoping column not at all
+            weights = ", ".join(["10.0"] + ["1.0"] * (len(index.columns) - 1) + ["0.0"])
+            if kind == "contact":
+                title = f"highlight({index.fts}, 0, '<mark>', '</mark>') || ' ' || highlight({index.fts}, 1, '<mark>', '</mark>')"
+            else:
+                title = f"highlight({index.fts}, 0, '<mark>', '</mark>')"
+            if index.snippet_column:
+                column = index.columns.index(index.snippet_column)
+                snippet = f"snippet({index.fts}, {column}, '<mark>', '</mark>', '…', 16)"
+            else:
+                snippet = "NULL"
+            selects.append(
+                f"SELECT '{kind}' AS type, rowid AS id, bm25({index.fts}, {weights}) AS score, "
+                f"{title} AS title, {snippet} AS snippet FROM {index.fts} WHERE {index.fts} MATCH :match_{n}"
+            )
+            archive = ARCHIVE_SEARCH_INDEXES.get(kind)
+            if archive:
+                # The archive's index is contentless: titles come unhighlighted from the table, without snippets
+                params[f"archive_match_{n}"] = fts_match(q, archive, current_user.id)
+                selects.append(
+                    f"SELECT '{kind}' AS type, {archive.fts}.rowid AS id, bm25({archive.fts}, {weights}) AS score, "
+                    f"{archive.table}.{archive.columns[0]} AS title, NULL AS snippet FROM {archive.fts} "
+                    f"JOIN {archive.table} ON {archive.table}.id = {archive.fts}.rowid "
+                    f"WHERE {archive.fts} MATCH :archive_match_{n}"
+                )
+    
+        where = ""
+        if cursor:
+            value, row_id = decode_cursor(cursor, None)
+            try:
+                score, kind = value
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            where = "WHERE (score, type, id) > (:after_score, :after_type, :after_id)"
+            params.update(after_score=score, after_type=kind, after_id=row_id)
+        statement = text(f"SELECT * FROM ({' UNION ALL '.join(selects)}) {where} ORDER BY score, type, id LIMIT :limit")
+        rows = (await db.execute(statement, params)).all()
+    
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            response.headers["X-Next-Cursor"] = encode_cursor([last.score, last.type], last.id)
+        return [
+            {"type": row.type, "id": row.id, "title": row.title, "snippet": row.snippet or None, "score": row.score}
+            for row in rows
+        ]
+    
+    return await cached_read(request, response, db, current_user.id, ("accounts", "contacts", "leads", "activities"), build)
+
+# Accounts endpoints
+@app.get("/accounts")
+async def get_accounts(
+    request: Request,
+    response: Response,
+    q: Optional[str] = None,
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    sort_field, descending = parse_sort(sort, ["name", "created_at", "updated_at"], "name")
+    query = select(Account).where(Account.owner_id == current_user.id)
+    if q:
+        query = query.where(fts_filter(Account, "account", q, current_user.id))
+    return await cached_read(
+        request, response, db, current_user.id, ("accounts",),
+        lambda: paginate(db, query, Account, response, sort_field, descending, cursor, limit, parse_fields(Account, fields)),
+    )
+
+@app.post("/accounts", response_model=AccountRead)
+async def create_account(
+    account_data: AccountCreate,
+    response: Response,
+    reject_duplicates: bool = False,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    values = account_data.model_dump()
+    await flag_duplicates(db, response, "accounts", values, reject_duplicates)
+    return await commit_write(db, lambda session: create_record(session, Account, values, current_user.id))
+
+@app.patch("/accounts/{account_id}", response_model=AccountRead)
+async def update_account(account_id: int, account_data: dict, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    async def work(session):
+        return await update_record(session, await get_owned(session, Account, account_id, current_user.id), account_data)
+    
+    return await commit_write(db, work)
+
+@app.delete("/accounts/{account_id}")
+async def delete_account(account_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    account = await get_owned(db, Account, account_id, current_user.id)
+    await delete_record(db, account)
+    await db.commit()
+    return {"message": "Account deleted successfully"}
+
+# Contacts endpoints
+@app.get("/contacts")
+async def get_contacts(
+    request: Request,
+    response: Response,
+    q: Optional[str] = None,
+    account_id: Optional[int] = None,
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    sort_field, descending = parse_sort(sort, ["last_name", "created_at", "updated_at"], "last_name")
+    query = select(Contact).where(Contact.owner_id == current_user.id)
+    if account_id:
+        query = query.where(Contact.account_id == account_id)
+    if q:
+        query = query.where(fts_filter(Contact, "contact", q, current_user.id))
+    return await cached_read(
+        request, response, db, current_user.id, ("contacts",),
+        lambda: paginate(db, query, Contact, response, sort_field, descending, cursor, limit, parse_fields(Contact, fields)),
+    )
+
+@app.post("/contacts", response_model=ContactRead)
+async def create_contact(
+    contact_data: ContactCreate,
+    response: Response,
+    reject_duplicates: bool = False,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    values = contact_data.dict()
+    await flag_duplicates(db, response, "contacts", values, reject_duplicates)
+    return await commit_write(db, lambda session: create_record(session, Contact, values, current_user.id))
+
+@app.get("/contacts/{contact_id}", response_model=ContactRead)
+async def get_contact(contact_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    return await get_owned(db, Contact, contact_id, current_user.id)
+
+@app.patch("/contacts/{contact_id}", response_model=ContactRead)
+async def update_contact(contact_id: int, contact_data: ContactCreate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    data = contact_data.dict(exclude_unset=True)
+    
+    async def work(session):
+        return await update_record(session, await get_owned(session, Contact, contact_id, current_user.id), data)
+    
+    return await commit_write(db, work)
+
+@app.delete("/contacts/{contact_id}")
+async def delete_contact(contact_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    contact = await get_owned(db, Contact, contact_id, current_user.id)
+    await delete_record(db, contact)
+    await db.commit()
+    return {"message": "Contact deleted successfully"}
+
+# Duplicates endpoints
+# Admins see and merge duplicates across every owner; other users see pairs that
+# involve one of their records and merge records they own.
+def duplicate_pairs(blocks: dict, mine: Optional[set]) -> set:
+    pairs = set()
+    for members in blocks.values():
+        members = sorted(members)
+        for i, first in enumerate(members):
+            for second in members[i + 1:]:
+                if mine is None or first in mine or second in mine:
+                    pairs.add((first, second))
+    return pairs
+
+def score_pairs(spec: DuplicateSpec, pairs: set, records: dict, min_score: float) -> List[dict]:
+    scored = []
+    for first, second in pairs:
+        score, reasons = duplicate_score(spec, records[first], records[second])
+        if score >= min_score:
+            scored.append({
+                "score": score,
+                "reasons": reasons,
+                "records": [{field: getattr(records[n], field) for field in spec.summary_fields} for n in (first, second)],
+            })
+    scored.sort(key=lambda pair: (-pair["score"], pair["records"][0]["id"], pair["records"][1]["id"]))
+    return scored
+
+@app.get("/duplicates")
+async def get_duplicates(
+    entity: str = "accounts",
+    min_score: float = Query(DUPLICATE_MIN_SCORE, ge=0, le=1),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Likely duplicate pairs, best first, scored only within blocks of records sharing a key.
+
+    Keys shared by more than DUPLICATE_MAX_BLOCK records are skipped and counted in
+    `oversized_blocks`.
+    """
+    spec = DUPLICATE_ENTITIES.get(entity)
+    if spec is None:
+        raise HTTPException(status_code=400, detail=f"Cannot check {entity} for duplicates")
+    admin = current_user.role == "admin"
+    sizes = duplicate_blocks(entity, None if admin else current_user.id).subquery()
+    oversized = await db.scalar(select(func.count()).select_from(sizes).where(sizes.c.size > DUPLICATE_MAX_BLOCK))
+    members = await db.execute(
+        select(DuplicateKey.key, DuplicateKey.record_id, DuplicateKey.owner_id)
+        .join(sizes, DuplicateKey.key == sizes.c.key)
+        .where(DuplicateKey.entity == entity, sizes.c.size <= DUPLICATE_MAX_BLOCK)
+    )
+    blocks, mine = {}, None if admin else set()
+    for key, record_id, owner_id in members:
+        blocks.setdefault(key, []).append(record_id)
+        if not admin and owner_id == current_user.id:
+            mine.add(record_id)
+    pairs = await run_in_threadpool(duplicate_pairs, blocks, mine)
+    records = {}
+    for chunk in chunked(sorted({n for pair in pairs for n in pair}), 500):
+        for row in await db.execute(select(*spec.model.__table__.columns).where(spec.model.id.in_(chunk))):
+            records[row.id] = row
+    scored = await run_in_threadpool(score_pairs, spec, pairs, records, min_score)
+    return {
+        "entity": entity,
+        "pairs": scored[:limit],
+        "total": len(scored),
+        "candidate_pairs": len(pairs),
+        "oversized_blocks": oversized,
+    }
+
+# What a merge re-points from the duplicates to the kept record
+MERGE_REFERENCES = {
+    "accounts": [(Contact, "account_id"), (Lead, "account_id"), (Activity, "account_id")],
+    "contacts": [(Lead, "primary_contact_id"), (Activity, "contact_id")],
+}
+MERGE_LINK_TYPES = {"accounts": "account", "contacts": "contact"}
+
+async def get_mergeable(db: AsyncSession, model, record_ids: List[int], principal: Principal) -> list:
+    query = select(model).where(model.id.in_(record_ids))
+    if principal.role != "admin":
+        query = query.where(model.owner_id == principal.id)
+    records = {record.id: record for record in await db.scalars(query)}
+    for record_id in record_ids:
+        if record_id not in records:
+            raise HTTPException(status_code=404, detail=f"{model.__name__} {record_id} not found")
+    return [records[record_id] for record_id in record_ids]
+
+@app.post("/duplicates/merge")
+async def merge_duplicates(merge: DuplicateMerge, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Merge `duplicate_ids` into `keep_id` in one transaction.
+
+    Blank fields of the kept record are filled from the duplicates (in the order
+    given); contacts, leads, activities (archived ones too), tasks and attachments
+    pointing at a duplicate are re-pointed to the kept record, then the duplicates
+    are deleted.
+    """
+    spec = DUPLICATE_ENTITIES.get(merge.entity)
+    if spec is None:
+        raise HTTPException(status_code=400, detail=f"Cannot merge {merge.entity}")
+    duplicate_ids = list(dict.fromkeys(merge.duplicate_ids))
+    if not duplicate_ids or merge.keep_id in duplicate_ids:
+        raise HTTPException(status_code=400, detail="duplicate_ids must name records other than keep_id")
+    if len(duplicate_ids) > MAX_MERGE_DUPLICATES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_MERGE_DUPLICATES} records can be merged at once")
+    
+    # Everything is read before the first write, so the write lock is only held for the writes
+    keep, *duplicates = await get_mergeable(db, spec.model, [merge.keep_id, *duplicate_ids], current_user)
+    fill = {}
+    for field in ENTITIES[merge.entity].create_schema.model_fields:
+        if getattr(keep, field) in (None, ""):
+            value = next((getattr(duplicate, field) for duplicate in duplicates if getattr(duplicate, field) not in (None, "")), None)
+            if value is not None:
+                fill[field] = value
+    referencing = [
+        (column, list(await db.scalars(select(model).where(getattr(model, column).in_(duplicate_ids)))))
+        for model, column in MERGE_REFERENCES[merge.entity]
+    ]
+    link_type = MERGE_LINK_TYPES[merge.entity]
+    tasks = list(await db.scalars(select(Task).where(Task.linked_type == link_type, Task.linked_id.in_(duplicate_ids))))
+    
+    repointed = {}
+    for column, records in referencing + [("linked_id", tasks)]:
+        for record in records:
+            await update_record(db, record, {column: merge.keep_id})
+        if records:
+            repointed[records[0].__tablename__] = repointed.get(records[0].__tablename__, 0) + len(records)
+    # Archived activities and attachments aren't synced records, so they are updated
+    # in place; their owners' cached reads are invalidated here instead
+    for model, column in MERGE_REFERENCES[merge.entity]:
+        if model is Activity:
+            owners = (await db.execute(
+                update(ArchivedActivity).where(getattr(ArchivedActivity, column).in_(duplicate_ids))
+                .values({column: merge.keep_id}).returning(ArchivedActivity.owner_id)
+            )).scalars().all()
+            if owners:
+                repointed[ArchivedActivity.__tablename__] = len(owners)
+            for owner_id in set(owners):
+                await bump_versions(db, owner_id, "activities")
+    owners = (await db.execute(
+        update(Attachment)
+        .where(Attachment.linked_type == link_type, Attachment.linked_id.in_(duplicate_ids))
+        .values(linked_id=merge.keep_id).returning(Attachment.owner_id)
+    )).scalars().all()
+    if owners:
+        repointed[Attachment.__tablename__] = len(owners)
+    for owner_id in set(owners):
+        await bump_versions(db, owner_id, "attachments")
+    
+    await update_record(db, keep, fill)
+    # Flush the re-pointing first: deleting an account nulls the foreign keys of
+    # whatever still references it in the database
+    await db.flush()
+    for duplicate in duplicates:
+        await delete_record(db, duplicate)
+    await db.commit()
+    return {"entity": merge.entity, "kept": read_record(keep), "merged_ids": duplicate_ids, "repointed": repointed}
+
+# Leads endpoints
+@app.get("/leads")
+async def get_leads(
+    request: Request,
+    response: Response,
+    q: Optional[str] = None,
+    stage: Optional[str] = None,
+    status: Optional[str] = None,
+    account_id: Optional[int] = None,
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    sort_field, descending = parse_sort(
+        sort, ["created_at", "updated_at", "value_cents", "expected_close_date"], "created_at"
+    )
+    query = select(Lead).where(Lead.owner_id == current_user.id)
+    if stage:
+        query = query.where(Lead.stage == stage)
+    if status:
+        query = query.where(Lead.status == status)
+    if account_id:
+        query = query.where(Lead.account_id == account_id)
+    if q:
+        query = query.where(fts_filter(Lead, "lead", q, current_user.id))
+    return await cached_read(
+        request, response, db, current_user.id, ("leads",),
+        lambda: paginate(db, query, Lead, response, sort_field, descending, cursor, limit, parse_fields(Lead, fields)),
+    )
+
+@app.post("/leads", response_model=LeadRead)
+async def create_lead(lead_data: LeadCreate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    values = lead_data.dict()
+    return await commit_write(db, lambda session: create_record(session, Lead, values, current_user.id))
+
+@app.get("/leads/{lead_id}", response_model=LeadRead)
+async def get_lead(lead_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    return await get_owned(db, Lead, lead_id, current_user.id)
+
+# Newest first; items with the same timestamp are ordered by kind, then newest id
+TIMELINE_KINDS = ("activity", "event", "task")
+
+def timeline_sources(lead_id: int, owner_id: int):
+    """(kind, model, timestamp column, filters) for each source merged into a lead's timeline."""
+    return [
+        ("activity", Activity, Activity.occurred_at, [Activity.lead_id == lead_id, Activity.owner_id == owner_id]),
+        ("activity", ArchivedActivity, ArchivedActivity.occurred_at,
+         [ArchivedActivity.lead_id == lead_id, ArchivedActivity.owner_id == owner_id]),
+        ("event", LeadEvent, LeadEvent.occurred_at, [LeadEvent.lead_id == lead_id]),
+        ("task", Task, Task.created_at, [Task.linked_type == "lead", Task.linked_id == lead_id, Task.owner_id == owner_id]),
+    ]
+
+def timeline_item(kind: str, at, record):
+    if kind == "event":
+        body = {
+            "field": record.field,
+            "old_value": json.loads(record.old_value) if record.old_value is not None else None,
+            "new_value": json.loads(record.new_value) if record.new_value is not None else None,
+        }
+    else:
+        body = read_record(record)
+    return {"kind": kind, "id": record.id, "occurred_at": at, "record": body}
+
+async def timeline_run(db: AsyncSession, model, at_column, filters: list, rank: int, after, count: int):
+    """Up to `count` rows of one timeline source following the cursor, newest first.
+
+    Timestamped rows and the NULL-timestamp tail (sorted last) are read separately:
+    the bounds stay plain index ranges, where one OR-ed keyset predicate would
+    make SQLite walk the index from the newest row on every page.
+    """
+    at, bound = None, None
+    if after:
+        at, after_rank, after_id = after
+        # Same kind continues after the cursor's id; earlier kinds at the cursor's
+        # timestamp were already returned, later kinds were not
+        bound = after_id if rank == after_rank else (0 if rank < after_rank else 2 ** 63 - 1)
+    
+    records = []
+    if not after or at is not None:
+        query = select(model).where(*filters)
+        if after:
+            query = query.where(at_column <= at, or_(at_column < at, model.id < bound))
+        else:
+            query = query.where(at_column.is_not(None))
+        query = query.order_by(at_column.desc(), model.id.desc()).limit(count)
+        records = (await db.scalars(query)).all()
+    if len(records) < count:
+        query = select(model).where(*filters, at_column.is_(None))
+        if after and at is None:
+            query = query.where(model.id < bound)
+        query = query.order_by(model.id.desc()).limit(count - len(records))
+        records += (await db.scalars(query)).all()
+    return records
+
+@app.get("/leads/{lead_id}/timeline")
+async def get_lead_timeline(
+    lead_id: int,
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """The lead's activities, tasks and change log merged newest first.
+
+    Each source is read with an indexed range scan of at most `limit + 1` rows
+    starting after the cursor, and the sorted runs are merged lazily, so a page
+    costs the same however deep into the timeline it is.
+    """
+    async def build():
+        await get_owned(db, Lead, lead_id, current_user.id)
+    
+        after = None
+        if cursor:
+            value, row_id = decode_cursor(cursor, None)
+            try:
+                at, kind = value
+                after = (datetime.fromisoformat(at) if at is not None else None, TIMELINE_KINDS.index(kind), row_id)
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+        runs = []
+        for kind, model, at_column, filters in timeline_sources(lead_id, current_user.id):
+            rank = TIMELINE_KINDS.index(kind)
+            records = await timeline_run(db, model, at_column, filters, rank, after, limit + 1)
+            runs.append([
+                ((getattr(r, at_column.key) is not None, getattr(r, at_column.key) or datetime.min, -rank, r.id), kind, r)
+                for r in records
+            ])
+    
+        page = list(islice(heapq.merge(*runs, key=lambda item: item[0], reverse=True), limit + 1))
+        if len(page) > limit:
+            page = page[:limit]
+            (has_at, last_at, _, last_id), last_kind, _ = page[-1]
+            response.headers["X-Next-Cursor"] = encode_cursor([last_at.isoformat() if has_at else None, last_kind], last_id)
+        return [timeline_item(kind, key[1] if key[0] else None, record) for key, kind, record in page]
+    
+    return await cached_read(request, response, db, current_user.id, ("activities", "leads", "tasks"), build)
+
+@app.patch("/leads/{lead_id}", response_model=LeadRead)
+async def update_lead(lead_id: int, lead_data: dict, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    async def work(session):
+        return await update_record(session, await get_owned(session, Lead, lead_id, current_user.id), lead_data)
+    
+    return await commit_write(db, work)
+
+@app.delete("/leads/{lead_id}")
+async def delete_lead(lead_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    lead = await get_owned(db, Lead, lead_id, current_user.id)
+    await delete_record(db, lead)
+    await db.commit()
     return {"message": "Lead deleted successfully"}
 
 # Activities endpoints
 @app.get("/activities")
-async def get_activities(lead_id: Optional[int] = None, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    query = db.query(Activity).filter(Activity.owner_id == current_user.id)
-    if lead_id:
-        query = query.filter(Activity.lead_id == lead_id)
-    activities = query.order_by(Activity.occurred_at.desc()).all()
-    return activities
-
-@app.post("/activities")
-async def create_activity(activity_data: ActivityCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    activity = Activity(**activity_data.dict(), owner_id=current_user.id)
-    if not activity.occurred_at:
-        activity.occurred_at = datetime.utcnow()
-    db.add(activity)
-    db.commit()
-    db.refresh(activity)
-    return activity
-
-@app.get("/activities/{activity_id}")
-async def get_activity(activity_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    activity = db.query(Activity).filter(Activity.id == activity_id, Activity.owner_id == current_user.id).first()
-    if not activity:
-        raise HTTPException(status_code=404, detail="Activity not found")
-    return activity
+async def get_activities(
+    request: Request,
+    response: Response,
+    lead_id: Optional[int] = None,
+    account_id: Optional[int] = None,
+    contact_id: Optional[int] = None,
+    q: Optional[str] = None,
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    sort_field, descending = parse_sort(sort, ["occurred_at", "created_at"], "-occurred_at")
+    queries = {}
+    for model, indexes in ((Activity, SEARCH_INDEXES), (ArchivedActivity, ARCHIVE_SEARCH_INDEXES)):
+        query = select(model).where(model.owner_id == current_user.id)
+        if lead_id:
+            query = query.where(model.lead_id == lead_id)
+        if account_id:
+            query = query.where(model.account_id == account_id)
+        if contact_id:
+            query = query.where(model.contact_id == contact_id)
+        if q:
+            query = query.where(fts_filter(model, "activity", q, current_user.id, indexes))
+        queries[model] = query
+    return await cached_read(
+        request, response, db, current_user.id, ("activities",),
+        lambda: paginate(
+            db, queries[Activity], Activity, response, sort_field, descending, cursor, limit,
+            parse_fields(Activity, fields), archive=(ArchivedActivity, queries[ArchivedActivity]),
+        ),
+    )
+
+@app.post("/activities", response_model=ActivityRead)
+async def create_activity(activity_data: ActivityCreate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    values = activity_data.dict()
+    return await commit_write(db, lambda session: create_record(session, Activity, values, current_user.id))
 
-@app.patch("/activities/{activity_id}")
-async def update_activity(activity_id: int, activity_data: ActivityCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    activity = db.query(Activity).filter(Activity.id == activity_id, Activity.owner_id == current_user.id).first()
-    if not activity:
+@app.get("/activities/{activity_id}", response_model=ActivityRead)
+async def get_activity(activity_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    activity = await db.scalar(select(Activity).where(Activity.id == activity_id, Activity.owner_id == current_user.id))
+    if activity:
+        return activity
+    archived = await db.scalar(
+        select(ArchivedActivity).where(ArchivedActivity.id == activity_id, ArchivedActivity.owner_id == current_user.id)
+    )
+    if not archived:
         raise HTTPException(status_code=404, detail="Activity not found")
+    return archived
+
+@app.patch("/activities/{activity_id}", response_model=ActivityRead)
+async def update_activity(activity_id: int, activity_data: ActivityCreate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    data = activity_data.dict(exclude_unset=True)
     
-    for field, value in activity_data.dict(exclude_unset=True).items():
-        setattr(activity, field, value)
+    async def work(session):
+        return await update_record(session, await get_owned(session, Activity, activity_id, current_user.id), data)
     
-    db.commit()
-    db.refresh(activity)
-    return activity
+    return await commit_write(db, work)
 
 @app.delete("/activities/{activity_id}")
-async def delete_activity(activity_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    activity = db.query(Activity).filter(Activity.id == activity_id, Activity.owner_id == current_user.id).first()
-    if not activity:
-        raise HTTPException(status_code=404, detail="Activity not found")
-    
-    db.delete(activity)
-    db.commit()
+async def delete_activity(activity_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    activity = await get_owned(db, Activity, activity_id, current_user.id)
+    await delete_record(db, activity)
+    await db.commit()
     return {"message": "Activity deleted successfully"}
 
+# Activity archive
+# Activities that occurred more than ARCHIVE_AFTER_DAYS ago, except those on open
+# leads, are moved in batches into `activity_archive` (bodies compressed), so the
+# hot table, its indexes and its search index only hold recent history. Archived
+# rows keep their ids and are merged back into the activity list, the lead
+# timeline and search; POST /activities/{id}/restore and `manage.py
+# restore-activities` move them back. Archiving isn't a change for delta sync:
+# clients keep what they have, and restored rows get a new change sequence.
+def archive_cutoff(now: Optional[datetime] = None) -> Optional[datetime]:
+    if ARCHIVE_AFTER_DAYS <= 0:
+        return None
+    return (now or datetime.utcnow()) - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+def archive_candidates(owner_id: int, cutoff: datetime, after=None):
+    """The owner's activities that occurred before `cutoff` and may be archived, oldest first."""
+    open_lead = select(Lead.id).where(Lead.id == Activity.lead_id, Lead.status == "open").exists()
+    query = select(*Activity.__table__.columns).where(
+        Activity.owner_id == owner_id, Activity.occurred_at < cutoff, ~open_lead,
+    )
+    if after:
+        query = query.where(keyset_filter(Activity.occurred_at, Activity.id, False, *after))
+    return query.order_by(Activity.occurred_at, Activity.id)
+
+def archive_activities(conn, owner_id: int, cutoff: datetime, after=None, limit: int = ARCHIVE_BATCH_SIZE):
+    """Move one batch of candidates into the archive; returns (rows moved, position to continue after)."""
+    rows = conn.execute(archive_candidates(owner_id, cutoff, after).limit(limit)).all()
+    if not rows:
+        return 0, None
+    archived_at = datetime.utcnow()
+    conn.execute(ArchivedActivity.__table__.insert(), [{**row._mapping, "archived_at": archived_at} for row in rows])
+    conn.execute(ARCHIVE_INDEX_INSERT, [row._asdict() for row in rows])
+    conn.execute(Activity.__table__.delete().where(Activity.id.in_([row.id for row in rows])))
+    conn.execute(*version_bump(owner_id, ("activities",)))
+    return len(rows), (rows[-1].occurred_at, rows[-1].id)
+
+def restore_activities(conn, condition, limit: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move up to `limit` archived activities matching `condition` back; returns how many moved."""
+    # Rows whose id is taken in the hot table (reused before migration 14) stay archived
+    taken = select(Activity.id).where(Activity.id == ArchivedActivity.id).exists()
+    rows = conn.execute(
+        select(*ArchivedActivity.__table__.columns).where(condition, ~taken).order_by(ArchivedActivity.id).limit(limit)
+    ).all()
+    if not rows:
+        return 0
+    first = conn.scalar(change_seq_reservation(len(rows))) - len(rows) + 1
+    names = [column.name for column in Activity.__table__.columns if column.name != "change_seq"]
+    conn.execute(Activity.__table__.insert(), [
+        {**{name: getattr(row, name) for name in names}, "change_seq": first + n} for n, row in enumerate(rows)
+    ])
+    conn.execute(ARCHIVE_INDEX_DELETE, [
+        {"id": row.id, "subject": row.subject, "body": row.body, "owner_id": row.owner_id} for row in rows
+    ])
+    conn.execute(ArchivedActivity.__table__.delete().where(ArchivedActivity.id.in_([row.id for row in rows])))
+    for owner_id in {row.owner_id for row in rows if row.owner_id is not None}:
+        conn.execute(*version_bump(owner_id, ("activities",)))
+    return len(rows)
+
+def merge_activity_search_indexes(bind):
+    for index in (SEARCH_INDEXES["activity"], ARCHIVE_SEARCH_INDEXES["activity"]):
+        merge_search_index(bind, index.fts)
+
+def archive_old_activities(bind, cutoff: datetime) -> int:
+    """Archive every owner's candidates, one transaction per batch so writers are never blocked for long."""
+    with bind.connect() as conn:
+        owner_ids = conn.scalars(select(User.id).order_by(User.id)).all()
+    moved = 0
+    for owner_id in owner_ids:
+        after = None
+        while True:
+            with bind.begin() as conn:
+                count, after = archive_activities(conn, owner_id, cutoff, after)
+            moved += count
+            if count < ARCHIVE_BATCH_SIZE:
+                break
+    if moved:
+        merge_activity_search_indexes(bind)
+    return moved
+
+def restore_archived_activities(bind, condition) -> int:
+    restored = 0
+    while True:
+        with bind.begin() as conn:
+            count = restore_activities(conn, condition)
+        restored += count
+        if count < ARCHIVE_BATCH_SIZE:
+            break
+    if restored:
+        merge_activity_search_indexes(bind)
+    return restored
+
+def merge_key(value, row_id: int):
+    # SQLite's order: NULLs before every value ascending, after them descending
+    return (value is not None, value if value is not None else 0, row_id)
+
+async def with_archived_rows(db: AsyncSession, model, query, rows, sort: str, descending: bool, after,
+                             count: int, selected: List[str]):
+    """Merge the archive's rows into one keyset page of hot `rows`.
+
+    Only (sort value, id) pairs are read from the archive first; they come from
+    its indexes without touching the compressed rows, and the full rows are only
+    loaded for archived entries that make the page. On pages that stay within
+    the horizon nothing but that short index probe is paid.
+    """
+    column = getattr(model, sort)
+    if after:
+        query = query.where(keyset_filter(column, model.id, descending, *after))
+    order = (column.desc(), model.id.desc()) if descending else (column.asc(), model.id.asc())
+    keys = (await db.execute(query.with_only_columns(model.id, column).order_by(*order).limit(count))).all()
+    if not keys:
+        return rows
+
+    entries = [(merge_key(getattr(row, sort), row.id), row) for row in rows]
+    entries += [(merge_key(value, row_id), None) for row_id, value in keys]
+    entries = sorted(entries, key=lambda entry: entry[0], reverse=descending)[:count]
+    archived_ids = [key[2] for key, row in entries if row is None]
+    if not archived_ids:
+        return rows
+    archived = await db.execute(
+        select(*[getattr(model, name) for name in selected]).where(model.id.in_(archived_ids))
+    )
+    by_id = {row.id: row for row in archived}
+    return [row if row is not None else by_id[key[2]] for key, row in entries]
+
+@app.post("/activities/{activity_id}/restore", response_model=ActivityRead)
+async def restore_activity(activity_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Move an archived activity back into the activities table, e.g. before editing it.
+
+    Restoring an activity that isn't archived just returns it. A restored activity
+    past the horizon is archived again by the next run unless its lead is open.
+    An archived activity whose id was reused by a hot one (databases archived
+    before migration 14) can't be restored and gets 409.
+    """
+    condition = and_(ArchivedActivity.id == activity_id, ArchivedActivity.owner_id == current_user.id)
+    if await db.run_sync(lambda session: restore_activities(session.connection(), condition)):
+        await db.commit()
+    elif await db.scalar(select(ArchivedActivity.id).where(condition)):
+        raise HTTPException(status_code=409, detail=f"Activity {activity_id} conflicts with a newer activity with the same id")
+    return await get_owned(db, Activity, activity_id, current_user.id)
+
+async def run_activity_archival():
+    while True:
+        now = datetime.utcnow()
+        next_run = now.replace(hour=ARCHIVE_HOUR_UTC, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        await asyncio.sleep((next_run - now).total_seconds())
+        try:
+            moved = await run_in_threadpool(archive_old_activities, engine, archive_cutoff())
+            scheduler_log.info("archived %d activities", moved)
+        except Exception:
+            scheduler_log.exception("activity archival failed")
+
 # Tasks endpoints
 @app.get("/tasks")
-async def get_tasks(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    tasks = db.query(Task).filter(Task.owner_id == current_user.id).order_by(Task.due_at).all()
-    return tasks
-
-@app.post("/tasks")
-async def create_task(task_data: TaskCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    task = Task(**task_data.dict(), owner_id=current_user.id)
-    db.add(task)
-    db.commit()
-    db.refresh(task)
-    return task
-
-@app.get("/tasks/{task_id}")
-async def get_task(task_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    task = db.query(Task).filter(Task.id == task_id, Task.owner_id == current_user.id).first()
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    return task
-
-@app.patch("/tasks/{task_id}")
-async def update_task(task_id: int, task_data: dict, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    task = db.query(Task).filter(Task.id == task_id, Task.owner_id == current_user.id).first()
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    for field, value in task_data.items():
-        if hasattr(task, field):
-            # Convert datetime strings to Python datetime objects
-            if field == 'due_at' and isinstance(value, str) and value:
-                try:
-                    # Handle datetime-local format from frontend (YYYY-MM-DDTHH:MM)
-                    if len(value) == 16 and 'T' in value:
-                        value = datetime.strptime(value, '%Y-%m-%dT%H:%M')
-                    else:
-                        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
-                except ValueError:
-                    raise HTTPException(status_code=400, detail=f"Invalid datetime format for {field}: {value}")
-            setattr(task, field, value)
+async def get_tasks(
+    request: Request,
+    response: Response,
+    q: Optional[str] = None,
+    status: Optional[str] = None,
+    due_before: Optional[datetime] = None,
+    linked_type: Optional[str] = None,
+    linked_id: Optional[int] = None,
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    sort_field, descending = parse_sort(sort, ["due_at", "created_at", "updated_at"], "due_at")
+    query = select(Task).where(Task.owner_id == current_user.id)
+    if status:
+        query = query.where(Task.status == status)
+    if due_before:
+        query = query.where(Task.due_at < due_before)
+    if linked_type:
+        query = query.where(Task.linked_type == linked_type)
+    if linked_id:
+        query = query.where(Task.linked_id == linked_id)
+    if q:
+        query = query.where(search_filter(q, Task.title))
+    return await cached_read(
+        request, response, db, current_user.id, ("tasks",),
+        lambda: paginate(db, query, Task, response, sort_field, descending, cursor, limit, parse_fields(Task, fields)),
+    )
+
+@app.post("/tasks", response_model=TaskRead)
+async def create_task(task_data: TaskCreate, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    values = task_data.dict()
+    return await commit_write(db, lambda session: create_record(session, Task, values, current_user.id))
+
+@app.get("/tasks/{task_id}", response_model=TaskRead)
+async def get_task(task_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    return await get_owned(db, Task, task_id, current_user.id)
+
+@app.patch("/tasks/{task_id}", response_model=TaskRead)
+async def update_task(task_id: int, task_data: dict, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    async def work(session):
+        return await update_record(session, await get_owned(session, Task, task_id, current_user.id), task_data)
     
-    task.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(task)
-    return task
+    return await commit_write(db, work)
 
 @app.delete("/tasks/{task_id}")
-async def delete_task(task_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    task = db.query(Task).filter(Task.id == task_id, Task.owner_id == current_user.id).first()
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    db.delete(task)
-    db.commit()
+async def delete_task(task_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    task = await get_owned(db, Task, task_id, current_user.id)
+    await delete_record(db, task)
+    await db.commit()
     return {"message": "Task deleted successfully"}
 
+# Delta sync
+# Every write stamps the record with the next change sequence number, and
+# deletions (or reassignments to another owner) leave a tombstone with one, so
+# GET /sync/changes can return everything an owner's client hasn't seen from
+# one index range scan per table. Tombstones older than SYNC_TOMBSTONE_DAYS are
+# pruned by `manage.py prune-tombstones`; clients with an older cursor resync.
+def prune_tombstones(conn, before: datetime) -> int:
+    """Delete tombstones from before `before` and return how many were removed."""
+    newest = conn.scalar(select(func.max(Tombstone.change_seq)).where(Tombstone.deleted_at < before))
+    if newest is None:
+        return 0
+    conn.execute(
+        update(ChangeSequence).where(ChangeSequence.id == 1, ChangeSequence.pruned_through < newest)
+        .values(pruned_through=newest)
+    )
+    return conn.execute(Tombstone.__table__.delete().where(Tombstone.change_seq <= newest)).rowcount
+
+async def sync_page(db: AsyncSession, owner_id: int, since: int, limit: int) -> dict:
+    # The first `limit` changes overall are among the first `limit + 1` of each source
+    entries = []
+    for entity, spec in ENTITIES.items():
+        model = spec.model
+        names = list(READ_SCHEMAS[model].model_fields)
+        rows = await db.execute(
+            select(model.change_seq, *[getattr(model, name) for name in names])
+            .where(model.owner_id == owner_id, model.change_seq > since)
+            .order_by(model.change_seq).limit(limit + 1)
+        )
+        entries += [(row[0], entity, dict(zip(names, row[1:]))) for row in rows]
+    rows = await db.execute(
+        select(Tombstone.change_seq, Tombstone.entity, Tombstone.record_id)
+        .where(Tombstone.owner_id == owner_id, Tombstone.change_seq > since)
+        .order_by(Tombstone.change_seq).limit(limit + 1)
+    )
+    entries += rows.all()
+    entries.sort(key=lambda entry: entry[0])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    changes, deleted = {}, {}
+    for _, entity, item in entries:
+        if isinstance(item, dict):
+            changes.setdefault(entity, []).append(item)
+    present = {(entity, row["id"]) for entity, rows in changes.items() for row in rows}
+    for _, entity, item in entries:
+        # A record id that was deleted and then reused (or moved back) is an upsert
+        if not isinstance(item, dict) and (entity, item) not in present:
+            deleted.setdefault(entity, []).append(item)
+    return {
+        "cursor": entries[-1][0] if entries else since,
+        "has_more": has_more,
+        "changes": changes,
+        "deleted": deleted,
+    }
+
+@app.get("/sync/changes")
+async def sync_changes(
+    request: Request,
+    response: Response,
+    since: int = Query(0, ge=0),
+    limit: int = Query(SYNC_PAGE_SIZE, ge=1, le=MAX_SYNC_PAGE_SIZE),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Records created, updated or deleted since the `since` cursor, oldest change first.
+
+    `changes` holds the current rows by entity and `deleted` the ids to drop;
+    apply deletions before upserts. Pass the returned `cursor` as `since` for
+    the next page while `has_more` is true, and later to pick up new changes.
+    A cursor older than the pruned tombstones returns 410: resync from 0.
+    """
+    if since:
+        pruned = await db.scalar(select(ChangeSequence.pruned_through).where(ChangeSequence.id == 1))
+        if since < (pruned or 0):
+            raise HTTPException(status_code=410, detail="Cursor has expired; resync from since=0")
+    tables = [spec.model.__tablename__ for spec in ENTITIES.values()]
+    return await cached_read(
+        request, response, db, current_user.id, tables,
+        lambda: sync_page(db, current_user.id, since, limit),
+    )
+
+# Change events
+# Committed writes to the CRM entities publish compact notices (entity, op, id
+# and changed fields) to the owner's open GET /events streams. Each stream has a
+# bounded queue: a consumer that falls EVENT_QUEUE_SIZE notices behind is
+# disconnected and resumes from the per-owner backlog via Last-Event-ID when its
+# EventSource reconnects. One timer sends heartbeats to every stream, so an idle
+# connection costs a queue and a suspended generator. Notices are in-process:
+# streams only see writes made by the worker they are connected to.
+EVENT_QUEUE_SIZE = 100
+EVENT_BACKLOG = 1000  # notices kept per owner for Last-Event-ID resume
+EVENT_HEARTBEAT_SECONDS = 15
+HEARTBEAT = (0, "heartbeat", "")
+
+class Subscription:
+    __slots__ = ("owner_id", "queue", "overflowed")
+
+    def __init__(self, owner_id: int, size: int):
+        self.owner_id = owner_id
+        self.queue = asyncio.Queue(maxsize=size)
+        self.overflowed = False
+
+    def offer(self, message) -> bool:
+        if self.overflowed:
+            return False
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            if message is not HEARTBEAT:
+                self.overflowed = True
+            return False
+        return True
+
+class EventBus:
+    """Per-owner fan-out of (sequence, event, JSON data) messages with a replay backlog.
+
+    Event ids are "<epoch>.<sequence>"; the epoch changes on every restart, so an id
+    from a previous process (or one older than the backlog) asks the client to reload.
+    """
+
+    def __init__(self, queue_size: int, backlog: int):
+        self.queue_size = queue_size
+        self.backlog = backlog
+        self.epoch = format(int(time.time()), "x")
+        self.dropped = 0
+        self.sequence = 0
+        self._backlogs = {}  # owner id -> deque of messages
+        self._evicted = {}  # owner id -> highest sequence no longer in the backlog
+        self._subscribers = {}  # owner id -> set of Subscription
+
+    def event_id(self, sequence: int) -> str:
+        return f"{self.epoch}.{sequence}"
+
+    def publish(self, owner_id: int, event: str, payload):
+        self.sequence += 1
+        message = (self.sequence, event, render_json(payload).decode("utf-8"))
+        backlog = self._backlogs.setdefault(owner_id, deque(maxlen=self.backlog))
+        if len(backlog) == backlog.maxlen:
+            self._evicted[owner_id] = backlog[0][0]
+        backlog.append(message)
+        for subscription in self._subscribers.get(owner_id, ()):
+            if not subscription.overflowed and not subscription.offer(message):
+                self.dropped += 1
+
+    def heartbeat(self):
+        for subscriptions in self._subscribers.values():
+            for subscription in subscriptions:
+                subscription.offer(HEARTBEAT)
+
+    def subscribe(self, owner_id: int) -> Subscription:
+        subscription = Subscription(owner_id, self.queue_size)
+        self._subscribers.setdefault(owner_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscribers.get(subscription.owner_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.owner_id]
+
+    def replay(self, owner_id: int, last_event_id: str):
+        """Messages after `last_event_id`, or None when they can no longer all be replayed."""
+        epoch, _, sequence = last_event_id.partition(".")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        after = int(sequence)
+        if after < self._evicted.get(owner_id, 0):
+            return None
+        return [message for message in self._backlogs.get(owner_id, ()) if message[0] > after]
+
+    def stats(self) -> dict:
+        return {"streams": sum(len(s) for s in self._subscribers.values()), "dropped": self.dropped}
+
+event_bus = EventBus(EVENT_QUEUE_SIZE, EVENT_BACKLOG)
+
+def queue_change_notice(session: Session, owner_id: Optional[int], notice: dict):
+    """Publish `notice` to the owner's streams once the session commits."""
+    if owner_id is not None:
+        session.info.setdefault("change_notices", []).append((owner_id, notice))
+
+@event.listens_for(Session, "after_flush")
+def _collect_change_notices(session, flush_context):
+    for records, op in ((session.new, "created"), (session.dirty, "updated"), (session.deleted, "deleted")):
+        for record in records:
+            spec = ENTITY_BY_MODEL.get(type(record))
+            if spec is None:
+                continue
+            notice = {"entity": record.__tablename__, "op": op, "id": record.id}
+            owners = {record.owner_id}
+            if op == "updated":
+                state = inspect(record)
+                changed = [attr.key for attr in state.mapper.column_attrs if state.attrs[attr.key].history.has_changes()]
+                changed = [name for name in changed if name not in ("updated_at", "change_seq")]
+                if not changed:
+                    continue
+                notice["fields"] = changed
+                # A reassigned record is announced to its previous owner too
+                owners.update(state.attrs.owner_id.history.deleted or ())
+            for owner_id in owners:
+                queue_change_notice(session, owner_id, notice)
+
+@event.listens_for(Session, "after_commit")
+def _publish_change_notices(session):
+    for owner_id, notice in session.info.pop("change_notices", ()):
+        event_bus.publish(owner_id, "change", notice)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_change_notices(session):
+    session.info.pop("change_notices", None)
+
+def sse_message(message) -> str:
+    sequence, event_name, data = message
+    return f"id: {event_bus.event_id(sequence)}\nevent: {event_name}\ndata: {data}\n\n"
+
+async def event_stream(subscription: Subscription, backlog: Optional[list]):
+    try:
+        yield "retry: 3000\n: connected\n\n"
+        last = 0
+        if backlog is None:
+            # The client's position can't be replayed; it should reload what it shows
+            yield sse_message((event_bus.sequence, "reset", "{}"))
+        else:
+            for message in backlog:
+                last = message[0]
+                yield sse_message(message)
+        while True:
+            message = await subscription.queue.get()
+            if message is HEARTBEAT:
+                yield ": heartbeat\n\n"
+            elif message[0] > last:
+                last = message[0]
+                yield sse_message(message)
+            if subscription.overflowed and subscription.queue.empty():
+                # Too far behind: end the stream so the client resumes from the backlog
+                return
+    finally:
+        event_bus.unsubscribe(subscription)
+
+@app.get("/events")
+async def stream_events(request: Request, access_token: Optional[str] = None):
+    """Server-sent change notices for the user's records.
+
+    EventSource can't send headers, so the token may be passed as `access_token`.
+    Reconnects resume after the Last-Event-ID header (or `last_event_id`), or get
+    a `reset` event when that position is no longer in the backlog.
+    """
+    token = access_token
+    scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and credentials:
+        token = credentials
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    # A short-lived session, so open streams don't hold pooled connections
+    async with AsyncReadSessionLocal() as db:
+        principal = await resolve_principal(token, db)
+
+    subscription = event_bus.subscribe(principal.id)
+    last_event_id = request.headers.get("last-event-id") or request.query_params.get("last_event_id")
+    backlog = event_bus.replay(principal.id, last_event_id) if last_event_id else []
+    return StreamingResponse(
+        event_stream(subscription, backlog),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def send_heartbeats():
+    while True:
+        await asyncio.sleep(EVENT_HEARTBEAT_SECONDS)
+        event_bus.heartbeat()
+
+# Reminders
+# Due tasks fire an in-app reminder at their due time. The scheduler keeps a
+# min-heap of the open tasks due within the next REMINDER_HORIZON, loaded by one
+# range scan of ix_tasks_status_due and rescanned every REMINDER_RESCAN so tasks
+# due later (or written by other workers) join the heap as their time nears.
+# This process's task writes update it directly once committed.
+REMINDER_HORIZON = timedelta(hours=1)
+REMINDER_RESCAN = timedelta(minutes=1)
+REMINDERS_KEPT = 50  # fired reminders kept per owner for GET /reminders
+
+scheduler_log = logging.getLogger("trailtrack.scheduler")
+reminder_inbox = {}  # owner id -> deque of fired reminders, oldest first
+
+def record_reminder(task: Task):
+    reminder = {
+        "task_id": task.id, "title": task.title, "due_at": task.due_at, "priority": task.priority,
+        "linked_type": task.linked_type, "linked_id": task.linked_id, "fired_at": datetime.utcnow(),
+    }
+    reminder_inbox.setdefault(task.owner_id, deque(maxlen=REMINDERS_KEPT)).append(reminder)
+    event_bus.publish(task.owner_id, "reminder", reminder)
+
+class ReminderScheduler:
+    """Min-heap of (due_at, task id) for open tasks, fired as they come due.
+
+    `_due` maps each scheduled task to its current due time; heap entries that no
+    longer match it (the task moved, closed or was deleted) are skipped when they
+    surface instead of being searched for. Due tasks are re-read before firing.
+    """
+
+    def __init__(self, horizon: timedelta, rescan: timedelta, on_fire):
+        self.horizon = horizon
+        self.rescan = rescan
+        self.on_fire = on_fire
+        self.fired = 0
+        self._heap = []
+        self._due = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._heap, self._due = [], {}
+
+    def schedule(self, task_id: int, due_at: Optional[datetime], status: Optional[str]):
+        """Apply a task's committed state (None, None once it's deleted)."""
+        if self._task is None:
+            return
+        now = datetime.utcnow()
+        if status != "open" or due_at is None or not now < due_at <= now + self.horizon:
+            self._due.pop(task_id, None)
+            return
+        if self._due.get(task_id) != due_at:
+            self._push(task_id, due_at)
+
+    def _push(self, task_id: int, due_at: datetime):
+        self._due[task_id] = due_at
+        heapq.heappush(self._heap, (due_at, task_id))
+        if self._heap[0] == (due_at, task_id):
+            self._wakeup.set()
+
+    async def _load(self, now: datetime):
+        query = select(Task.id, Task.due_at).where(
+            Task.status == "open", Task.due_at > now, Task.due_at <= now + self.horizon,
+        )
+        async with AsyncReadSessionLocal() as db:
+            rows = (await db.execute(query)).all()
+        for task_id, due_at in rows:
+            # A task already scheduled holds its latest committed due time
+            if task_id not in self._due:
+                self._push(task_id, due_at)
+
+    async def _fire(self, task_ids: List[int]):
+        async with AsyncReadSessionLocal() as db:
+            tasks = (await db.scalars(select(Task).where(Task.id.in_(task_ids), Task.status == "open"))).all()
+        now = datetime.utcnow()
+        for task in tasks:
+            if task.due_at is None:
+                continue
+            if task.due_at > now:
+                # Moved later by another worker
+                self.schedule(task.id, task.due_at, task.status)
+                continue
+            self.fired += 1
+            self.on_fire(task)
+
+    async def _run(self):
+        next_scan = datetime.min
+        while True:
+            try:
+                now = datetime.utcnow()
+                if now >= next_scan:
+                    await self._load(now)
+                    next_scan = now + self.rescan
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due_at, task_id = heapq.heappop(self._heap)
+                    if self._due.get(task_id) == due_at:
+                        del self._due[task_id]
+                        due.append(task_id)
+                if due:
+                    await self._fire(due)
+            except Exception:
+                scheduler_log.exception("reminder scheduler iteration failed")
+            self._wakeup.clear()
+            wake_at = min(self._heap[0][0], next_scan) if self._heap else next_scan
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max((wake_at - datetime.utcnow()).total_seconds(), 0))
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        return {"scheduled": len(self._due), "heap": len(self._heap), "fired": self.fired}
+
+reminder_scheduler = ReminderScheduler(REMINDER_HORIZON, REMINDER_RESCAN, record_reminder)
+
+@event.listens_for(Session, "after_flush")
+def _collect_task_changes(session, flush_context):
+    for record in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(record, Task):
+            state = (None, None) if record in session.deleted else (record.due_at, record.status)
+            session.info.setdefault("task_schedule", {})[record.id] = state
+
+@event.listens_for(Session, "after_commit")
+def _schedule_committed_tasks(session):
+    # The write is already committed, so a scheduling problem must not fail the request
+    for task_id, (due_at, status) in session.info.pop("task_schedule", {}).items():
+        try:
+            reminder_scheduler.schedule(task_id, due_at, status)
+        except Exception:
+            scheduler_log.exception("could not schedule the reminder for task %s", task_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_task_changes(session):
+    session.info.pop("task_schedule", None)
+
+@app.get("/reminders")
+async def get_reminders(current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """The overdue-task badge count and the reminders fired for the user, newest first."""
+    overdue = await db.scalar(
+        select(func.count()).select_from(Task)
+        .where(Task.owner_id == current_user.id, Task.status == "open", Task.due_at < datetime.utcnow())
+    )
+    return {"overdue": overdue, "reminders": list(reversed(reminder_inbox.get(current_user.id, ())))}
+
+# Daily digest
+# Once a day (at DIGEST_HOUR_UTC) every user with open tasks due that day or
+# overdue gets one email. All recipients come from a single grouped range scan
+# of ix_tasks_status_due and are sent over one SMTP connection.
+DIGEST_TITLES = 20  # tasks listed by name per digest
+
+def digest_query(day: date):
+    start = datetime(day.year, day.month, day.day)
+    due_today = Task.due_at >= start
+    return (
+        select(
+            User.id, User.email, User.name,
+            func.sum(case((due_today, 0), else_=1)).label("overdue"),
+            func.sum(case((due_today, 1), else_=0)).label("due_today"),
+            func.group_concat(case((due_today, Task.title)), "\n").label("titles"),
+        )
+        .join(User, User.id == Task.owner_id)
+        .where(Task.status == "open", Task.due_at < start + timedelta(days=1))
+        .group_by(User.id)
+    )
+
+def digest_message(row, day: date) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = SMTP_FROM
+    message["To"] = row.email
+    message["Subject"] = f"TrailTrack: {row.due_today} task(s) due today, {row.overdue} overdue"
+    titles = row.titles.split("\n") if row.titles else []
+    lines = [f"Hi {row.name or row.email},", "", f"Your tasks for {day.isoformat()}:"]
+    lines += [f"  - {title}" for title in titles[:DIGEST_TITLES]] or ["  (nothing due today)"]
+    if len(titles) > DIGEST_TITLES:
+        lines.append(f"  ...and {len(titles) - DIGEST_TITLES} more")
+    if row.overdue:
+        lines += ["", f"{row.overdue} open task(s) are overdue."]
+    message.set_content("\n".join(lines) + "\n")
+    return message
+
+class SMTPSender:
+    """Delivers messages over one SMTP connection (STARTTLS, then login when configured)."""
+
+    def __init__(self, host: str, port: int, username: Optional[str], password: Optional[str]):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+
+    def send(self, messages: List[EmailMessage]):
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            for message in messages:
+                try:
+                    smtp.send_message(message)
+                except smtplib.SMTPRecipientsRefused:
+                    scheduler_log.warning("digest to %s was refused", message["To"])
+
+class LogSender:
+    """Logs messages instead of sending them; used when SMTP_SERVER is unset."""
+
+    def send(self, messages: List[EmailMessage]):
+        for message in messages:
+            scheduler_log.info("digest for %s not sent (no SMTP_SERVER): %s", message["To"], message["Subject"])
+
+class StubSender(LogSender):
+    """Also keeps the messages in `outbox`, for tests and benchmarks to inspect (install it as `mail_sender`)."""
+
+    def __init__(self):
+        self.outbox = []
+
+    def send(self, messages: List[EmailMessage]):
+        self.outbox.extend(messages)
+        super().send(messages)
+
+mail_sender = SMTPSender(SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD) if SMTP_SERVER else LogSender()
+
+def deliver_digests(rows, day: date) -> int:
+    messages = [digest_message(row, day) for row in rows]
+    if messages:
+        mail_sender.send(messages)
+    return len(messages)
+
+async def send_daily_digests(day: date) -> int:
+    async with AsyncReadSessionLocal() as db:
+        rows = (await db.execute(digest_query(day))).all()
+    return await run_in_threadpool(deliver_digests, rows, day)
+
+async def run_daily_digests():
+    while True:
+        now = datetime.utcnow()
+        next_run = now.replace(hour=DIGEST_HOUR_UTC, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        await asyncio.sleep((next_run - now).total_seconds())
+        try:
+            sent = await send_daily_digests(next_run.date())
+            scheduler_log.info("sent %d daily digest(s)", sent)
+        except Exception:
+            scheduler_log.exception("daily digest run failed")
+
+background_jobs = []
+
+@app.on_event("startup")
+async def start_background_jobs():
+    background_jobs.append(asyncio.create_task(send_heartbeats()))
+    if GROUP_COMMIT:
+        group_writer.start()
+    if SCHEDULER_ENABLED:
+        reminder_scheduler.start()
+        background_jobs.append(asyncio.create_task(run_daily_digests()))
+        if ARCHIVE_AFTER_DAYS > 0:
+            background_jobs.append(asyncio.create_task(run_activity_archival()))
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    await group_writer.stop()
+    await reminder_scheduler.stop()
+    for job in background_jobs:
+        job.cancel()
+    await asyncio.gather(*background_jobs, return_exceptions=True)
+    background_jobs.clear()
+
+# Attachments
+# Uploads are parsed straight off the request stream and written to a temp file
+# while they are hashed, then moved to blobs/<sha256> unless that content is
+# already stored. Blob files are reference counted across attachments.
+ATTACHMENT_LINKS = {"lead": Lead, "account": Account, "contact": Contact, "activity": Activity}
+
+class UploadSink:
+    """Temp file under UPLOAD_DIR that hashes and size-checks what is written to it."""
+    
+    def __init__(self):
+        directory = os.path.join(UPLOAD_DIR, "tmp")
+        os.makedirs(directory, exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(dir=directory, delete=False)
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+    
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"File exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+        self.sha256.update(data)
+        self.file.write(data)
+    
+    def close(self):
+        self.file.close()
+    
+    def discard(self):
+        self.file.close()
+        try:
+            os.unlink(self.file.name)
+        except FileNotFoundError:
+            pass
+
+async def receive_upload(request: Request):
+    """Stream the `file` part of a multipart body into an UploadSink.
+
+    Returns (filename, content type, sink); other form parts are ignored.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+    
+    # The parser's callbacks only queue events; they are handled after each chunk
+    events = []
+    header = {"field": b"", "value": b""}
+    headers = {}
+    
+    def on_header_field(data, start, end):
+        header["field"] += data[start:end]
+    
+    def on_header_value(data, start, end):
+        header["value"] += data[start:end]
+    
+    def on_header_end():
+        headers[header["field"].decode("latin-1").lower()] = header["value"]
+        header["field"], header["value"] = b"", b""
+    
+    callbacks = {
+        "on_part_begin": lambda: headers.clear(),
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": lambda: events.append(("part", dict(headers))),
+        "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+        "on_part_end": lambda: events.append(("end", None)),
+    }
+    parser = MultipartParser(params[b"boundary"], callbacks)
+    
+    sink, filename, mime_type, writing, done = None, None, None, False, False
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for kind, value in events:
+                if kind == "part":
+                    _, options = parse_options_header(value.get("content-disposition", b""))
+                    writing = options.get(b"name") == b"file" and not done
+                    if writing:
+                        filename = os.path.basename(options.get(b"filename", b"").decode("utf-8", "replace")) or "upload"
+                        mime_type = value.get("content-type", b"").decode("latin-1") or None
+                        sink = await run_in_threadpool(UploadSink)
+                elif kind == "data" and writing:
+                    await run_in_threadpool(sink.write, value)
+                elif kind == "end" and writing:
+                    writing, done = False, True
+            events.clear()
+        parser.finalize()
+        if not done:
+            raise HTTPException(status_code=400, detail="Missing file part")
+        await run_in_threadpool(sink.close)
+    except BaseException:
+        if sink is not None:
+            await run_in_threadpool(sink.discard)
+        raise
+    return filename, mime_type, sink
+
+def blob_path(sha256: str) -> str:
+    return os.path.join("blobs", sha256[:2], sha256[2:4], sha256)
+
+def place_blob(temp_path: str, path: str):
+    full_path = os.path.join(UPLOAD_DIR, path)
+    if os.path.exists(full_path):
+        os.unlink(temp_path)
+    else:
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        os.replace(temp_path, full_path)
+
+class RangeFileResponse(FileResponse):
+    """FileResponse for a whole file or a single byte range of it.
+
+    The body goes out through the ASGI zero-copy extension (sendfile) when the
+    server offers it, otherwise in chunk_size reads, never as one buffer.
+    """
+    
+    def __init__(self, path: str, stat_result: os.stat_result, byte_range=None, **kwargs):
+        super().__init__(path, stat_result=stat_result, **kwargs)
+        self.headers["accept-ranges"] = "bytes"
+        self.start, self.end = byte_range or (0, stat_result.st_size - 1)
+        if byte_range:
+            self.status_code = 206
+            self.headers["content-range"] = f"bytes {self.start}-{self.end}/{stat_result.st_size}"
+            self.headers["content-length"] = str(self.end - self.start + 1)
+    
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        count = self.end - self.start + 1
+        if self.send_header_only or count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopy" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopy", "file": file,
+                    "offset": self.start, "count": count, "more_body": False,
+                })
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.start)
+                remaining = count
+                while remaining:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    remaining = remaining - len(chunk) if chunk else 0
+                    await send({"type": "http.response.body", "body": chunk, "more_body": bool(remaining)})
+        if self.background is not None:
+            await self.background()
+
+def parse_byte_range(header: Optional[str], size: int):
+    """(start, end) for a single `bytes=` range, None to send the whole file."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        # Multi-range requests may be answered with the full representation
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start, end = int(first), int(last) if last else size - 1
+        else:
+            start, end = size - int(last), size - 1
+    except ValueError:
+        return None
+    start, end = max(start, 0), min(end, size - 1)
+    if start > end:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+@app.get("/attachments")
+async def get_attachments(
+    request: Request,
+    response: Response,
+    linked_type: Optional[str] = None,
+    linked_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    query = select(Attachment).where(Attachment.owner_id == current_user.id)
+    if linked_type:
+        query = query.where(Attachment.linked_type == linked_type)
+    if linked_id:
+        query = query.where(Attachment.linked_id == linked_id)
+    return await cached_read(
+        request, response, db, current_user.id, ("attachments",),
+        lambda: paginate(db, query, Attachment, response, "id", True, cursor, limit, None),
+    )
+
+@app.post("/attachments/upload", response_model=AttachmentRead)
+async def upload_attachment(
+    request: Request,
+    linked_type: str,
+    linked_id: int,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Attach a file (multipart field `file`) to a lead, account, contact or activity."""
+    model = ATTACHMENT_LINKS.get(linked_type)
+    if model is None:
+        raise HTTPException(status_code=400, detail=f"linked_type must be one of: {', '.join(ATTACHMENT_LINKS)}")
+    await get_owned(db, model, linked_id, current_user.id)
+    if int(request.headers.get("content-length") or 0) > MAX_UPLOAD_BYTES + 64 * 1024:
+        raise HTTPException(status_code=413, detail=f"File exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    # End the read transaction so the upload doesn't hold a snapshot while streaming
+    await db.rollback()
+    
+    filename, mime_type, sink = await receive_upload(request)
+    checksum = sink.sha256.hexdigest()
+    path = blob_path(checksum)
+    try:
+        statement = sqlite_insert(AttachmentBlob).values(sha256=checksum, size_bytes=sink.size, ref_count=1)
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=[AttachmentBlob.sha256],
+            set_={"ref_count": AttachmentBlob.ref_count + 1},
+        ))
+        # The upsert holds SQLite's write lock until commit, so a delete can't drop
+        # this blob between the ref count bump and the file landing in place
+        await run_in_threadpool(place_blob, sink.file.name, path)
+        attachment = Attachment(
+            linked_type=linked_type, linked_id=linked_id, filename=filename, mime_type=mime_type,
+            size_bytes=sink.size, path=path, checksum=checksum, owner_id=current_user.id,
+        )
+        db.add(attachment)
+        await bump_versions(db, current_user.id, Attachment.__tablename__)
+        await db.commit()
+    finally:
+        await run_in_threadpool(sink.discard)
+    await db.refresh(attachment)
+    return attachment
+
+@app.get("/attachments/{attachment_id}/download")
+async def download_attachment(
+    attachment_id: int,
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    attachment = await get_owned(db, Attachment, attachment_id, current_user.id)
+    full_path = os.path.join(UPLOAD_DIR, attachment.path)
+    try:
+        stat_result = await run_in_threadpool(os.stat, full_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=410, detail="Attachment content is missing")
+    return RangeFileResponse(
+        full_path,
+        stat_result,
+        byte_range=parse_byte_range(request.headers.get("range"), stat_result.st_size),
+        media_type=attachment.mime_type or "application/octet-stream",
+        filename=attachment.filename,
+        method=request.method,
+        # Content-addressed, so the checksum is a strong validator for every copy
+        headers={"etag": f'"{attachment.checksum}"'},
+    )
+
+@app.delete("/attachments/{attachment_id}")
+async def delete_attachment(attachment_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    attachment = await get_owned(db, Attachment, attachment_id, current_user.id)
+    await db.delete(attachment)
+    remaining = await db.scalar(
+        update(AttachmentBlob)
+        .where(AttachmentBlob.sha256 == attachment.checksum)
+        .values(ref_count=AttachmentBlob.ref_count - 1)
+        .returning(AttachmentBlob.ref_count)
+    )
+    await bump_versions(db, current_user.id, Attachment.__tablename__)
+    trash = None
+    if remaining is not None and remaining <= 0:
+        await db.execute(AttachmentBlob.__table__.delete().where(AttachmentBlob.sha256 == attachment.checksum))
+        # Move the file aside while the write lock is held (see upload_attachment);
+        # it is only removed once the commit succeeds
+        full_path = os.path.join(UPLOAD_DIR, attachment.path)
+        trash = full_path + ".deleted"
+        try:
+            await run_in_threadpool(os.replace, full_path, trash)
+        except FileNotFoundError:
+            trash = None
+    try:
+        await db.commit()
+    except BaseException:
+        if trash:
+            await run_in_threadpool(os.replace, trash, full_path)
+        raise
+    if trash:
+        await run_in_threadpool(os.unlink, trash)
+    return {"message": "Attachment deleted successfully"}
+
+# Instrumentation
+# Latency and status per route, SQL statement count and time per request (also
+# returned in a Server-Timing header) and a log of slow statements, exported in
+# Prometheus text format on /metrics when METRICS_ENABLED is set. Recording is a
+# few dict lookups and a bisect per request or statement, cheap enough to leave on.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+slow_query_log = logging.getLogger("trailtrack.slow_query")
+
+class Histogram:
+    """Bucketed observations per label set, rendered as a Prometheus histogram."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # label values -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for labels, values in series:
+            label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {values[-1]}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+request_latency = Histogram(
+    "trailtrack_http_request_duration_seconds", "Time from request start to the end of the response.",
+    ("method", "route", "status"), LATENCY_BUCKETS,
+)
+request_queries = Histogram(
+    "trailtrack_http_request_db_queries", "SQL statements executed per request.",
+    ("method", "route"), QUERY_COUNT_BUCKETS,
+)
+request_db_time = Histogram(
+    "trailtrack_http_request_db_seconds", "Time spent executing SQL statements per request.",
+    ("method", "route"), LATENCY_BUCKETS,
+)
+
+class QueryStats:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+request_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("request_query_stats", default=None)
+slow_query_count = 0
+
+def parameter_shape(parameters, executemany: bool) -> str:
+    """Parameter types without their values, e.g. `(int, str)` or `250 x (int, str)`."""
+    def shape(params):
+        if isinstance(params, dict):
+            return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in params.items()) + "}"
+        return "(" + ", ".join(type(value).__name__ for value in params or ()) + ")"
+    if executemany:
+        return f"{len(parameters)} x {shape(parameters[0])}" if parameters else "[]"
+    return shape(parameters)
+
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    global slow_query_count
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = request_query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        slow_query_count += 1
+        slow_query_log.warning(
+            "slow query (%.1f ms): %s -- parameters %s",
+            elapsed * 1000, " ".join(statement.split()), parameter_shape(parameters, executemany),
+        )
+
+def _query_failed(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+for _engine in (engine, async_engine.sync_engine, async_read_engine.sync_engine):
+    event.listen(_engine, "before_cursor_execute", _query_started)
+    event.listen(_engine, "after_cursor_execute", _query_finished)
+    event.listen(_engine, "handle_error", _query_failed)
+
+_route_templates = {}
+
+def route_template(scope) -> str:
+    """The matched route's path template, so /leads/1 and /leads/2 share a series."""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    if endpoint not in _route_templates:
+        _route_templates.update({route.endpoint: route.path for route in app.routes if hasattr(route, "endpoint")})
+    return _route_templates.get(endpoint, "unmatched")
+
+class InstrumentationMiddleware:
+    """Pure ASGI middleware: times each request and counts its SQL statements."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        stats = QueryStats()
+        token = request_query_stats.set(stats)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = (
+                    f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries", '
+                    f"app;dur={(time.perf_counter() - started) * 1000:.1f}"
+                )
+                message = {**message, "headers": [*message.get("headers", ()), (b"server-timing", timing.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_query_stats.reset(token)
+            route = route_template(scope)
+            request_latency.observe((scope["method"], route, str(status)), time.perf_counter() - started)
+            request_queries.observe((scope["method"], route), stats.count)
+            request_db_time.observe((scope["method"], route), stats.seconds)
+
+app.add_middleware(InstrumentationMiddleware)
+
+def gauge_lines(name: str, help_text: str, kind: str, value) -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus scrape endpoint."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    lines = request_latency.render() + request_queries.render() + request_db_time.render()
+    lines += gauge_lines("trailtrack_slow_queries_total", f"SQL statements slower than {SLOW_QUERY_MS:g} ms.", "counter", slow_query_count)
+    for prefix, stats in [
+        ("trailtrack_principal_cache", principal_cache.stats()),
+        ("trailtrack_response_cache", response_cache.stats()),
+    ]:
+        lines += gauge_lines(f"{prefix}_entries", "Cached entries.", "gauge", stats["size"])
+        if "bytes" in stats:
+            lines += gauge_lines(f"{prefix}_bytes", "Size of the cached bodies.", "gauge", stats["bytes"])
+        for name in ("hits", "misses", "evictions"):
+            lines += gauge_lines(f"{prefix}_{name}_total", f"Cache {name}.", "counter", stats[name])
+    writer = group_writer.stats()
+    lines += gauge_lines("trailtrack_group_commits_total", "Transactions committed by the group-commit writer.", "counter", writer["groups"])
+    lines += gauge_lines("trailtrack_group_commit_writes_total", "Writes committed by the group-commit writer.", "counter", writer["writes"])
+    events = event_bus.stats()
+    lines += gauge_lines("trailtrack_event_streams", "Open GET /events streams.", "gauge", events["streams"])
+    lines += gauge_lines("trailtrack_event_streams_dropped_total", "Event streams closed for falling behind.", "counter", events["dropped"])
+    scheduler = reminder_scheduler.stats()
+    lines += gauge_lines("trailtrack_reminders_scheduled", "Open tasks waiting in the reminder heap.", "gauge", scheduler["scheduled"])
+    lines += gauge_lines("trailtrack_reminders_fired_total", "Task reminders fired.", "counter", scheduler["fired"])
+    hasher = password_hasher.stats()
+    lines += gauge_lines("trailtrack_password_hash_in_flight", "Password hashes running or queued.", "gauge", hasher["in_flight"])
+    lines += gauge_lines("trailtrack_password_hash_capacity", "Password hashes allowed to run or queue.", "gauge", hasher["capacity"])
+    lines += gauge_lines("trailtrack_password_hash_rejected_total", "Password hashes rejected with 503.", "counter", hasher["rejected"])
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     
-    # Create tables
-    Base.metadata.create_all(bind=engine)
+    # Create or upgrade the schema
+    run_migrations(engine)
     
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,258 @@
+"""Maintenance commands for the TrailTrack backend.
+
+Usage:
+    python manage.py migrate           # apply pending schema migrations
+    python manage.py rebuild-stats     # recompute every owner's dashboard rollup
+    python manage.py verify-stats      # report rollup drift; exits 1 if any is found
+    python manage.py check-plans       # EXPLAIN every hot query; exits 1 on a full table scan
+    python manage.py rebuild-search    # rebuild the full-text search indexes from their tables
+    python manage.py rebuild-reports   # recompute the reporting rollups from the leads table
+    python manage.py send-digest       # send today's task digest emails now
+    python manage.py prune-tombstones  # drop sync tombstones older than SYNC_TOMBSTONE_DAYS
+    python manage.py archive-activities  # archive activities older than ARCHIVE_AFTER_DAYS now
+    python manage.py restore-activities  # restore archived activities within the horizon (all if disabled)
+    python manage.py rebuild-duplicates  # recompute the duplicate detection blocking keys
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, or_, select
+
+from main import (
+    ARCHIVE_AFTER_DAYS, Account, Attachment, Base, Activity, ArchivedActivity, Contact, DuplicateKey, Lead,
+    OwnerStats, SessionLocal, STATS_FIELDS, SYNC_TOMBSTONE_DAYS, Task, Tombstone, User, ReportRollup,
+    archive_candidates, archive_cutoff, archive_old_activities, compute_owner_stats, deliver_digests, digest_query,
+    duplicate_blocks, engine, keyset_filter, pipeline_query, prune_tombstones, rebuild_archive_search_index,
+    rebuild_duplicate_keys, rebuild_report_rollups, rebuild_search_indexes, restore_archived_activities,
+    run_migrations, stats_aggregate, timeline_sources,
+)
+
+
+def rebuild_stats(db):
+    expected = compute_owner_stats(db)
+    db.query(OwnerStats).delete(synchronize_session=False)
+    db.add_all(OwnerStats(owner_id=owner_id, **values) for owner_id, values in expected.items())
+    db.commit()
+    print(f"Rebuilt dashboard stats for {len(expected)} owner(s)")
+    return 0
+
+
+def verify_stats(db):
+    expected = compute_owner_stats(db)
+    stored = {row.owner_id: row for row in db.query(OwnerStats)}
+    drift = 0
+    for owner_id in sorted(set(expected) | set(stored), key=lambda o: (o is None, o)):
+        row = stored.get(owner_id)
+        if row is None:
+            # Owners without a rollup row are backfilled lazily on their next dashboard load
+            continue
+        want = expected.get(owner_id, {name: 0 for name in STATS_FIELDS})
+        for name in STATS_FIELDS:
+            have = getattr(row, name) or 0
+            if have != want[name]:
+                drift += 1
+                print(f"owner {owner_id}: {name} is {have}, expected {want[name]}")
+    if drift:
+        print(f"Found {drift} drifted value(s); run `python manage.py rebuild-stats` to repair")
+        return 1
+    print(f"Dashboard stats verified for {len(stored)} owner(s)")
+    return 0
+
+
+def migrate(db):
+    applied = run_migrations(engine)
+    for description in applied:
+        print(f"Applied migration {description}")
+    if not applied:
+        print("Schema is up to date")
+    return 0
+
+
+def hot_queries():
+    """Representative statements for every per-request query path, with sample parameters."""
+    owner, when = 1, datetime(2025, 1, 1)
+    return [
+        ("principal lookup", select(User).where(User.email == "rep@example.com")),
+        ("dashboard rollup", select(OwnerStats).where(OwnerStats.owner_id == owner)),
+        ("dashboard backfill", stats_aggregate(owner)),
+        ("accounts list", select(Account).where(Account.owner_id == owner)
+            .where(keyset_filter(Account.name, Account.id, False, "Acme", 10))
+            .order_by(Account.name, Account.id).limit(101)),
+        ("contacts list", select(Contact).where(Contact.owner_id == owner)
+            .order_by(Contact.last_name, Contact.id).limit(101)),
+        ("contacts by account", select(Contact).where(Contact.owner_id == owner, Contact.account_id == 5)
+            .order_by(Contact.last_name, Contact.id).limit(101)),
+        ("leads list", select(Lead).where(Lead.owner_id == owner)
+            .where(keyset_filter(Lead.created_at, Lead.id, False, when, 10))
+            .order_by(Lead.created_at, Lead.id).limit(101)),
+        ("leads by stage", select(Lead).where(Lead.owner_id == owner, Lead.stage == "Proposal")
+            .order_by(Lead.created_at, Lead.id).limit(101)),
+        ("open leads", select(Lead).where(Lead.owner_id == owner, Lead.status == "open")),
+        ("activities list", select(Activity).where(Activity.owner_id == owner)
+            .where(keyset_filter(Activity.occurred_at, Activity.id, True, when, 10))
+            .order_by(Activity.occurred_at.desc(), Activity.id.desc()).limit(101)),
+        ("activities by lead", select(Activity).where(Activity.owner_id == owner, Activity.lead_id == 7)
+            .order_by(Activity.occurred_at.desc(), Activity.id.desc()).limit(101)),
+        ("tasks list", select(Task).where(Task.owner_id == owner)
+            .order_by(Task.due_at, Task.id).limit(101)),
+        ("open tasks due", select(Task).where(Task.owner_id == owner, Task.status == "open", Task.due_at < when)),
+        ("tasks for record", select(Task).where(Task.linked_type == "lead", Task.linked_id == 7)),
+        ("pipeline board", pipeline_query(owner)),
+        ("archived activities list", select(ArchivedActivity.id, ArchivedActivity.occurred_at)
+            .where(ArchivedActivity.owner_id == owner)
+            .where(keyset_filter(ArchivedActivity.occurred_at, ArchivedActivity.id, True, when, 10))
+            .order_by(ArchivedActivity.occurred_at.desc(), ArchivedActivity.id.desc()).limit(101)),
+        ("archived activities by created", select(ArchivedActivity.id, ArchivedActivity.created_at)
+            .where(ArchivedActivity.owner_id == owner)
+            .order_by(ArchivedActivity.created_at, ArchivedActivity.id).limit(101)),
+        *[(f"lead timeline ({model.__tablename__})", select(model).where(*filters)
+            .where(at <= when, or_(at < when, model.id < 10))
+            .order_by(at.desc(), model.id.desc()).limit(101))
+          for kind, model, at, filters in timeline_sources(7, owner)],
+        ("report rollups", select(ReportRollup).where(
+            ReportRollup.owner_id == owner, ReportRollup.kind == "leads", ReportRollup.period == "month",
+            ReportRollup.bucket >= when)),
+        ("reminder window", select(Task.id, Task.due_at).where(
+            Task.status == "open", Task.due_at > when, Task.due_at <= when + timedelta(hours=1))),
+        ("daily digest", digest_query(when.date())),
+        *[(f"sync changes ({model.__tablename__})", select(model).where(model.owner_id == owner, model.change_seq > 100)
+            .order_by(model.change_seq).limit(501))
+          for model in (Account, Contact, Lead, Activity, Task, Tombstone)],
+        ("archive candidates", archive_candidates(owner, when, (when - timedelta(days=30), 10)).limit(1000)),
+        ("duplicate candidates", select(DuplicateKey.key, DuplicateKey.record_id).where(
+            DuplicateKey.entity == "accounts", DuplicateKey.key.in_(["email:ann@acme.com", "phone:5550102030"]))),
+        ("duplicate blocks", duplicate_blocks("contacts", owner)),
+        ("duplicate keys of a record", select(DuplicateKey).where(
+            DuplicateKey.entity == "contacts", DuplicateKey.record_id == 10)),
+        *[(f"merge references ({model.__tablename__}.{column.name})", select(model.id).where(column.in_([10, 11])))
+          for model, column in ((Contact, Contact.account_id), (Lead, Lead.account_id), (Lead, Lead.primary_contact_id),
+                                (Activity, Activity.account_id), (Activity, Activity.contact_id),
+                                (ArchivedActivity, ArchivedActivity.account_id),
+                                (ArchivedActivity, ArchivedActivity.contact_id))],
+        ("merge references (attachments)", select(Attachment.id).where(
+            Attachment.linked_type == "account", Attachment.linked_id.in_([10, 11]))),
+    ]
+
+
+def explain(conn, statement):
+    def prefix(conn, cursor, sql, parameters, context, executemany):
+        return "EXPLAIN QUERY PLAN " + sql, parameters
+
+    event.listen(conn, "before_cursor_execute", prefix, retval=True)
+    try:
+        return [row[3] for row in conn.execute(statement).cursor.fetchall()]
+    finally:
+        event.remove(conn, "before_cursor_execute", prefix)
+
+
+def is_table_scan(detail):
+    # "SCAN accounts" or "SCAN accounts USING INDEX ..." walk every row of a table;
+    # SEARCH steps and scans of subquery results are fine.
+    words = detail.split()
+    return len(words) > 1 and words[0] == "SCAN" and words[1] in Base.metadata.tables
+
+
+def check_plans(db):
+    # Plans are checked against a freshly migrated scratch schema so results are deterministic
+    scratch = create_engine("sqlite://")
+    run_migrations(scratch)
+    failures = 0
+    with scratch.connect() as conn:
+        for name, statement in hot_queries():
+            details = explain(conn, statement)
+            scans = [d for d in details if is_table_scan(d)]
+            failures += bool(scans)
+            print(f"{'FAIL' if scans else 'ok  '} {name}: {'; '.join(details)}")
+    if failures:
+        print(f"{failures} hot quer{'y' if failures == 1 else 'ies'} fell back to a full table scan")
+        return 1
+    return 0
+
+
+def rebuild_search(db):
+    with engine.begin() as conn:
+        rebuild_search_indexes(conn)
+        rebuild_archive_search_index(conn)
+    print("Rebuilt full-text search indexes")
+    return 0
+
+
+def rebuild_reports(db):
+    with engine.begin() as conn:
+        rebuild_report_rollups(conn)
+    print(f"Rebuilt {db.query(ReportRollup).count()} reporting rollup rows")
+    return 0
+
+
+def send_digest(db):
+    day = datetime.utcnow().date()
+    sent = deliver_digests(db.execute(digest_query(day)).all(), day)
+    print(f"Sent {sent} digest(s) for {day.isoformat()}")
+    return 0
+
+
+def prune_sync_tombstones(db):
+    before = datetime.utcnow() - timedelta(days=SYNC_TOMBSTONE_DAYS)
+    with engine.begin() as conn:
+        pruned = prune_tombstones(conn, before)
+    print(f"Pruned {pruned} tombstone(s) older than {SYNC_TOMBSTONE_DAYS} days")
+    return 0
+
+
+def archive(db):
+    cutoff = archive_cutoff()
+    if cutoff is None:
+        print("Archiving is disabled (ARCHIVE_AFTER_DAYS=0)")
+        return 0
+    moved = archive_old_activities(engine, cutoff)
+    print(f"Archived {moved} activit{'y' if moved == 1 else 'ies'} older than {ARCHIVE_AFTER_DAYS} days")
+    return 0
+
+
+def restore(db):
+    cutoff = archive_cutoff()
+    condition = ArchivedActivity.id.is_not(None) if cutoff is None else ArchivedActivity.occurred_at >= cutoff
+    restored = restore_archived_activities(engine, condition)
+    print(f"Restored {restored} archived activit{'y' if restored == 1 else 'ies'}")
+    return 0
+
+
+def rebuild_duplicates(db):
+    with engine.begin() as conn:
+        rebuild_duplicate_keys(conn)
+    print(f"Rebuilt {db.query(DuplicateKey).count()} duplicate blocking keys")
+    return 0
+
+
+COMMANDS = {
+    "migrate": migrate,
+    "rebuild-stats": rebuild_stats,
+    "verify-stats": verify_stats,
+    "check-plans": check_plans,
+    "rebuild-search": rebuild_search,
+    "rebuild-reports": rebuild_reports,
+    "send-digest": send_digest,
+    "prune-tombstones": prune_sync_tombstones,
+    "archive-activities": archive,
+    "restore-activities": restore,
+    "rebuild-duplicates": rebuild_duplicates,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TrailTrack maintenance commands")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args(argv)
+
+    if args.command not in ("migrate", "check-plans"):
+        run_migrations(engine)
+    db = SessionLocal()
+    try:
+        return COMMANDS[args.command](db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Fixtures for the backend tests.
+
+`main` is imported once with the working directory pointed at a scratch
+database; every test registers its own user, so tests don't see each
+other's records.
+"""
+import os
+import sys
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def main(tmp_path_factory):
+    os.chdir(tmp_path_factory.mktemp("trailtrack"))
+    os.environ["SCHEDULER_ENABLED"] = "false"
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import main
+
+    main.run_migrations(main.engine)
+    return main
+
+
+@pytest.fixture
+def client(main):
+    from fastapi.testclient import TestClient
+
+    with TestClient(main.app) as client:
+        yield client
+
+
+def register(client, role=None):
+    """Register a fresh user through the API and return their auth headers."""
+    email = f"{uuid.uuid4().hex}@trailtrack.test"
+    user = {"email": email, "name": "Test User", "password": "secret", **({"role": role} if role else {})}
+    client.post("/auth/register", json=user)
+    token = client.post("/auth/login", json={"email": email, "password": "secret"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def started(main, monkeypatch):
+    """A client factory for tests that need the scheduler or group commit running."""
+    from fastapi.testclient import TestClient
+
+    def start(**settings):
+        for name, value in settings.items():
+            monkeypatch.setattr(main, name, value)
+        return TestClient(main.app)
+
+    return start
+
+
+@pytest.fixture
+def auth(client):
+    """Register a fresh user and return their auth headers."""
+    return register(client)
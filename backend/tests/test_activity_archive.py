@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+
+def create_activity(client, auth, subject, days_ago=0):
+    occurred_at = (datetime.utcnow() - timedelta(days=days_ago)).isoformat()
+    response = client.post("/activities", json={"type": "note", "subject": subject, "occurred_at": occurred_at}, headers=auth)
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def test_archived_ids_are_not_reused_after_deletes(main, client, auth):
+    archived = [create_activity(client, auth, f"old {n}", days_ago=900) for n in range(3)]
+    recent = [create_activity(client, auth, f"recent {n}") for n in range(2)]
+    main.archive_old_activities(main.engine, main.archive_cutoff())
+    with main.engine.connect() as conn:
+        moved = conn.scalars(main.select(main.ArchivedActivity.id).where(main.ArchivedActivity.id.in_(archived + recent)))
+        assert sorted(moved) == archived
+    for activity_id in recent:
+        assert client.delete(f"/activities/{activity_id}", headers=auth).status_code == 200
+
+    new_id = create_activity(client, auth, "new")
+    assert new_id > max(archived + recent)
+    assert client.get(f"/activities/{new_id}", headers=auth).json()["subject"] == "new"
+    ids = [activity["id"] for activity in client.get("/activities", headers=auth).json()]
+    assert sorted(ids) == sorted(archived + [new_id])
+
+    restored = client.post(f"/activities/{archived[0]}/restore", headers=auth)
+    assert restored.status_code == 200
+    assert restored.json()["subject"] == "old 0"
+
+
+def test_restore_conflicting_id_is_409(main, client, auth):
+    archived = create_activity(client, auth, "old", days_ago=900)
+    create_activity(client, auth, "recent")
+    main.archive_old_activities(main.engine, main.archive_cutoff())
+    # An id reused before migration 14 made activity ids AUTOINCREMENT
+    with main.engine.begin() as conn:
+        owner_id = conn.scalar(main.select(main.ArchivedActivity.owner_id).where(main.ArchivedActivity.id == archived))
+        conn.execute(main.Activity.__table__.insert().values(id=archived, subject="reused", owner_id=owner_id, change_seq=0))
+
+    assert client.post(f"/activities/{archived}/restore", headers=auth).status_code == 409
+    assert client.get(f"/activities/{archived}", headers=auth).json()["subject"] == "reused"
@@ -0,0 +1,39 @@
+import asyncio
+import time
+
+import httpx
+from sqlalchemy import event, text
+
+from conftest import register
+
+
+def test_slow_queries_do_not_block_other_requests(main, started):
+    with started() as client:
+        headers = register(client)
+
+    def add_pause(dbapi_connection, connection_record):
+        dbapi_connection.create_function("pause", 1, lambda seconds: time.sleep(seconds) or 1)
+
+    async def run():
+        await main.async_read_engine.dispose()
+        event.listen(main.async_read_engine.sync_engine, "connect", add_pause)
+        try:
+            async def slow():
+                async with main.AsyncReadSessionLocal() as db:
+                    await db.execute(text("SELECT pause(1.0)"))
+                return time.perf_counter()
+
+            slow_task = asyncio.create_task(slow())
+            await asyncio.sleep(0.1)
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                for _ in range(5):
+                    assert (await client.get("/accounts", headers=headers)).status_code == 200
+            cheap_done = time.perf_counter()
+            return cheap_done, await slow_task
+        finally:
+            event.remove(main.async_read_engine.sync_engine, "connect", add_pause)
+            await main.async_read_engine.dispose()
+
+    cheap_done, slow_done = asyncio.run(run())
+    assert cheap_done < slow_done
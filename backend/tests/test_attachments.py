@@ -0,0 +1,51 @@
+import os
+
+
+def upload(client, auth, lead, content, filename="proposal.pdf"):
+    return client.post("/attachments/upload", params={"linked_type": "lead", "linked_id": lead},
+                       files={"file": (filename, content, "application/pdf")}, headers=auth)
+
+
+def blob_refs(main, checksum):
+    with main.engine.connect() as conn:
+        return conn.scalar(main.select(main.AttachmentBlob.ref_count).where(main.AttachmentBlob.sha256 == checksum))
+
+
+def test_identical_uploads_share_one_blob_until_both_are_deleted(main, client, auth):
+    content = os.urandom(200_000)
+    first_lead, second_lead = (client.post("/leads", json={"title": t}, headers=auth).json()["id"] for t in "AB")
+    first = upload(client, auth, first_lead, content).json()
+    second = upload(client, auth, second_lead, content, "copy.pdf").json()
+    assert first["checksum"] == second["checksum"] and first["path"] == second["path"]
+    assert blob_refs(main, first["checksum"]) == 2
+    path = os.path.join(main.UPLOAD_DIR, first["path"])
+
+    client.delete(f"/attachments/{first['id']}", headers=auth)
+    assert blob_refs(main, first["checksum"]) == 1 and os.path.exists(path)
+    assert client.get(f"/attachments/{second['id']}/download", headers=auth).content == content
+    client.delete(f"/attachments/{second['id']}", headers=auth)
+    assert blob_refs(main, first["checksum"]) is None and not os.path.exists(path)
+
+
+def test_range_downloads(client, auth):
+    content = bytes(range(256)) * 40
+    lead = client.post("/leads", json={"title": "Deal"}, headers=auth).json()["id"]
+    attachment = upload(client, auth, lead, content).json()["id"]
+    url = f"/attachments/{attachment}/download"
+
+    whole = client.get(url, headers=auth)
+    assert (whole.status_code, whole.content) == (200, content)
+    assert whole.headers["accept-ranges"] == "bytes"
+    part = client.get(url, headers={**auth, "Range": "bytes=100-199"})
+    assert (part.status_code, part.content) == (206, content[100:200])
+    assert part.headers["content-range"] == f"bytes 100-199/{len(content)}"
+    assert client.get(url, headers={**auth, "Range": "bytes=-10"}).content == content[-10:]
+    assert client.get(url, headers={**auth, "Range": f"bytes={len(content)}-"}).status_code == 416
+
+
+def test_oversized_uploads_are_rejected(main, client, auth, monkeypatch):
+    assert main.MAX_UPLOAD_BYTES == 10 * 1024 * 1024  # default MAX_FILE_SIZE_MB
+    monkeypatch.setattr(main, "MAX_UPLOAD_BYTES", 1024)
+    lead = client.post("/leads", json={"title": "Deal"}, headers=auth).json()["id"]
+    assert upload(client, auth, lead, b"x" * 200_000).status_code == 413
+    assert client.get("/attachments", headers=auth).json() == []
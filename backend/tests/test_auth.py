@@ -0,0 +1,63 @@
+from conftest import register
+
+
+def test_principals_are_cached_until_the_user_changes(main, client):
+    headers = register(client)
+    me = client.get("/me", headers=headers).json()
+    hits = main.principal_cache.stats()["hits"]
+    assert client.get("/me", headers=headers).json() == me
+    assert main.principal_cache.stats()["hits"] == hits + 1
+
+    db = main.SessionLocal()
+    try:
+        db.get(main.User, me["id"]).role = "manager"
+        db.commit()
+    finally:
+        db.close()
+    assert client.get("/me", headers=headers).json()["role"] == "manager"
+
+
+def test_deleted_users_lose_access(main, client):
+    headers = register(client)
+    user_id = client.get("/me", headers=headers).json()["id"]
+
+    db = main.SessionLocal()
+    try:
+        db.delete(db.get(main.User, user_id))
+        db.commit()
+    finally:
+        db.close()
+    assert client.get("/me", headers=headers).status_code == 401
+
+
+def test_saturated_hasher_answers_503(main):
+    import asyncio
+
+    from fastapi import HTTPException
+
+    hasher = main.PasswordHasher(workers=1, max_pending=1)
+    hashed = main.hash_password("secret")
+
+    async def burst():
+        return await asyncio.gather(*(hasher.verify("secret", hashed) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(burst())
+    assert results.count(True) == 2
+    [rejected] = [r for r in results if isinstance(r, HTTPException)]
+    assert rejected.status_code == 503 and rejected.headers == {"Retry-After": "1"}
+    assert hasher.stats() == {"in_flight": 0, "capacity": 2, "rejected": 1}
+
+
+def test_login_rehashes_with_the_current_work_factor(main, client, monkeypatch):
+    headers = register(client)
+    email = client.get("/me", headers=headers).json()["email"]
+    monkeypatch.setattr(main, "BCRYPT_ROUNDS", 4)
+
+    assert client.post("/auth/login", json={"email": email, "password": "secret"}).status_code == 200
+    db = main.SessionLocal()
+    try:
+        hashed = db.query(main.User).filter(main.User.email == email).one().password_hash
+    finally:
+        db.close()
+    assert hashed.startswith("$2b$04$")
+    assert client.post("/auth/login", json={"email": email, "password": "secret"}).status_code == 200
@@ -0,0 +1,18 @@
+def test_dollar_text_is_literal_and_id_fields_resolve(client, auth):
+    response = client.post("/batch", json={"operations": [
+        {"op": "create", "entity": "accounts", "data": {"name": "$ Capital"}, "ref": "account"},
+        {"op": "create", "entity": "activities", "data": {"type": "note", "subject": "$5k upsell", "account_id": "$account"}},
+    ]}, headers=auth)
+    assert response.status_code == 200
+    account, activity = response.json()["results"]
+    assert account["record"]["name"] == "$ Capital"
+    assert activity["record"]["subject"] == "$5k upsell"
+    assert activity["record"]["account_id"] == account["id"]
+
+
+def test_unknown_reference_in_id_field_is_rejected(client, auth):
+    response = client.post("/batch", json={"operations": [
+        {"op": "create", "entity": "contacts", "data": {"first_name": "A", "last_name": "B", "account_id": "$missing"}},
+    ]}, headers=auth)
+    assert response.status_code == 400
+    assert response.json()["detail"] == {"operation": 0, "detail": "Unknown reference $missing"}
@@ -0,0 +1,43 @@
+from conftest import register
+
+
+def test_etags_follow_the_owners_writes_only(main, client, auth):
+    response = client.get("/leads", headers=auth)
+    etag = response.headers["etag"]
+    assert client.get("/leads", headers={**auth, "If-None-Match": etag}).status_code == 304
+
+    client.post("/leads", json={"title": "Elsewhere"}, headers=register(client))
+    client.post("/accounts", json={"name": "Unrelated table"}, headers=auth)
+    assert client.get("/leads", headers={**auth, "If-None-Match": etag}).status_code == 304
+    assert client.get("/dashboard/stats", headers=auth).json()["total_accounts"] == 1
+
+    lead = client.post("/leads", json={"title": "Mine"}, headers=auth).json()["id"]
+    fresh = client.get("/leads", headers={**auth, "If-None-Match": etag})
+    assert fresh.status_code == 200 and [row["id"] for row in fresh.json()] == [lead]
+    etag = fresh.headers["etag"]
+    client.patch(f"/leads/{lead}", json={"title": "Renamed"}, headers=auth)
+    assert client.get("/leads", headers={**auth, "If-None-Match": etag}).json()[0]["title"] == "Renamed"
+
+
+def test_repeated_reads_come_from_the_response_cache(main, client, auth):
+    for name in ("Acme", "Globex"):
+        client.post("/accounts", json={"name": name}, headers=auth)
+    first = client.get("/accounts", params={"limit": 1}, headers=auth)
+    hits = main.response_cache.stats()["hits"]
+    again = client.get("/accounts", params={"limit": 1}, headers=auth)
+    assert main.response_cache.stats()["hits"] == hits + 1
+    assert again.content == first.content
+    assert again.headers["etag"] == first.headers["etag"]
+    assert again.headers["x-next-cursor"] == first.headers["x-next-cursor"]
+
+
+def test_response_cache_is_bounded_by_bytes(main):
+    cache = main.ResponseCache(max_bytes=10)
+    cache.put("a", b"1234", {})
+    cache.put("b", b"5678", {})
+    cache.get("a")
+    cache.put("c", b"90ab", {})
+    cache.put("huge", b"x" * 11, {})
+    assert cache.get("b") is None and cache.get("huge") is None
+    assert cache.get("a") == (b"1234", {}) and cache.get("c") == (b"90ab", {})
+    assert cache.stats()["bytes"] == 8 and cache.stats()["evictions"] == 1
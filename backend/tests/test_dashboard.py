@@ -0,0 +1,29 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+
+def test_concurrent_rollup_backfills_keep_one_row(main, client, auth):
+    client.post("/accounts", json={"name": "Acme"}, headers=auth)
+    with main.engine.begin() as conn:
+        owner_id = conn.scalar(main.select(main.Account.owner_id).where(main.Account.name == "Acme").order_by(main.Account.id.desc()))
+        conn.execute(main.OwnerStats.__table__.delete().where(main.OwnerStats.owner_id == owner_id))
+
+    async def race():
+        engine = create_async_engine(main.ASYNC_SQLALCHEMY_DATABASE_URL)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            # Both requests saw no rollup row before either created one
+            async with sessions() as first, sessions() as second:
+                assert await first.get(main.OwnerStats, owner_id) is None
+                assert await second.get(main.OwnerStats, owner_id) is None
+                await main.backfill_owner_stats(first, owner_id)
+                await first.commit()
+                stats = await main.backfill_owner_stats(second, owner_id)
+                await second.commit()
+                return stats.total_accounts
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(race()) == 1
+    assert client.get("/dashboard/stats", headers=auth).json()["total_accounts"] == 1
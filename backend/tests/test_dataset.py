@@ -0,0 +1,39 @@
+from sqlalchemy import func, select
+
+
+def test_seeded_data_is_skewed_and_its_derived_state_consistent(main, client):
+    from benchmarks import dataset
+
+    user_ids = dataset.seed(main, "small", users=3, accounts=40, contacts=120, leads=60, activities=300, tasks=50)
+    with main.engine.connect() as conn:
+        leads = dict(conn.execute(
+            select(main.Lead.owner_id, func.count()).where(main.Lead.owner_id.in_(user_ids)).group_by(main.Lead.owner_id)
+        ).all())
+        assert sum(leads.values()) == 60 and leads[user_ids[0]] == max(leads.values())
+        for model in (main.Account, main.Contact, main.Lead, main.Activity, main.Task):
+            assert not conn.scalar(select(func.count()).select_from(model).where(model.change_seq.is_(None)))
+        keyed = conn.scalar(
+            select(func.count(main.DuplicateKey.record_id.distinct()))
+            .where(main.DuplicateKey.entity == "accounts", main.DuplicateKey.owner_id.in_(user_ids))
+        )
+        assert keyed == 40
+
+    db = main.SessionLocal()
+    try:
+        expected = main.compute_owner_stats(db)
+        for user_id in user_ids:
+            stats = db.get(main.OwnerStats, user_id)
+            assert {name: getattr(stats, name) for name in main.STATS_FIELDS} == expected[user_id]
+    finally:
+        db.close()
+
+    token = main.create_access_token(data={"sub": f"user{user_ids[0]}@trailtrack.test"})
+    stats = client.get("/dashboard/stats", headers={"Authorization": f"Bearer {token}"}).json()
+    assert stats["total_leads"] == leads[user_ids[0]]
+
+def test_percentiles(main):
+    from benchmarks.harness import summarize
+
+    summary = summarize([float(n) for n in range(1, 101)])
+    assert (summary["count"], summary["p50"], summary["p95"], summary["p99"], summary["max"]) == (100, 50.0, 95.0, 99.0, 100.0)
+    assert summarize([3.0, 1.0, 2.0])["p50"] == 2.0
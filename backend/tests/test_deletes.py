@@ -0,0 +1,32 @@
+def test_deleting_a_parent_invalidates_cached_children(client, auth):
+    account = client.post("/accounts", json={"name": "Acme"}, headers=auth).json()["id"]
+    client.post("/contacts", json={"first_name": "Ann", "last_name": "Lee", "account_id": account}, headers=auth)
+    lead = client.post("/leads", json={"title": "Deal", "account_id": account}, headers=auth).json()["id"]
+    client.post("/activities", json={"type": "note", "subject": "Call", "lead_id": lead}, headers=auth)
+    contacts = client.get("/contacts", headers=auth)
+    activities = client.get("/activities", headers=auth)
+    assert contacts.json()[0]["account_id"] == account
+
+    assert client.delete(f"/accounts/{account}", headers=auth).status_code == 200
+    assert client.delete(f"/leads/{lead}", headers=auth).status_code == 200
+
+    fresh = client.get("/contacts", headers={**auth, "If-None-Match": contacts.headers["etag"]})
+    assert fresh.status_code == 200
+    assert fresh.json()[0]["account_id"] is None
+    fresh = client.get("/activities", headers={**auth, "If-None-Match": activities.headers["etag"]})
+    assert fresh.status_code == 200
+    assert fresh.json()[0]["lead_id"] is None
+
+
+def test_detached_children_reach_sync_clients(client, auth):
+    account = client.post("/accounts", json={"name": "Acme"}, headers=auth).json()["id"]
+    client.post("/contacts", json={"first_name": "Ann", "last_name": "Lee", "account_id": account}, headers=auth)
+    client.post("/contacts", json={"first_name": "Bob", "last_name": "Ray", "account_id": account}, headers=auth)
+    cursor = client.get("/sync/changes", headers=auth).json()["cursor"]
+
+    client.delete(f"/accounts/{account}", headers=auth)
+
+    page = client.get("/sync/changes", params={"since": cursor}, headers=auth).json()
+    contacts = page["changes"]["contacts"]
+    assert len(contacts) == 2 and all(row["account_id"] is None for row in contacts)
+    assert account in page["deleted"]["accounts"]
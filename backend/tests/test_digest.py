@@ -0,0 +1,18 @@
+from datetime import datetime
+
+
+def test_default_sender_keeps_nothing(main):
+    assert not hasattr(main.mail_sender, "outbox")
+
+
+def test_digest_goes_to_installed_sender(main, client, auth, monkeypatch):
+    sender = main.StubSender()
+    monkeypatch.setattr(main, "mail_sender", sender)
+    lead = client.post("/leads", json={"title": "Renewal"}, headers=auth).json()["id"]
+    task = {"linked_type": "lead", "linked_id": lead, "title": "Call back", "due_at": datetime.utcnow().isoformat()}
+    assert client.post("/tasks", json=task, headers=auth).status_code == 200
+
+    with main.engine.connect() as conn:
+        rows = conn.execute(main.digest_query(datetime.utcnow().date())).all()
+    main.deliver_digests(rows, datetime.utcnow().date())
+    assert any("Call back" in message.get_content() for message in sender.outbox)
@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+
+
+def test_merge_invalidates_cached_attachment_and_timeline_reads(main, client, auth):
+    keep = client.post("/contacts", json={"first_name": "Ann", "last_name": "Lee"}, headers=auth).json()["id"]
+    duplicate = client.post("/contacts", json={"first_name": "Ann", "last_name": "Lee"}, headers=auth).json()["id"]
+    old = (datetime.utcnow() - timedelta(days=900)).isoformat()
+    activity = client.post(
+        "/activities", json={"type": "note", "subject": "old", "contact_id": duplicate, "occurred_at": old}, headers=auth,
+    ).json()["id"]
+    client.post("/activities", json={"type": "note", "subject": "recent"}, headers=auth)
+    main.archive_old_activities(main.engine, main.archive_cutoff())
+    assert client.get(f"/activities/{activity}", headers=auth).json()["subject"] == "old"
+    with main.engine.connect() as conn:
+        assert conn.scalar(main.select(main.ArchivedActivity.id).where(main.ArchivedActivity.id == activity)) == activity
+    uploaded = client.post(
+        f"/attachments/upload?linked_type=contact&linked_id={duplicate}", files={"file": ("a.txt", b"hello")}, headers=auth,
+    )
+    assert uploaded.status_code == 200
+
+    listing = f"/attachments?linked_type=contact&linked_id={keep}"
+    cached = client.get(listing, headers=auth)
+    assert cached.json() == []
+    activities = client.get("/activities", headers=auth)
+
+    merged = client.post("/duplicates/merge", json={"entity": "contacts", "keep_id": keep, "duplicate_ids": [duplicate]}, headers=auth)
+    assert merged.status_code == 200
+    assert merged.json()["repointed"] == {"activity_archive": 1, "attachments": 1}
+
+    after = client.get(listing, headers={**auth, "If-None-Match": cached.headers["etag"]})
+    assert after.status_code == 200
+    assert [attachment["id"] for attachment in after.json()] == [uploaded.json()["id"]]
+    assert client.get("/activities", headers={**auth, "If-None-Match": activities.headers["etag"]}).status_code == 200
+    assert client.get(f"/activities/{activity}", headers=auth).json()["contact_id"] == keep
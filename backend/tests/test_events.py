@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+from conftest import register
+
+
+def notices(main, owner_id, since):
+    return [json.loads(data) for _, event, data in main.event_bus.replay(owner_id, since) if event == "change"]
+
+
+def test_committed_writes_publish_notices(main, client, auth):
+    owner_id = client.get("/me", headers=auth).json()["id"]
+    since = main.event_bus.event_id(main.event_bus.sequence)
+    lead = client.post("/leads", json={"title": "Deal"}, headers=auth).json()["id"]
+    client.patch(f"/leads/{lead}", json={"stage": "Qualified"}, headers=auth)
+    client.delete(f"/leads/{lead}", headers=auth)
+    client.post("/leads", json={"title": "Not mine"}, headers=register(client))
+
+    assert notices(main, owner_id, since) == [
+        {"entity": "leads", "op": "created", "id": lead},
+        {"entity": "leads", "op": "updated", "id": lead, "fields": ["stage"]},
+        {"entity": "leads", "op": "deleted", "id": lead},
+    ]
+
+
+def test_replay_needs_a_position_still_in_the_backlog(main):
+    bus = main.EventBus(queue_size=10, backlog=2)
+    for n in range(3):
+        bus.publish(1, "change", {"n": n})
+    assert [m[0] for m in bus.replay(1, bus.event_id(1))] == [2, 3]
+    assert bus.replay(1, bus.event_id(0)) is None
+    assert bus.replay(1, "0." + str(bus.sequence)) is None
+    assert bus.replay(2, bus.event_id(3)) == []
+
+
+def test_stream_resumes_heartbeats_and_drops_slow_consumers(main, monkeypatch):
+    bus = main.EventBus(queue_size=2, backlog=10)
+    monkeypatch.setattr(main, "event_bus", bus)
+
+    async def read():
+        bus.publish(1, "change", {"n": 1})
+        subscription = bus.subscribe(1)
+        stream = main.event_stream(subscription, bus.replay(1, bus.event_id(0)))
+        received = [await anext(stream), await anext(stream)]
+        bus.heartbeat()
+        received.append(await anext(stream))
+        for n in range(2, 6):
+            bus.publish(1, "change", {"n": n})
+        received += [chunk async for chunk in stream]
+        return received, subscription
+
+    received, subscription = asyncio.run(read())
+    assert received[0].startswith("retry: 3000\n")
+    assert received[1] == f'id: {bus.epoch}.1\nevent: change\ndata: {{"n":1}}\n\n'
+    assert received[2] == ": heartbeat\n\n"
+    # Two notices fit the queue, the third overflows it and the stream ends after draining
+    assert [json.loads(chunk.rsplit("data: ", 1)[1]) for chunk in received[3:]] == [{"n": 2}, {"n": 3}]
+    assert subscription.overflowed and bus.dropped == 1 and bus.stats()["streams"] == 0
+
+
+def test_reset_when_the_position_is_gone(main):
+    async def first_event():
+        stream = main.event_stream(main.event_bus.subscribe(-1), None)
+        await anext(stream)
+        event = await anext(stream)
+        await stream.aclose()
+        return event
+
+    assert "event: reset\n" in asyncio.run(first_event())
+
+
+def test_events_require_a_token(client):
+    assert client.get("/events").status_code == 401
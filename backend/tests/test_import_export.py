@@ -0,0 +1,43 @@
+import csv
+import io
+
+
+def upload(client, auth, entity, text):
+    return client.post(f"/import/{entity}", files={"file": (f"{entity}.csv", text.encode(), "text/csv")}, headers=auth)
+
+
+def test_import_links_accounts_reports_row_errors_and_exports(main, client, auth, monkeypatch):
+    monkeypatch.setattr(main, "IMPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(main, "EXPORT_BATCH_SIZE", 2)
+    accounts = upload(client, auth, "accounts", "name,industry\nHarbor Co,Shipping\nSummit Ltd,Outdoor\nPine LLC,\n").json()
+    assert (accounts["imported"], accounts["failed"]) == (3, 0)
+
+    contacts = upload(client, auth, "contacts", (
+        "first_name,last_name,email,account_name\n"
+        "Ann,Lee,ann@harbor.test,Harbor Co\n"
+        "Bob,,bob@summit.test,Summit Ltd\n"
+        "Cy,Ray,cy@nowhere.test,Nowhere Inc\n"
+        "Di,Fox,di@summit.test,Summit Ltd\n"
+    )).json()
+    assert (contacts["imported"], contacts["failed"]) == (2, 2)
+    assert [error["row"] for error in contacts["errors"]] == [2, 3]
+    assert "unknown account" in contacts["errors"][1]["errors"][0]
+    assert client.get("/dashboard/stats", headers=auth).json()["total_accounts"] == 3
+
+    response = client.get("/export/contacts", headers=auth)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert "change_seq" not in rows[0]
+    account_names = {a["id"]: a["name"] for a in client.get("/accounts", headers=auth).json()}
+    assert [(r["email"], account_names[int(r["account_id"])]) for r in rows] == [
+        ("ann@harbor.test", "Harbor Co"), ("di@summit.test", "Summit Ltd"),
+    ]
+
+    exported = list(csv.DictReader(io.StringIO(client.get("/export/accounts", headers=auth).text)))
+    assert [row["name"] for row in exported] == ["Harbor Co", "Summit Ltd", "Pine LLC"]
+
+
+def test_unknown_entities_are_404(client, auth):
+    assert upload(client, auth, "tasks", "title\nx\n").status_code == 404
+    assert client.get("/export/users", headers=auth).status_code == 404
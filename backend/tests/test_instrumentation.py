@@ -0,0 +1,37 @@
+import re
+
+from conftest import register
+
+
+def db_timing(response):
+    match = re.search(r'db;dur=([\d.]+);desc="(\d+) queries"', response.headers["server-timing"])
+    return float(match.group(1)), int(match.group(2))
+
+
+def create_account(client, name):
+    response = client.post("/accounts", json={"name": name}, headers=register(client))
+    assert response.status_code == 200
+    return db_timing(response)
+
+
+def test_grouped_writes_report_their_queries(started):
+    with started() as client:
+        _, direct = create_account(client, "Direct")
+    with started(GROUP_COMMIT=True) as client:
+        seconds, grouped = create_account(client, "Grouped")
+    # The create's statements plus BEGIN, SAVEPOINT, RELEASE and COMMIT run on the writer task
+    assert grouped >= direct
+    assert seconds > 0
+
+
+def test_metrics_are_off_by_default(client):
+    assert client.get("/metrics").status_code == 404
+
+
+def test_metrics_token(started):
+    with started(METRICS_ENABLED=True, METRICS_TOKEN="scrape") as client:
+        client.get("/accounts", headers=register(client))
+        assert client.get("/metrics").status_code == 401
+        response = client.get("/metrics", headers={"Authorization": "Bearer scrape"})
+    assert response.status_code == 200
+    assert 'trailtrack_http_request_duration_seconds_count{method="GET",route="/accounts",status="200"}' in response.text
@@ -0,0 +1,44 @@
+def test_fields_projection_is_limited_to_the_read_schema(client, auth):
+    client.post("/accounts", json={"name": "Acme", "industry": "Retail"}, headers=auth)
+
+    response = client.get("/accounts", params={"fields": "name,industry"}, headers=auth)
+    assert response.status_code == 200
+    assert response.json() == [{"id": response.json()[0]["id"], "name": "Acme", "industry": "Retail"}]
+    assert client.get("/accounts", params={"fields": "name,change_seq"}, headers=auth).status_code == 400
+
+
+def pages(client, path, auth, **params):
+    rows, cursor = [], None
+    while True:
+        response = client.get(path, params={**params, **({"cursor": cursor} if cursor else {})}, headers=auth)
+        assert response.status_code == 200
+        rows += response.json()
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            return rows
+
+
+def test_keyset_pages_cover_ties_once_in_order(client, auth):
+    values = [300, 100, 300, 200, 100, 300]
+    ids = [client.post("/leads", json={"title": f"Deal {i}", "value_cents": v}, headers=auth).json()["id"]
+           for i, v in enumerate(values)]
+
+    rows = pages(client, "/leads", auth, sort="-value_cents", limit=2, fields="value_cents")
+    expected = sorted(zip(values, ids), key=lambda pair: (-pair[0], -pair[1]))
+    assert [(row["value_cents"], row["id"]) for row in rows] == expected
+
+
+def test_list_filters(client, auth):
+    account = client.post("/accounts", json={"name": "Acme"}, headers=auth).json()["id"]
+    won = client.post("/leads", json={"title": "Won", "stage": "Proposal", "account_id": account}, headers=auth).json()["id"]
+    client.post("/leads", json={"title": "Other", "stage": "Proposal"}, headers=auth)
+    client.post("/leads", json={"title": "New", "account_id": account}, headers=auth)
+    soon = client.post("/tasks", json={"linked_type": "lead", "linked_id": won, "title": "Call",
+                                       "due_at": "2030-01-01T09:00:00"}, headers=auth).json()["id"]
+    client.post("/tasks", json={"linked_type": "lead", "linked_id": won, "title": "Later",
+                                "due_at": "2030-06-01T09:00:00"}, headers=auth)
+
+    leads = client.get("/leads", params={"stage": "Proposal", "account_id": account}, headers=auth).json()
+    assert [lead["id"] for lead in leads] == [won]
+    tasks = client.get("/tasks", params={"due_before": "2030-03-01T00:00:00"}, headers=auth).json()
+    assert [task["id"] for task in tasks] == [soon]
@@ -0,0 +1,40 @@
+import re
+
+
+def queries(response):
+    return int(re.search(r'desc="(\d+) queries"', response.headers["server-timing"]).group(1))
+
+
+def test_pipeline_groups_cards_with_account_and_next_open_task(client, auth):
+    account = client.post("/accounts", json={"name": "Acme"}, headers=auth).json()["id"]
+    lead = client.post("/leads", json={"title": "Big deal", "stage": "Proposal", "value_cents": 5000,
+                                       "account_id": account}, headers=auth).json()["id"]
+    client.post("/leads", json={"title": "Small deal", "stage": "Proposal", "value_cents": 700}, headers=auth)
+    done = client.post("/tasks", json={"linked_type": "lead", "linked_id": lead, "title": "Intro",
+                                       "due_at": "2030-01-01T09:00:00"}, headers=auth).json()["id"]
+    client.patch(f"/tasks/{done}", json={"status": "done"}, headers=auth)
+    client.post("/tasks", json={"linked_type": "lead", "linked_id": lead, "title": "Later",
+                                "due_at": "2030-03-01T09:00:00"}, headers=auth)
+    nxt = client.post("/tasks", json={"linked_type": "lead", "linked_id": lead, "title": "Demo",
+                                      "due_at": "2030-02-01T09:00:00"}, headers=auth).json()["id"]
+
+    board = client.get("/pipeline", headers=auth).json()
+    proposal = next(column for column in board["stages"] if column["stage"] == "Proposal")
+    assert (proposal["count"], proposal["value_cents"]) == (2, 5700)
+    assert (board["total_count"], board["total_value_cents"]) == (2, 5700)
+    card = next(card for card in proposal["leads"] if card["id"] == lead)
+    assert card["account_name"] == "Acme"
+    assert card["next_task"]["id"] == nxt
+
+
+def test_pipeline_query_count_does_not_grow_with_leads(main, client, auth, monkeypatch):
+    monkeypatch.setattr(main.response_cache, "max_bytes", 0)
+    account = client.post("/accounts", json={"name": "Acme"}, headers=auth).json()["id"]
+
+    def add_leads(n):
+        for i in range(n):
+            lead = client.post("/leads", json={"title": f"Deal {i}", "account_id": account}, headers=auth).json()["id"]
+            client.post("/tasks", json={"linked_type": "lead", "linked_id": lead, "title": "Call"}, headers=auth)
+        return queries(client.get("/pipeline", headers=auth))
+
+    assert add_leads(2) == add_leads(20)
@@ -0,0 +1,14 @@
+def test_hot_queries_use_indexes(main, capsys):
+    import manage
+
+    assert manage.hot_queries()
+    status = manage.check_plans(None)
+    assert status == 0, capsys.readouterr().out
+
+
+def test_a_scan_fails_the_check(main):
+    import manage
+
+    assert manage.is_table_scan("SCAN activities")
+    assert manage.is_table_scan("SCAN leads USING INDEX ix_leads_owner_id")
+    assert not manage.is_table_scan("SEARCH activities USING INDEX ix_activities_owner_occurred (owner_id=?)")
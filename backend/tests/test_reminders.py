@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+from conftest import register
+
+
+def test_aware_due_dates_are_stored_as_naive_utc(main, started):
+    due = (datetime.utcnow() + timedelta(minutes=30)).replace(microsecond=0)
+    with started(SCHEDULER_ENABLED=True, ARCHIVE_AFTER_DAYS=0) as client:
+        auth = register(client)
+        lead = client.post("/leads", json={"title": "Renewal"}, headers=auth).json()["id"]
+        task = {"linked_type": "lead", "linked_id": lead, "title": "Call back", "due_at": due.isoformat() + "Z"}
+        created = client.post("/tasks", json=task, headers=auth)
+        assert created.status_code == 200
+        assert created.json()["due_at"] == due.isoformat()
+        assert main.reminder_scheduler.stats()["scheduled"] >= 1
+
+        # +02:00 is two hours ahead of UTC
+        later = due + timedelta(minutes=5)
+        offset = (later + timedelta(hours=2)).isoformat() + "+02:00"
+        patched = client.patch(f"/tasks/{created.json()['id']}", json={"due_at": offset}, headers=auth)
+        assert patched.status_code == 200
+        assert patched.json()["due_at"] == later.isoformat()
+
+
+def test_scheduling_errors_do_not_fail_committed_writes(main, started, monkeypatch):
+    with started(SCHEDULER_ENABLED=True, ARCHIVE_AFTER_DAYS=0) as client:
+        auth = register(client)
+
+        def broken(*args):
+            raise RuntimeError("scheduler down")
+
+        monkeypatch.setattr(main.reminder_scheduler, "schedule", broken)
+        lead = client.post("/leads", json={"title": "Renewal"}, headers=auth).json()["id"]
+        task = {"linked_type": "lead", "linked_id": lead, "title": "Call back", "due_at": datetime.utcnow().isoformat()}
+        assert client.post("/tasks", json=task, headers=auth).status_code == 200
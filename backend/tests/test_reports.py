@@ -0,0 +1,42 @@
+REPORTS = ["/reports/pipeline", "/reports/won-lost?period=week", "/reports/sources", "/reports/forecast"]
+
+
+def test_reports_follow_lead_writes(client, auth):
+    won = client.post("/leads", json={"title": "A", "stage": "Proposal", "value_cents": 10000, "probability": 50,
+                                      "source": "referral", "expected_close_date": "2030-01-15T00:00:00"}, headers=auth).json()["id"]
+    client.post("/leads", json={"title": "B", "stage": "Proposal", "value_cents": 4000, "probability": 25,
+                                "source": "referral", "expected_close_date": "2030-02-10T00:00:00"}, headers=auth)
+    lost = client.post("/leads", json={"title": "C", "value_cents": 999, "source": "web"}, headers=auth).json()["id"]
+    client.patch(f"/leads/{won}", json={"stage": "Closed-Won"}, headers=auth)
+    client.patch(f"/leads/{lost}", json={"stage": "Closed-Lost"}, headers=auth)
+
+    pipeline = {row["stage"]: row for row in client.get("/reports/pipeline", headers=auth).json()}
+    assert pipeline["Proposal"] == {"stage": "Proposal", "lead_count": 1, "value_cents": 4000, "weighted_value_cents": 1000}
+    assert pipeline["Closed-Won"]["lead_count"] == 0
+
+    [period] = client.get("/reports/won-lost", headers=auth).json()
+    assert (period["lead_count"], period["won_count"], period["lost_count"], period["open_count"]) == (3, 1, 1, 1)
+    assert period["won_value_cents"] == 10000
+
+    sources = client.get("/reports/sources", headers=auth).json()
+    assert [(s["source"], s["lead_count"], s["win_rate"]) for s in sources] == [("referral", 2, 1.0), ("web", 1, 0.0)]
+
+    forecast = client.get("/reports/forecast", headers=auth).json()
+    assert [(row["bucket"], row["weighted_value_cents"]) for row in forecast] == [("2030-02-01", 1000)]
+
+
+def test_incremental_rollups_match_a_rebuild(main, client, auth, monkeypatch):
+    monkeypatch.setattr(main.response_cache, "max_bytes", 0)
+    ids = [client.post("/leads", json={"title": f"L{i}", "value_cents": 100 * i, "probability": 10 * i,
+                                       "source": ["web", "event"][i % 2],
+                                       "expected_close_date": f"2030-0{i % 3 + 1}-0{i + 1}T00:00:00"}, headers=auth).json()["id"]
+           for i in range(6)]
+    client.patch(f"/leads/{ids[0]}", json={"stage": "Closed-Won"}, headers=auth)
+    client.patch(f"/leads/{ids[1]}", json={"value_cents": 12345, "expected_close_date": "2031-05-05T00:00:00"}, headers=auth)
+    client.patch(f"/leads/{ids[2]}", json={"stage": "Negotiation", "probability": 80}, headers=auth)
+    client.delete(f"/leads/{ids[3]}", headers=auth)
+
+    incremental = [client.get(path, headers=auth).json() for path in REPORTS]
+    with main.engine.begin() as conn:
+        main.rebuild_report_rollups(conn)
+    assert [client.get(path, headers=auth).json() for path in REPORTS] == incremental
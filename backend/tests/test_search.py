@@ -0,0 +1,49 @@
+from conftest import register
+
+
+def search(client, auth, q, **params):
+    response = client.get("/search", params={"q": q, **params}, headers=auth)
+    assert response.status_code == 200
+    return response
+
+
+def test_prefix_search_is_ranked_highlighted_and_owner_scoped(client, auth):
+    named = client.post("/accounts", json={"name": "Zephyrine Outfitters"}, headers=auth).json()["id"]
+    noted = client.post("/accounts", json={"name": "Plain Co", "notes": "Partner of zephyrine"}, headers=auth).json()["id"]
+    activity = client.post("/activities", json={"type": "note", "subject": "Kickoff",
+                                                "body": "Discussed the zephyrine rollout plan"}, headers=auth).json()["id"]
+    client.post("/accounts", json={"name": "Zephyrine Elsewhere"}, headers=register(client))
+
+    results = search(client, auth, "zephyr").json()
+    assert sorted((r["type"], r["id"]) for r in results) == [("account", named), ("account", noted), ("activity", activity)]
+    # A title match outranks one in the notes
+    assert [r["id"] for r in results if r["type"] == "account"] == [named, noted]
+    found = {(r["type"], r["id"]): r for r in results}
+    assert found["account", named]["title"] == "<mark>Zephyrine</mark> Outfitters"
+    assert "<mark>zephyrine</mark>" in found["activity", activity]["snippet"]
+    assert [r["id"] for r in search(client, auth, "zephyr", types="activity").json()] == [activity]
+
+
+def test_index_follows_updates_and_deletes(client, auth):
+    lead = client.post("/leads", json={"title": "Quillback expansion"}, headers=auth).json()["id"]
+    assert [r["id"] for r in search(client, auth, "quillback").json()] == [lead]
+
+    client.patch(f"/leads/{lead}", json={"title": "Marlowe expansion"}, headers=auth)
+    assert search(client, auth, "quillback").json() == []
+    assert [r["id"] for r in search(client, auth, "marlowe").json()] == [lead]
+
+    client.delete(f"/leads/{lead}", headers=auth)
+    assert search(client, auth, "marlowe").json() == []
+
+
+def test_search_pages(client, auth):
+    ids = {client.post("/contacts", json={"first_name": "Ysolde", "last_name": f"Tarn{i}"}, headers=auth).json()["id"]
+           for i in range(5)}
+    seen, cursor = [], None
+    while True:
+        response = search(client, auth, "ysolde", limit=2, **({"cursor": cursor} if cursor else {}))
+        seen += [r["id"] for r in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(ids)
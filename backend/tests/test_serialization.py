@@ -0,0 +1,23 @@
+import pytest
+
+
+def test_list_rows_and_records_share_the_read_model(main, client, auth):
+    account = client.post("/accounts", json={"name": "Acme"}, headers=auth).json()["id"]
+    lead = client.post("/leads", json={"title": "Deal", "account_id": account, "value_cents": 500,
+                                       "expected_close_date": "2030-01-31T12:30:00"}, headers=auth).json()
+    [row] = client.get("/leads", headers=auth).json()
+    assert list(row) == list(main.LeadRead.model_fields)
+    assert row == lead == client.get(f"/leads/{lead['id']}", headers=auth).json()
+    assert row["expected_close_date"] == "2030-01-31T12:30:00"
+
+
+def test_fast_json_renders_the_same_documents(main, client, auth, monkeypatch):
+    pytest.importorskip("orjson")
+    monkeypatch.setattr(main.response_cache, "max_bytes", 0)
+    for i in range(3):
+        client.post("/activities", json={"type": "note", "subject": f"Näive {i}", "body": "…",
+                                         "occurred_at": f"2024-05-0{i + 1}T08:15:00.250000"}, headers=auth)
+    paths = ["/activities", "/dashboard/stats", "/pipeline", "/me"]
+    default = [client.get(path, headers=auth).json() for path in paths]
+    monkeypatch.setattr(main, "FAST_JSON", True)
+    assert [client.get(path, headers=auth).json() for path in paths] == default
@@ -0,0 +1,85 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+
+def test_connections_use_wal_and_the_tuned_pragmas(main):
+    with main.engine.connect() as conn:
+        pragmas = [conn.scalar(text(f"PRAGMA {name}")) for name in ("journal_mode", "synchronous", "busy_timeout")]
+    assert pragmas == ["wal", 1, main.SQLITE_BUSY_TIMEOUT_MS]
+
+
+def test_reads_and_writes_use_separate_pools(main):
+    async def engines():
+        bound = []
+        for method in ("GET", "HEAD", "POST", "PATCH", "DELETE"):
+            dependency = main.get_db(SimpleNamespace(method=method))
+            bound.append((await anext(dependency)).bind)
+            await dependency.aclose()
+        return bound
+
+    read, write = main.async_read_engine, main.async_engine
+    assert asyncio.run(engines()) == [read, read, write, write, write]
+
+
+def test_group_commit_keeps_order_and_isolates_failures(main):
+    db = main.SessionLocal()
+    try:
+        owner = main.User(email=f"{uuid.uuid4().hex}@trailtrack.test", name="Writer", role="user")
+        db.add(owner)
+        db.commit()
+        owner_id = owner.id
+    finally:
+        db.close()
+
+    def create(name):
+        async def work(db):
+            if name == "bad":
+                db.add(main.Account(name="partial", owner_id=owner_id))
+                await db.flush()
+                raise ValueError(name)
+            account = main.Account(name=name, owner_id=owner_id)
+            db.add(account)
+            await db.flush()
+            return account.id
+        return work
+
+    async def run():
+        await main.async_engine.dispose()
+        writer = main.GroupCommitWriter(max_writes=10, wait_seconds=0.05)
+        writer.start()
+        try:
+            names = ["g1", "g2", "bad", "g3", "g4"]
+            return await asyncio.gather(*(writer.submit(create(name)) for name in names), return_exceptions=True), writer.stats()
+        finally:
+            await writer.stop()
+            await main.async_engine.dispose()
+
+    results, stats = asyncio.run(run())
+    assert isinstance(results[2], ValueError)
+    ids = results[:2] + results[3:]
+    assert ids == sorted(ids)
+    assert stats == {"groups": 1, "writes": 4}
+    with main.engine.connect() as conn:
+        names = conn.execute(text(f"SELECT name FROM accounts WHERE id IN ({','.join(map(str, ids))}) ORDER BY id")).scalars().all()
+        assert names == ["g1", "g2", "g3", "g4"]
+        assert not conn.scalar(text("SELECT count(*) FROM accounts WHERE name = 'partial'"))
+
+
+def test_export_streams_from_the_read_pool(main, client, auth, monkeypatch):
+    client.post("/accounts", json={"name": "Acme"}, headers=auth)
+    opened = []
+
+    def tracking(pool, sessions):
+        def open_session():
+            opened.append(pool)
+            return sessions()
+        return open_session
+
+    monkeypatch.setattr(main, "AsyncReadSessionLocal", tracking("read", main.AsyncReadSessionLocal))
+    monkeypatch.setattr(main, "AsyncSessionLocal", tracking("write", main.AsyncSessionLocal))
+    assert "Acme" in client.get("/export/accounts", headers=auth).text
+    # The request's own session and the one the stream opens for itself
+    assert opened == ["read", "read"]
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+
+def sync(client, auth, since, limit=100):
+    response = client.get("/sync/changes", params={"since": since, "limit": limit}, headers=auth)
+    assert response.status_code == 200
+    return response.json()
+
+
+def replay(client, auth, since, limit):
+    """Apply every page from `since` to an empty client-side store, like a mobile client would."""
+    store = {}
+    while True:
+        page = sync(client, auth, since, limit)
+        for entity, ids in page["deleted"].items():
+            for record_id in ids:
+                store.pop((entity, record_id), None)
+        for entity, rows in page["changes"].items():
+            for row in rows:
+                store[(entity, row["id"])] = row
+        since = page["cursor"]
+        if not page["has_more"]:
+            return store, since
+
+
+def test_paged_sync_converges_on_the_current_state(client, auth):
+    account = client.post("/accounts", json={"name": "Acme"}, headers=auth).json()["id"]
+    contact = client.post("/contacts", json={"first_name": "Ann", "last_name": "Lee"}, headers=auth).json()["id"]
+    lead = client.post("/leads", json={"title": "Deal", "account_id": account}, headers=auth).json()["id"]
+    client.patch(f"/accounts/{account}", json={"industry": "Retail"}, headers=auth)
+    client.delete(f"/contacts/{contact}", headers=auth)
+    client.post("/tasks", json={"linked_type": "lead", "linked_id": lead, "title": "Call"}, headers=auth)
+
+    store, cursor = replay(client, auth, 0, 2)
+    assert store == replay(client, auth, 0, 100)[0]
+    assert store[("accounts", account)]["industry"] == "Retail"
+    assert ("contacts", contact) not in store
+    assert {entity for entity, _ in store} == {"accounts", "leads", "tasks"}
+
+    client.patch(f"/leads/{lead}", json={"title": "Renamed"}, headers=auth)
+    client.delete(f"/accounts/{account}", headers=auth)
+    page = sync(client, auth, cursor)
+    assert [row["title"] for row in page["changes"]["leads"]] == ["Renamed"]
+    assert page["deleted"] == {"accounts": [account]}
+    assert sync(client, auth, page["cursor"]) == {"cursor": page["cursor"], "has_more": False, "changes": {}, "deleted": {}}
+
+
+def test_cursors_older_than_pruned_tombstones_expire(main, client, auth):
+    lead = client.post("/leads", json={"title": "Deal"}, headers=auth).json()["id"]
+    cursor = sync(client, auth, 0)["cursor"]
+    client.delete(f"/leads/{lead}", headers=auth)
+
+    with main.engine.begin() as conn:
+        assert main.prune_tombstones(conn, datetime.utcnow() + timedelta(seconds=1)) >= 1
+    assert client.get("/sync/changes", params={"since": cursor}, headers=auth).status_code == 410
+    assert sync(client, auth, 0)["deleted"] == {}
@@ -0,0 +1,39 @@
+from conftest import register
+
+
+def timeline(client, auth, lead, limit):
+    items, cursor = [], None
+    while True:
+        response = client.get(f"/leads/{lead}/timeline", params={"limit": limit, **({"cursor": cursor} if cursor else {})},
+                              headers=auth)
+        assert response.status_code == 200
+        items += response.json()
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            return items
+
+
+def test_timeline_merges_sources_and_pages_consistently(client, auth):
+    lead = client.post("/leads", json={"title": "Deal", "value_cents": 100}, headers=auth).json()["id"]
+    for at in ["2024-03-01T10:00:00", "2024-03-01T10:00:00", "2024-01-01T08:00:00", "2031-01-01T00:00:00"]:
+        client.post("/activities", json={"type": "call", "subject": at, "lead_id": lead, "occurred_at": at}, headers=auth)
+    client.post("/tasks", json={"linked_type": "lead", "linked_id": lead, "title": "Follow up"}, headers=auth)
+    client.patch(f"/leads/{lead}", json={"stage": "Qualified", "value_cents": 250}, headers=auth)
+    other = client.post("/leads", json={"title": "Other"}, headers=auth).json()["id"]
+    client.post("/activities", json={"type": "call", "subject": "elsewhere", "lead_id": other}, headers=auth)
+
+    full = timeline(client, auth, lead, 100)
+    assert [item["kind"] for item in full].count("activity") == 4
+    assert {item["kind"] for item in full} == {"activity", "event", "task"}
+    changes = {item["record"]["field"]: item["record"] for item in full if item["kind"] == "event"}
+    assert changes["stage"]["old_value"] == "New" and changes["stage"]["new_value"] == "Qualified"
+    assert (changes["value_cents"]["old_value"], changes["value_cents"]["new_value"]) == (100, 250)
+    assert full[0]["record"]["subject"] == "2031-01-01T00:00:00"
+    assert full[-1]["record"]["subject"] == "2024-01-01T08:00:00"
+    for limit in (1, 2, 3):
+        assert timeline(client, auth, lead, limit) == full
+
+
+def test_timeline_of_another_owners_lead_is_404(client, auth):
+    lead = client.post("/leads", json={"title": "Private"}, headers=register(client)).json()["id"]
+    assert client.get(f"/leads/{lead}/timeline", headers=auth).status_code == 404